@@ -0,0 +1,305 @@
+# core/cache.py
+"""Общий для процессов кеш в файле SQLite и защита от лавины промахов.
+
+SQLiteCache — бэкенд Django без внешних сервисов: все воркеры
+gunicorn читают и пишут одну базу в режиме WAL, поэтому фрагмент,
+отрисованный одним процессом, сразу виден остальным.
+
+get_or_compute() хранит рядом со значением время его вычисления
+и срок. Чем ближе срок и чем дороже вычисление, тем вероятнее, что
+очередной запрос пересчитает значение заранее (XFetch), а не все
+разом после истечения. Пересчитывает только тот, кто взял блокировку
+(single-flight): остальные отдают старое значение, а при холодном
+промахе ждут, пока оно появится. Результат, который не кешируется
+(например, 404), ожидающие получают через короткоживущий ключ
+держателя блокировки, а не пересчитывают по очереди.
+"""
+import math
+import os
+import pickle
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from collections import namedtuple
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache as default_cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+XFETCH_BETA = 1.0
+LOCK_TIMEOUT = 10
+LOCK_POLL_INTERVAL = 0.02
+LOCK_KEY = '{}:lock'
+RESULT_KEY = '{}:result:{}'
+CULL_EVERY = 100
+
+Entry = namedtuple('Entry', 'value delta expires')
+
+
+@contextmanager
+def _immediate(connection):
+    # IMMEDIATE сразу берёт блокировку записи: без гонки в incr.
+    connection.execute('BEGIN IMMEDIATE')
+    try:
+        yield
+    except BaseException:
+        connection.execute('ROLLBACK')
+        raise
+    connection.execute('COMMIT')
+
+
+class SQLiteCache(BaseCache):
+    """Кеш в файле SQLite; LOCATION — путь к файлу."""
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        self._local = threading.local()
+
+    def _connection(self):
+        # Соединение своё у каждого потока и у каждого форка.
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(
+                self._path, timeout=30, isolation_level=None
+            )
+            connection.execute('PRAGMA journal_mode = WAL')
+            connection.execute('PRAGMA synchronous = NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)'
+            )
+            connection.execute(
+                'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)'
+            )
+            local.connection = connection
+            local.pid = os.getpid()
+            local.sets = 0
+        return local.connection
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _maybe_cull(self, connection):
+        self._local.sets += 1
+        if self._local.sets % CULL_EVERY == 0:
+            self._cull(connection)
+
+    def _cull(self, connection):
+        connection.execute(
+            'DELETE FROM cache WHERE expires < ?', (time.time(),)
+        )
+        count = connection.execute('SELECT count(*) FROM cache').fetchone()[0]
+        if count > self._max_entries:
+            # Между проверками кеш подрастает, поэтому срезаем до предела
+            # и ещё на долю CULL_FREQUENCY. Бессрочные записи (поколения
+            # лент) вытесняются последними.
+            excess = (count - self._max_entries
+                      + self._max_entries // self._cull_frequency)
+            connection.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                'ORDER BY expires IS NULL, expires LIMIT ?)', (excess,)
+            )
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        row = self._connection().execute(
+            'SELECT value FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires >= ?)', (key, time.time())
+        ).fetchone()
+        if row is None:
+            return default
+        return pickle.loads(row[0])
+
+    def get_many(self, keys, version=None):
+        names = {self._key(key, version): key for key in keys}
+        if not names:
+            return {}
+        placeholders = ', '.join('?' * len(names))
+        rows = self._connection().execute(
+            f'SELECT key, value FROM cache WHERE key IN ({placeholders}) '
+            'AND (expires IS NULL OR expires >= ?)',
+            (*names, time.time())
+        )
+        return {names[key]: pickle.loads(value) for key, value in rows}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        connection = self._connection()
+        connection.execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires) '
+            'VALUES (?, ?, ?)',
+            (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+             self.get_backend_timeout(timeout))
+        )
+        self._maybe_cull(connection)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        rows = [
+            (self._key(key, version),
+             pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires)
+            for key, value in data.items()
+        ]
+        connection = self._connection()
+        with _immediate(connection):
+            connection.executemany(
+                'INSERT OR REPLACE INTO cache (key, value, expires) '
+                'VALUES (?, ?, ?)', rows
+            )
+        self._maybe_cull(connection)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        connection = self._connection()
+        # Заменяется только истёкшая запись; rowcount 0 — ключ занят.
+        cursor = connection.execute(
+            'INSERT INTO cache (key, value, expires) VALUES (?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET value = excluded.value, '
+            'expires = excluded.expires WHERE cache.expires < ?',
+            (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+             self.get_backend_timeout(timeout), time.time())
+        )
+        self._maybe_cull(connection)
+        return cursor.rowcount == 1
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        cursor = self._connection().execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires >= ?)',
+            (self.get_backend_timeout(timeout), key, time.time())
+        )
+        return cursor.rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        name = self._key(key, version)
+        connection = self._connection()
+        with _immediate(connection):
+            row = connection.execute(
+                'SELECT value FROM cache WHERE key = ? '
+                'AND (expires IS NULL OR expires >= ?)', (name, time.time())
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            connection.execute(
+                'UPDATE cache SET value = ? WHERE key = ?',
+                (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), name)
+            )
+        return value
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        return self._connection().execute(
+            'SELECT 1 FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires >= ?)', (key, time.time())
+        ).fetchone() is not None
+
+    def delete(self, key, version=None):
+        key = self._key(key, version)
+        cursor = self._connection().execute(
+            'DELETE FROM cache WHERE key = ?', (key,)
+        )
+        return cursor.rowcount == 1
+
+    def delete_many(self, keys, version=None):
+        connection = self._connection()
+        with _immediate(connection):
+            connection.executemany(
+                'DELETE FROM cache WHERE key = ?',
+                [(self._key(key, version),) for key in keys]
+            )
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache')
+
+
+def _should_refresh(entry, beta):
+    if entry.expires is None:
+        return False
+    # -log(u) при u из (0, 1] — экспоненциальный сдвиг момента пересчёта.
+    jitter = -entry.delta * beta * math.log(1 - random.random())
+    return time.time() + jitter >= entry.expires
+
+
+def _compute(cache, key, compute, timeout, cacheable, shared=None):
+    """compute() с сохранением результата.
+
+    shared=(ключ, срок): куда положить некешируемый результат для
+    тех, кто ждёт этот пересчёт.
+    """
+    started = time.monotonic()
+    value = compute()
+    delta = time.monotonic() - started
+    if cacheable is None or cacheable(value):
+        expires = None if timeout is None else time.time() + timeout
+        cache.set(key, Entry(value, delta, expires), timeout)
+    elif shared is not None:
+        cache.set(shared[0], Entry(value, delta, None), shared[1])
+    return value
+
+
+def _unlock(cache, lock_key, token):
+    # Пересчёт дольше блокировки: её уже взял другой, не снимаем чужую.
+    # Между get и delete окно остаётся, но в API кеша нет сравнения
+    # с удалением, а пересчёт на порядки дольше этого окна.
+    if cache.get(lock_key) == token:
+        cache.delete(lock_key)
+
+
+def _wait(cache, key, lock_key):
+    """Ждёт пересчёта другого процесса: Entry его результата или None."""
+    holder = cache.get(lock_key)
+    time.sleep(LOCK_POLL_INTERVAL)
+    keys = [key, RESULT_KEY.format(key, holder)]
+    found = cache.get_many(keys)
+    for found_key in keys:
+        if isinstance(found.get(found_key), Entry):
+            return found[found_key]
+    return None
+
+
+def get_or_compute(key, compute, timeout, cacheable=None, cache=None):
+    """Значение из кеша или compute() без лавины одновременных пересчётов.
+
+    cacheable(value) решает, сохранять ли результат (например, только
+    ответы 200). timeout=None — бессрочно, без раннего пересчёта.
+    """
+    cache = cache or default_cache
+    beta = getattr(settings, 'CACHE_XFETCH_BETA', XFETCH_BETA)
+    entry = cache.get(key)
+    if not isinstance(entry, Entry):
+        entry = None
+    if entry is not None and not _should_refresh(entry, beta):
+        return entry.value
+    if not getattr(settings, 'CACHE_SINGLE_FLIGHT', True):
+        return _compute(cache, key, compute, timeout, cacheable)
+
+    lock_timeout = getattr(settings, 'CACHE_LOCK_TIMEOUT', LOCK_TIMEOUT)
+    lock_key = LOCK_KEY.format(key)
+    deadline = time.monotonic() + lock_timeout
+    token = uuid.uuid4().hex
+    while True:
+        if cache.add(lock_key, token, lock_timeout):
+            shared = (RESULT_KEY.format(key, token), lock_timeout)
+            try:
+                return _compute(
+                    cache, key, compute, timeout, cacheable, shared
+                )
+            finally:
+                _unlock(cache, lock_key, token)
+        if entry is not None:
+            # Пересчитывает другой процесс, пока отдаём старое.
+            return entry.value
+        if time.monotonic() >= deadline:
+            return compute()
+        found = _wait(cache, key, lock_key)
+        if found is not None:
+            return found.value
@@ -0,0 +1,110 @@
+# core/compression.py
+"""Сжатие ответов gzip и brotli (brotli — если пакет установлен).
+
+Компрессоры потоковые: каждый кусок сжимается и сбрасывается сразу,
+поэтому StreamingHttpResponse уходит клиенту частями, а не копится
+в памяти целиком.
+"""
+import zlib
+
+from django.conf import settings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+GZIP_LEVEL = 6
+# Для динамических страниц: 11 жмёт лучше, но в разы дороже по CPU.
+BROTLI_QUALITY = 5
+
+
+def accepted_values(header):
+    """Значения заголовка Accept или Accept-Encoding с ненулевым q."""
+    accepted = set()
+    for part in header.split(','):
+        value, *params = part.split(';')
+        value = value.strip().lower()
+        try:
+            quality = next(
+                (float(param.strip()[2:]) for param in params
+                 if param.strip().lower().startswith('q=')),
+                1.0
+            )
+        except ValueError:
+            continue
+        if value and quality > 0:
+            accepted.add(value)
+    return accepted
+
+
+def available_encodings():
+    """Поддерживаемые кодировки в порядке предпочтения."""
+    if brotli is None:
+        return ('gzip',)
+    return ('br', 'gzip')
+
+
+def negotiate(request):
+    """Лучшая кодировка, которую принимает клиент, или None."""
+    accepted = accepted_values(
+        request.META.get('HTTP_ACCEPT_ENCODING', '')
+    )
+    for encoding in available_encodings():
+        if encoding in accepted or '*' in accepted:
+            return encoding
+    return None
+
+
+class GzipCompressor:
+    def __init__(self):
+        level = getattr(settings, 'COMPRESSION_GZIP_LEVEL', GZIP_LEVEL)
+        # wbits=31: заголовок и контрольная сумма gzip, а не голый zlib.
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        return self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self.compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliCompressor:
+    def __init__(self):
+        self.compressor = brotli.Compressor(
+            quality=getattr(
+                settings, 'COMPRESSION_BROTLI_QUALITY', BROTLI_QUALITY
+            )
+        )
+
+    def compress(self, data):
+        return self.compressor.process(data)
+
+    def flush(self):
+        return self.compressor.flush()
+
+    def finish(self):
+        return self.compressor.finish()
+
+
+def get_compressor(encoding):
+    if encoding == 'br':
+        return BrotliCompressor()
+    return GzipCompressor()
+
+
+def compress(encoding, data):
+    compressor = get_compressor(encoding)
+    return compressor.compress(data) + compressor.finish()
+
+
+def compress_stream(encoding, chunks):
+    compressor = get_compressor(encoding)
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
@@ -0,0 +1,93 @@
+# core/db.py
+"""Профиль SQLite для боевой нагрузки.
+
+PRAGMA применяются к каждому новому соединению (connection_created):
+WAL позволяет читателям не ждать писателя, synchronous=NORMAL в WAL
+безопасен при падении процесса, mmap и увеличенный кеш страниц
+снимают часть чтений с read(). Запись всё равно одна на базу, поэтому
+пишущие вьюхи обёрнуты в retry_on_locked: busy_timeout ждёт
+освобождения блокировки, а «database is locked», которую SQLite
+отдаёт сразу (устаревший снимок в WAL), повторяется с паузой.
+"""
+import functools
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connection
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger('core.db')
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    # Отрицательное значение — размер в КиБ, а не в страницах.
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+LOCKED_RETRIES = 5
+LOCKED_BASE_DELAY = 0.05
+
+
+def get_pragmas():
+    pragmas = {**SQLITE_PRAGMAS, **getattr(settings, 'SQLITE_PRAGMAS', {})}
+    return {name: value for name, value in pragmas.items()
+            if value is not None}
+
+
+def apply_pragmas(cursor, pragmas):
+    for name, value in pragmas.items():
+        cursor.execute(f'PRAGMA {name} = {value}')
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        apply_pragmas(cursor, get_pragmas())
+
+
+def is_locked_error(error):
+    message = str(error).lower()
+    return 'database is locked' in message or 'table is locked' in message
+
+
+def retry_on_locked(view=None, *, retries=None, base_delay=None):
+    """Повторяет вьюху, если SQLite ответил «database is locked».
+
+    Пауза растёт экспоненциально со случайным разбросом, чтобы
+    одновременно упавшие запросы не столкнулись снова. Внутри уже
+    открытой транзакции повтор бессмыслен — ошибка пробрасывается.
+    """
+    if view is None:
+        return functools.partial(
+            retry_on_locked, retries=retries, base_delay=base_delay
+        )
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        attempts = retries if retries is not None else getattr(
+            settings, 'SQLITE_LOCKED_RETRIES', LOCKED_RETRIES
+        )
+        delay = base_delay if base_delay is not None else LOCKED_BASE_DELAY
+        for attempt in range(attempts + 1):
+            try:
+                return view(request, *args, **kwargs)
+            except OperationalError as error:
+                if (not is_locked_error(error) or attempt == attempts
+                        or connection.in_atomic_block):
+                    raise
+                pause = delay * 2 ** attempt * random.uniform(0.5, 1.5)
+                logger.warning(
+                    '%s: база занята, повтор %d через %.3f с',
+                    request.path, attempt + 1, pause
+                )
+                time.sleep(pause)
+
+    return wrapper
@@ -0,0 +1,173 @@
+# core/instance_cache.py
+"""Кеш экземпляров моделей по первичному ключу и уникальным полям.
+
+Два уровня: LRU в памяти процесса перед общим кешем Django.
+Запись в процессе-источнике сразу чистит оба уровня (сигналы
+post_save/post_delete), а в остальных процессах локальная копия живёт
+не дольше INSTANCE_CACHE_LOCAL_TTL секунд — это и есть предел
+устаревания. Экземпляры хранятся сериализованными: каждый get()
+отдаёт свежую копию, и правки во вьюхе не попадут в кеш.
+Обновления через QuerySet.update() сигналов не шлют — после них
+нужно вызвать forget().
+"""
+import hashlib
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.http import Http404
+
+INSTANCE_CACHE_TIMEOUT = 60 * 15
+INSTANCE_CACHE_LOCAL_TTL = 5
+INSTANCE_CACHE_LOCAL_SIZE = 1024
+KEY = 'instance:{}:{}:{}'
+
+_registry = []
+
+
+class LocalLRU:
+    """Потокобезопасный LRU со сроком жизни записей."""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class InstanceCache:
+    def __init__(self, model, fields):
+        self.model = model
+        self.fields = tuple(fields)
+        self.label = model._meta.label_lower
+        self.local = LocalLRU(
+            getattr(settings, 'INSTANCE_CACHE_LOCAL_SIZE',
+                    INSTANCE_CACHE_LOCAL_SIZE),
+            getattr(settings, 'INSTANCE_CACHE_LOCAL_TTL',
+                    INSTANCE_CACHE_LOCAL_TTL),
+        )
+
+    def key(self, field, value):
+        # Значения полей — пользовательский ввод, в ключ идёт их хеш.
+        digest = hashlib.md5(str(value).encode()).hexdigest()
+        return KEY.format(self.label, field, digest)
+
+    def get(self, **lookup):
+        """Экземпляр по одному полю; нет в базе — model.DoesNotExist."""
+        [(field, value)] = lookup.items()
+        if field not in self.fields:
+            raise ValueError(f'{self.label}: поле {field} не кешируется')
+        key = self.key(field, value)
+        data = self.local.get(key)
+        if data is None:
+            data = cache.get(key)
+            if data is None:
+                # Даже во вьюхах с read_from_replica: отстающая реплика
+                # положила бы в кеш старую строку на весь его срок.
+                instance = self.model._default_manager.using(
+                    DEFAULT_DB_ALIAS
+                ).get(**lookup)
+                data = pickle.dumps(instance, pickle.HIGHEST_PROTOCOL)
+                cache.set(key, data, getattr(
+                    settings, 'INSTANCE_CACHE_TIMEOUT', INSTANCE_CACHE_TIMEOUT
+                ))
+            self.local.set(key, data)
+        return pickle.loads(data)
+
+    def get_or_404(self, **lookup):
+        try:
+            return self.get(**lookup)
+        except self.model.DoesNotExist:
+            raise Http404(f'{self.model._meta.object_name} не найден')
+
+    def forget(self, **values):
+        """Удаляет экземпляр из обоих уровней по значениям полей."""
+        keys = [self.key(field, value) for field, value in values.items()
+                if value is not None]
+        cache.delete_many(keys)
+        for key in keys:
+            self.local.delete(key)
+
+    def values(self, instance):
+        return {field: getattr(instance, field) for field in self.fields}
+
+    def remember_old_values(self, sender, instance, raw=False,
+                            update_fields=None, **kwargs):
+        instance._instance_cache_old = None
+        fields = [field for field in self.fields if field != 'pk']
+        if update_fields is not None:
+            # Например, last_login при входе: ключевые поля не меняются.
+            fields = [field for field in fields if field in update_fields]
+        if instance.pk and fields and not raw:
+            old = sender._base_manager.filter(pk=instance.pk).values(
+                *fields
+            ).first()
+            instance._instance_cache_old = old
+
+    def invalidate(self, sender, instance, **kwargs):
+        values = self.values(instance)
+        old = getattr(instance, '_instance_cache_old', None) or {}
+        self.forget(**values)
+        for field, value in old.items():
+            if value != values[field]:
+                self.forget(**{field: value})
+        # Чтение до коммита могло снова положить в кеш старую строку.
+        transaction.on_commit(lambda: self.forget(**values))
+
+
+def register(model, fields=('pk',)):
+    """Заводит кеш экземпляров модели и подключает сигналы очистки."""
+    instance_cache = InstanceCache(model, fields)
+    uid = f'instance_cache:{instance_cache.label}'
+    pre_save.connect(
+        instance_cache.remember_old_values, sender=model,
+        weak=False, dispatch_uid=uid
+    )
+    post_save.connect(
+        instance_cache.invalidate, sender=model,
+        weak=False, dispatch_uid=uid
+    )
+    post_delete.connect(
+        instance_cache.invalidate, sender=model,
+        weak=False, dispatch_uid=uid
+    )
+    _registry.append(instance_cache)
+    return instance_cache
+
+
+def clear_local():
+    """Очищает локальный уровень всех кешей (для тестов)."""
+    for instance_cache in _registry:
+        instance_cache.local.clear()
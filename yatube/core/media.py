@@ -0,0 +1,215 @@
+# core/media.py
+"""Отдача загруженных файлов из MEDIA_ROOT без DEBUG.
+
+Режим задаёт MEDIA_SERVE_MODE:
+    'file'       — FileResponse; под gunicorn/uwsgi он уходит
+                   в wsgi.file_wrapper и дальше в os.sendfile;
+    'x-accel'    — пустой ответ с X-Accel-Redirect для nginx
+                   (location из MEDIA_X_ACCEL_PREFIX помечен internal);
+    'x-sendfile' — пустой ответ с X-Sendfile для Apache/lighttpd.
+В режиме 'file' поддерживаются запросы Range (один диапазон) и If-Range.
+Имена по хешу содержимого (картинки постов и миниатюры sorl) никогда
+не меняют содержимое, поэтому кешируются на год с immutable.
+"""
+import mimetypes
+import os
+import re
+import time
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.dispatch import Signal
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.encoding import escape_uri_path
+from django.utils.http import http_date, parse_http_date_safe
+
+MEDIA_SERVE_MODE = 'file'
+MEDIA_X_ACCEL_PREFIX = '/protected-media/'
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+MEDIA_MAX_AGE = 60 * 60
+# xx/yy/xxyy… — шардированное имя по хешу: sha256 у хранилища постов,
+# md5 у миниатюр sorl.
+CONTENT_ADDRESSED = re.compile(
+    r'(?:^|/)(?P<a>[0-9a-f]{2})/(?P<b>[0-9a-f]{2})/'
+    r'(?P=a)(?P=b)(?:[0-9a-f]{28}|[0-9a-f]{60})(?:\.\w+)?$'
+)
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# Файл отдан клиенту (в том числе ответом 304); path — от MEDIA_ROOT.
+media_served = Signal(providing_args=['path'])
+
+
+def get_mode():
+    return getattr(settings, 'MEDIA_SERVE_MODE', MEDIA_SERVE_MODE)
+
+
+def is_content_addressed(path):
+    return CONTENT_ADDRESSED.search(path) is not None
+
+
+def parse_range(header, size):
+    """(начало, конец включительно) для Range или None.
+
+    Несколько диапазонов и нераспознанные единицы не поддерживаются —
+    тогда отдаётся весь файл, как разрешает RFC 7233.
+    """
+    match = RANGE.match(header.strip())
+    if match is None:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        length = int(end)
+        if length == 0:
+            raise ValueError('Пустой суффиксный диапазон')
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start > end or start >= size:
+        raise ValueError('Диапазон за пределами файла')
+    return start, end
+
+
+class RangeFile:
+    """Файл, из которого читается не больше length байт с offset.
+
+    fileno() и позиция в файле остаются настоящими, поэтому
+    wsgi.file_wrapper отдаёт диапазон через sendfile.
+    """
+
+    def __init__(self, file, offset, length):
+        self.file = file
+        self.remaining = length
+        file.seek(offset)
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def tell(self):
+        return self.file.tell()
+
+    def seek(self, *args):
+        return self.file.seek(*args)
+
+    def close(self):
+        self.file.close()
+
+
+def _if_range_matches(request, etag, mtime):
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range is None:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    since = parse_http_date_safe(if_range)
+    return since is not None and int(mtime) <= since
+
+
+def find_file(root, path):
+    """Полный путь и stat файла path внутри root, иначе Http404."""
+    try:
+        full_path = safe_join(root, path)
+    except SuspiciousFileOperation:
+        raise Http404('Нет такого файла')
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        raise Http404('Нет такого файла')
+    if not os.path.isfile(full_path):
+        raise Http404('Нет такого файла')
+    return full_path, stat
+
+
+def make_etag(stat):
+    return f'"{stat.st_size:x}-{int(stat.st_mtime):x}"'
+
+
+def set_cache_control(response, immutable, max_age=MEDIA_MAX_AGE):
+    if immutable:
+        response['Cache-Control'] = (
+            f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+        )
+        response['Expires'] = http_date(time.time() + IMMUTABLE_MAX_AGE)
+    else:
+        response['Cache-Control'] = f'public, max-age={max_age}'
+
+
+def serve(request, path):
+    full_path, stat = find_file(settings.MEDIA_ROOT, path)
+    media_served.send(sender=None, path=path)
+    etag = make_etag(stat)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(stat.st_mtime)
+    )
+    if response is None:
+        content_type, encoding = mimetypes.guess_type(full_path)
+        mode = get_mode()
+        if mode in ('x-accel', 'x-sendfile'):
+            response = _offload_response(mode, full_path, path, content_type)
+        else:
+            response = file_response(
+                request, full_path, stat, etag, content_type, encoding
+            )
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    set_cache_control(response, is_content_addressed(path))
+    return response
+
+
+def _offload_response(mode, full_path, path, content_type):
+    # Range, If-Range и sendfile сделает веб-сервер. Путь в заголовке
+    # кодируется как URI: не-ASCII имена Django иначе закодировал бы
+    # по RFC 2047, и сервер не нашёл бы файл.
+    response = HttpResponse(
+        content_type=content_type or 'application/octet-stream'
+    )
+    if mode == 'x-accel':
+        prefix = getattr(
+            settings, 'MEDIA_X_ACCEL_PREFIX', MEDIA_X_ACCEL_PREFIX
+        )
+        response['X-Accel-Redirect'] = escape_uri_path(prefix + path)
+    else:
+        response['X-Sendfile'] = escape_uri_path(full_path)
+    return response
+
+
+def file_response(request, full_path, stat, etag, content_type,
+                  encoding=None):
+    """FileResponse на весь файл или на диапазон из заголовка Range."""
+    content_type = content_type or 'application/octet-stream'
+    size = stat.st_size
+    byte_range = None
+    header = request.META.get('HTTP_RANGE')
+    if header and _if_range_matches(request, etag, stat.st_mtime):
+        try:
+            byte_range = parse_range(header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+    file = open(full_path, 'rb')
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type)
+        response['Content-Length'] = size
+    else:
+        start, end = byte_range
+        response = FileResponse(
+            RangeFile(file, start, end - start + 1),
+            content_type=content_type, status=206
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = end - start + 1
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response['Accept-Ranges'] = 'bytes'
+    return response
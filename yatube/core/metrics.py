@@ -0,0 +1,325 @@
+# core/metrics.py
+"""Метрики горячего пути: гистограммы по вьюхам в формате Prometheus.
+
+Каждый процесс копит счётчики у себя в памяти и раз в
+METRICS_FLUSH_INTERVAL секунд (и при выходе) сбрасывает их целиком
+в свой файл в METRICS_SPOOL_DIR. /metrics складывает файлы всех
+воркеров, поэтому неважно, какой из них ответил на опрос. Файлы
+завершившихся процессов остаются, чтобы счётчики не убывали; каталог
+очищают при перезапуске сервиса. Без METRICS_SPOOL_DIR отдаются только
+метрики текущего процесса.
+"""
+import atexit
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import (
+    DjangoTemplates, Template, reraise
+)
+from django.template.exceptions import TemplateDoesNotExist
+
+FLUSH_INTERVAL = 5
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERIES = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+BYTES = tuple(256 * 4 ** power for power in range(8))
+
+# Имя: (тип, описание, границы корзин гистограммы).
+METRICS = {
+    'yatube_http_responses_total': (
+        'counter', 'Ответы по вьюхам и кодам.', None),
+    'yatube_http_request_duration_seconds': (
+        'histogram', 'Время ответа вьюхи с middleware.', SECONDS),
+    'yatube_db_queries': (
+        'histogram', 'Запросов к базе за запрос.', QUERIES),
+    'yatube_db_query_duration_seconds': (
+        'histogram', 'Суммарное время запросов к базе.', SECONDS),
+    'yatube_template_render_seconds': (
+        'histogram', 'Время отрисовки шаблонов.', SECONDS),
+    'yatube_http_response_bytes': (
+        'histogram', 'Размер тела ответа после сжатия.', BYTES),
+}
+
+_template_time = ContextVar('metrics_template_time', default=None)
+
+
+class Registry:
+    """Счётчики и гистограммы процесса.
+
+    Корзины хранятся некумулятивно, последняя — +Inf; в формат
+    Prometheus они переводятся при выводе.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pid = None
+        self._reset()
+
+    def _reset(self):
+        # После fork воркер начинает с нуля, а не с копии родителя.
+        self.pid = os.getpid()
+        self.token = uuid.uuid4().hex[:8]
+        self.counters = {}
+        self.histograms = {}
+        self.flushed = time.monotonic()
+
+    def _check_pid(self):
+        if self.pid != os.getpid():
+            self._reset()
+
+    def inc(self, name, labels, value=1):
+        key = (name, labels)
+        with self.lock:
+            self._check_pid()
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        index = next(
+            (i for i, bound in enumerate(buckets) if value <= bound),
+            len(buckets)
+        )
+        key = (name, labels)
+        with self.lock:
+            self._check_pid()
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [
+                    [0] * (len(buckets) + 1), 0.0
+                ]
+            histogram[0][index] += 1
+            histogram[1] += value
+
+    def snapshot(self):
+        with self.lock:
+            self._check_pid()
+            return {
+                'counters': [
+                    [name, list(labels), value]
+                    for (name, labels), value in self.counters.items()
+                ],
+                'histograms': [
+                    [name, list(labels), list(counts), total]
+                    for (name, labels), (counts, total)
+                    in self.histograms.items()
+                ],
+            }
+
+    def path(self, spool):
+        return os.path.join(spool, f'{self.pid}-{self.token}.json')
+
+    def flush(self, force=False):
+        spool = get_spool_dir()
+        if not spool:
+            return
+        interval = getattr(
+            settings, 'METRICS_FLUSH_INTERVAL', FLUSH_INTERVAL
+        )
+        if not force and time.monotonic() - self.flushed < interval:
+            return
+        self.flushed = time.monotonic()
+        data = self.snapshot()
+        if not data['counters'] and not data['histograms']:
+            return
+        os.makedirs(spool, exist_ok=True)
+        path = self.path(spool)
+        temporary = f'{path}.{threading.get_ident()}.tmp'
+        with open(temporary, 'w') as file:
+            json.dump(data, file)
+        # Читатель видит либо старый файл, либо новый целиком.
+        os.replace(temporary, path)
+
+
+registry = Registry()
+
+
+def get_spool_dir():
+    return getattr(settings, 'METRICS_SPOOL_DIR', None)
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        registry.flush(force=True)
+    except Exception:
+        pass
+
+
+class QueryTimer:
+    """Число и время запросов ко всем базам без разбора SQL."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self._stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+
+class TemplateTimer:
+    """Копит время отрисовки шаблонов текущего запроса."""
+
+    def __init__(self):
+        self.duration = 0.0
+        self._token = None
+
+    def __enter__(self):
+        self._token = _template_time.set(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        _template_time.reset(self._token)
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        timer = _template_time.get()
+        if timer is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timer.duration += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates, который засекает отрисовку шаблонов верхнего уровня.
+
+    {% include %} и inclusion-теги работают внутри движка и попадают
+    во время родительского шаблона, а не считаются второй раз.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(
+                self.engine.get_template(template_name), self
+            )
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+def observe_request(view, status, duration, queries, template, size):
+    labels = (('view', view),)
+    registry.inc(
+        'yatube_http_responses_total', labels + (('status', str(status)),)
+    )
+    registry.observe('yatube_http_request_duration_seconds', labels, duration)
+    registry.observe('yatube_db_queries', labels, queries.count)
+    registry.observe(
+        'yatube_db_query_duration_seconds', labels, queries.duration
+    )
+    registry.observe('yatube_template_render_seconds', labels, template)
+    if size is not None:
+        registry.observe('yatube_http_response_bytes', labels, size)
+    registry.flush()
+
+
+def _load_spool(spool):
+    try:
+        names = os.listdir(spool)
+    except FileNotFoundError:
+        return
+    for name in names:
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(spool, name)) as file:
+                yield json.load(file)
+        except (OSError, ValueError):
+            # Файл удалили между listdir и open.
+            continue
+
+
+def collect():
+    """Сумма метрик всех процессов: (счётчики, гистограммы)."""
+    spool = get_spool_dir()
+    if spool:
+        registry.flush(force=True)
+        snapshots = list(_load_spool(spool))
+    else:
+        snapshots = [registry.snapshot()]
+    counters, histograms = {}, {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, counts, total in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.setdefault(key, [[0] * len(counts), 0.0])
+            merged[0] = [a + b for a, b in zip(merged[0], counts)]
+            merged[1] += total
+    return counters, histograms
+
+
+def _escape(value):
+    return (str(value).replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        f'{name}="{_escape(value)}"' for name, value in labels
+    ) + '}'
+
+
+def _number(value):
+    if isinstance(value, float) and math.isinf(value):
+        return '+Inf'
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render():
+    """Текст метрик в формате Prometheus 0.0.4."""
+    counters, histograms = collect()
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'counter':
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{_labels(labels)} {value}')
+            continue
+        for (metric, labels), (counts, total) in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets + (math.inf,), counts):
+                cumulative += count
+                bucket_labels = labels + (('le', _number(float(bound))),)
+                lines.append(
+                    f'{name}_bucket{_labels(bucket_labels)} {cumulative}'
+                )
+            lines.append(f'{name}_sum{_labels(labels)} {_number(total)}')
+            lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
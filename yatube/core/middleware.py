@@ -0,0 +1,232 @@
+# core/middleware.py
+import logging
+import time
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from . import compression, metrics, profiling
+from .queries import QueryCollector
+
+logger = logging.getLogger('core.queries')
+
+QUERY_INSPECTOR_DEFAULTS = {
+    'ENABLED': False,
+    # Сколько одинаковых по форме запросов считать признаком N+1.
+    'REPEAT_THRESHOLD': 3,
+    # Писать найденные повторы в лог core.queries.
+    'LOG_REPEATS': True,
+    # Лимиты запросов по имени вьюхи ('posts:index') или пути.
+    'BUDGETS': {},
+    'DEFAULT_BUDGET': None,
+    # Таблицы, запросы к которым не входят в лимит: например, разовое
+    # создание миниатюр при первой отрисовке картинки.
+    'UNBUDGETED_TABLES': (),
+    # Падать при превышении лимита (для тестов) вместо записи в лог.
+    'RAISE': False,
+}
+SAVEPOINT_STATEMENTS = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO')
+
+
+COMPRESSION_MIN_SIZE = 200
+# Типы, которые уже сжаты: повторное сжатие только тратит CPU.
+COMPRESSED_TYPES = (
+    'image/', 'video/', 'audio/', 'font/woff',
+    'application/zip', 'application/gzip', 'application/x-gzip',
+    'application/pdf', 'application/octet-stream',
+)
+UNCOMPRESSED_IMAGES = ('image/svg+xml', 'image/x-icon', 'image/bmp')
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def get_inspector_config():
+    return {
+        **QUERY_INSPECTOR_DEFAULTS,
+        **getattr(settings, 'QUERY_INSPECTOR', {}),
+    }
+
+
+def budgeted_count(collector, tables):
+    """Число запросов без обращений к таблицам tables.
+
+    Точки сохранения тоже не считаются: в тестах их даёт каждый atomic
+    внутри транзакции теста.
+    """
+    quoted = [f'"{table}"' for table in tables]
+    return sum(
+        not shape.startswith(SAVEPOINT_STATEMENTS)
+        and not any(table in shape for table in quoted)
+        for shape, _, _ in collector.queries
+    )
+
+
+class QueryInspectorMiddleware:
+    """Считает запросы к базе за запрос и ищет повторы (N+1).
+
+    Повторы одной формы SQL пишутся в лог core.queries вместе с местом
+    в шаблоне и коде, откуда они пришли. Включается настройкой
+    QUERY_INSPECTOR['ENABLED'] и может ронять запрос при превышении
+    лимита запросов вьюхи.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        config = get_inspector_config()
+        if not config['ENABLED']:
+            return self.get_response(request)
+        with QueryCollector() as collector:
+            response = self.get_response(request)
+        match = request.resolver_match
+        view_name = match.view_name if match else request.path
+        self.report(config, view_name, collector)
+        return response
+
+    def report(self, config, view_name, collector):
+        if config['LOG_REPEATS']:
+            self.log_repeats(config, view_name, collector)
+        budget = config['BUDGETS'].get(view_name, config['DEFAULT_BUDGET'])
+        if budget is None:
+            return
+        count = budgeted_count(collector, config['UNBUDGETED_TABLES'])
+        if count <= budget:
+            return
+        message = f'{view_name}: {count} запросов к базе при лимите {budget}'
+        if config['RAISE']:
+            raise QueryBudgetExceeded(message)
+        logger.error(message)
+
+    def log_repeats(self, config, view_name, collector):
+        for shape, count, locations in collector.repeated(
+                config['REPEAT_THRESHOLD']):
+            logger.warning(
+                'N+1 в %s: %d одинаковых запросов %s из %s',
+                view_name, count, shape,
+                ', '.join(
+                    f'{location} (x{times})'
+                    for location, times in locations.most_common()
+                ),
+            )
+
+
+class MetricsMiddleware:
+    """Пишет в core.metrics время ответа, запросы к базе, отрисовку
+    шаблонов и размер ответа по имени вьюхи.
+
+    Стоит первой, чтобы учесть все middleware и размер после сжатия.
+    У потоковых ответов размер известен только из Content-Length.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'METRICS_ENABLED', True):
+            return self.get_response(request)
+        started = time.perf_counter()
+        with metrics.QueryTimer() as queries, \
+                metrics.TemplateTimer() as templates:
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+        match = request.resolver_match
+        # Путь в метку не идёт: у 404 их бесконечно много.
+        view = match.view_name if match else 'unresolved'
+        if response.streaming:
+            size = response.get('Content-Length')
+            size = int(size) if size else None
+        else:
+            size = len(response.content)
+        metrics.observe_request(
+            view, response.status_code, duration, queries,
+            templates.duration, size
+        )
+        return response
+
+
+class ProfilerMiddleware:
+    """Профилирует cProfile выбранные запросы (core.profiling).
+
+    Запрос попадает в выборку с вероятностью PROFILER['SAMPLE_RATE']
+    или по подписанному заголовку X-Profile.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        config = profiling.get_profiler_config()
+        if not profiling.should_profile(request, config):
+            return self.get_response(request)
+        profiler = profiling.start()
+        if profiler is None:
+            return self.get_response(request)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+        duration = time.perf_counter() - started
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        path = profiling.save(profiler, view, duration, config)
+        logger.info('Профиль %s: %s', request.path, path)
+        return response
+
+
+def is_compressible(response):
+    if response.status_code == 206 or response.has_header('Content-Range'):
+        return False
+    if response.has_header('Content-Encoding'):
+        return False
+    if 'no-transform' in response.get('Cache-Control', ''):
+        return False
+    content_type = response.get('Content-Type', '').lower()
+    if content_type.startswith(UNCOMPRESSED_IMAGES):
+        return True
+    return not content_type.startswith(COMPRESSED_TYPES)
+
+
+class CompressionMiddleware:
+    """Сжимает ответы brotli или gzip по Accept-Encoding.
+
+    Потоковые ответы сжимаются по кускам, уже сжатые типы (картинки,
+    архивы, готовые .gz из core.static) отдаются как есть.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not is_compressible(response):
+            return response
+        min_size = getattr(
+            settings, 'COMPRESSION_MIN_SIZE', COMPRESSION_MIN_SIZE
+        )
+        if not response.streaming and len(response.content) < min_size:
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = compression.negotiate(request)
+        if encoding is None:
+            return response
+        if response.streaming:
+            response.streaming_content = compression.compress_stream(
+                encoding, response.streaming_content
+            )
+            del response['Content-Length']
+        else:
+            content = compression.compress(encoding, response.content)
+            if len(content) >= len(response.content):
+                return response
+            response.content = content
+            response['Content-Length'] = str(len(content))
+        # Сжатое тело уже не побайтно то же, что и несжатое (RFC 7232).
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
@@ -12,3 +12,20 @@ class CreatedModel(models.Model):
     class Meta:
         # Это абстрактная модель:
         abstract = True
+
+
+class StoredFile(models.Model):
+    """Файл в хранилище по хешу содержимого и число ссылок на него.
+
+    Одинаковые загрузки ложатся в один файл, refs считает, сколько
+    раз его сохранили; файл удаляется, когда ссылок не остаётся.
+    """
+    name = models.CharField('Файл', max_length=255, primary_key=True)
+    refs = models.PositiveIntegerField('Ссылок', default=0)
+
+    class Meta:
+        verbose_name_plural = 'Файлы хранилища'
+        verbose_name = 'Файл хранилища'
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,123 @@
+# core/profiling.py
+"""Выборочное профилирование запросов через cProfile.
+
+Профилируется доля SAMPLE_RATE случайных запросов и каждый запрос
+с заголовком X-Profile, подписанным SECRET_KEY (manage.py
+profile_token). Профили складываются в DIR под именами
+«время-вьюха-длительность-pid.prof»; старше MAX_FILES последних
+удаляются. Сводку по ним печатает manage.py profile_summary.
+"""
+import cProfile
+import os
+import random
+import re
+import time
+
+from django.conf import settings
+from django.core import signing
+
+PROFILER_DEFAULTS = {
+    'ENABLED': False,
+    'SAMPLE_RATE': 0.0,
+    'DIR': None,
+    'MAX_FILES': 200,
+    # Сколько секунд действует подписанный заголовок.
+    'TOKEN_MAX_AGE': 60 * 10,
+}
+HEADER = 'HTTP_X_PROFILE'
+SALT = 'core.profiling'
+TOKEN_VALUE = 'profile'
+UNSAFE = re.compile(r'[^\w.]+')
+FILE_NAME = re.compile(
+    r'^(?P<time>\d+)-(?P<view>.+)-(?P<ms>\d+)ms-(?P<pid>\d+)\.prof$'
+)
+
+
+def get_profiler_config():
+    return {**PROFILER_DEFAULTS, **getattr(settings, 'PROFILER', {})}
+
+
+def make_token():
+    """Значение заголовка X-Profile."""
+    return signing.TimestampSigner(salt=SALT).sign(TOKEN_VALUE)
+
+
+def has_valid_token(request, config):
+    token = request.META.get(HEADER)
+    if not token:
+        return False
+    try:
+        value = signing.TimestampSigner(salt=SALT).unsign(
+            token, max_age=config['TOKEN_MAX_AGE']
+        )
+    except signing.BadSignature:
+        return False
+    return value == TOKEN_VALUE
+
+
+def should_profile(request, config):
+    if not config['ENABLED'] or not config['DIR']:
+        return False
+    if has_valid_token(request, config):
+        return True
+    return random.random() < config['SAMPLE_RATE']
+
+
+def start():
+    """Включённый cProfile или None, если в потоке уже идёт профилирование."""
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        return None
+    return profiler
+
+
+def profile_name(view, duration):
+    view = UNSAFE.sub('.', view).strip('.') or 'unresolved'
+    return (f'{time.time_ns()}-{view}-{int(duration * 1000)}ms-'
+            f'{os.getpid()}.prof')
+
+
+def save(profiler, view, duration, config):
+    """Пишет профиль в DIR и удаляет лишние старые."""
+    directory = config['DIR']
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, profile_name(view, duration))
+    temporary = f'{path}.tmp'
+    profiler.dump_stats(temporary)
+    os.replace(temporary, path)
+    rotate(directory, config['MAX_FILES'])
+    return path
+
+
+def rotate(directory, max_files):
+    names = sorted(
+        name for name in os.listdir(directory) if FILE_NAME.match(name)
+    )
+    for name in names[:max(len(names) - max_files, 0)]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            # Удалил соседний воркер.
+            pass
+
+
+def list_profiles(directory, view=None, min_ms=0):
+    """Профили каталога: список (путь, вьюха, миллисекунды)."""
+    profiles = []
+    try:
+        names = sorted(os.listdir(directory))
+    except FileNotFoundError:
+        return profiles
+    for name in names:
+        match = FILE_NAME.match(name)
+        if match is None:
+            continue
+        ms = int(match['ms'])
+        if view is not None and match['view'] != UNSAFE.sub('.', view):
+            continue
+        if ms < min_ms:
+            continue
+        profiles.append((os.path.join(directory, name), match['view'], ms))
+    return profiles
@@ -0,0 +1,116 @@
+# core/queries.py
+"""Сбор SQL-запросов запроса с привязкой к месту в коде и шаблоне."""
+import inspect
+import os
+import re
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+NUMBER = re.compile(r'\b\d+(\.\d+)?\b')
+STRING = re.compile(r"'(?:[^']|'')*'")
+IN_LIST = re.compile(r'\((?:\s*\?\s*,)+\s*\?\s*\)')
+
+THIS_FILE = os.path.abspath(__file__)
+# Обёртки execute, которые стоят в стеке между запросом и его автором.
+WRAPPER_FILES = {
+    THIS_FILE,
+    os.path.join(os.path.dirname(THIS_FILE), 'metrics.py'),
+}
+
+
+def sql_shape(sql):
+    """SQL без конкретных значений: одинаковые запросы дают одну форму."""
+    shape = STRING.sub('?', sql).replace('%s', '?')
+    shape = NUMBER.sub('?', shape)
+    return IN_LIST.sub('(...)', shape)
+
+
+def _is_project_file(filename):
+    filename = os.path.abspath(filename)
+    return (
+        filename.startswith(settings.BASE_DIR)
+        and filename not in WRAPPER_FILES
+        and 'site-packages' not in filename
+    )
+
+
+def query_location():
+    """Место, откуда пришёл запрос: строка кода проекта и тег шаблона."""
+    code = template = None
+    frame = inspect.currentframe()
+    try:
+        while frame is not None and (code is None or template is None):
+            info = frame.f_code
+            if code is None and _is_project_file(info.co_filename):
+                path = os.path.relpath(info.co_filename, settings.BASE_DIR)
+                code = f'{path}:{frame.f_lineno} in {info.co_name}'
+            if template is None and info.co_name == 'render_annotated':
+                node = frame.f_locals.get('self')
+                origin = getattr(node, 'origin', None)
+                token = getattr(node, 'token', None)
+                if origin is not None and token is not None:
+                    template = f'{origin.template_name}:{token.lineno}'
+            frame = frame.f_back
+    finally:
+        del frame
+    return ' / '.join(part for part in (template, code) if part) or '?'
+
+
+class QueryCollector:
+    """Обёртка execute_wrapper, которая копит запросы во всех базах.
+
+        with QueryCollector() as collector:
+            ...
+        collector.count, collector.duration, collector.repeated(3)
+    """
+
+    def __init__(self, capture_location=True):
+        self.capture_location = capture_location
+        self.queries = []
+        self._stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            location = query_location() if self.capture_location else None
+            self.queries.append(
+                (sql_shape(sql), time.perf_counter() - start, location)
+            )
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def duration(self):
+        return sum(duration for _, duration, _ in self.queries)
+
+    def repeated(self, threshold):
+        """Формы запросов, повторённые не меньше threshold раз.
+
+        Возвращает список (форма, число повторов, места вызова).
+        """
+        counts = Counter(shape for shape, _, _ in self.queries)
+        locations = defaultdict(Counter)
+        for shape, _, location in self.queries:
+            if counts[shape] >= threshold:
+                locations[shape][location] += 1
+        return [
+            (shape, counts[shape], locations[shape])
+            for shape in sorted(locations, key=counts.get, reverse=True)
+        ]
@@ -0,0 +1,141 @@
+# core/routers.py
+"""Чтение лент с реплик, запись — в основную базу.
+
+Реплики перечисляются в DATABASE_REPLICAS (алиасы из DATABASES).
+На реплику уходят только чтения внутри вьюх с read_from_replica;
+всё остальное, включая сессии и вход, читается из основной базы.
+Вьюха с stick_to_primary, которая что-то записала, закрепляет сессию
+за основной базой на DATABASE_REPLICA_STICKY_SECONDS: реплика может
+отставать, а автор должен сразу увидеть свой пост или комментарий.
+Локально реплика — копия SQLite, её обновляет refresh_replica().
+"""
+import functools
+import random
+import sqlite3
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+REPLICA_STICKY_SECONDS = 15
+STICKY_SESSION_KEY = '_db_primary_until'
+
+_reading = ContextVar('replica_reading', default=False)
+_wrote = ContextVar('replica_wrote', default=False)
+
+
+def get_replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', []))
+
+
+def is_pinned(request):
+    session = getattr(request, 'session', None)
+    if session is None:
+        return False
+    return session.get(STICKY_SESSION_KEY, 0) > time.time()
+
+
+def get_replica_lag():
+    """Сколько секунд реплика может отставать от основной базы."""
+    return getattr(
+        settings, 'DATABASE_REPLICA_STICKY_SECONDS', REPLICA_STICKY_SECONDS
+    )
+
+
+def pin(request):
+    request.session[STICKY_SESSION_KEY] = time.time() + get_replica_lag()
+
+
+def reading_from_replica():
+    """Идут ли сейчас чтения на реплику."""
+    return bool(get_replicas()) and _reading.get()
+
+
+@contextmanager
+def read_from_primary():
+    """Чтения внутри блока идут в основную базу даже во вьюхе с репликой.
+
+    Для заполнения кешей: отстающая реплика положила бы туда старые
+    данные на весь срок записи.
+    """
+    token = _reading.set(False)
+    try:
+        yield
+    finally:
+        _reading.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = get_replicas()
+        if replicas and _reading.get():
+            return random.choice(replicas)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        _wrote.set(True)
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db not in get_replicas():
+            # Базы вне реплик (например, migrate --database) решает Django.
+            return None
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии основной базы, связи между ними допустимы.
+        databases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in get_replicas()
+
+
+def read_from_replica(view):
+    """Чтения вьюхи идут на реплику, если сессия не закреплена."""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if is_pinned(request):
+            return view(request, *args, **kwargs)
+        token = _reading.set(True)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _reading.reset(token)
+
+    return wrapper
+
+
+def stick_to_primary(view):
+    """После записи во вьюхе сессия читает из основной базы."""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        token = _wrote.set(False)
+        try:
+            response = view(request, *args, **kwargs)
+            if _wrote.get():
+                pin(request)
+        finally:
+            _wrote.reset(token)
+        return response
+
+    return wrapper
+
+
+def refresh_replica(source, target):
+    """Копирует файл SQLite source в target через online backup API.
+
+    Копия идёт за один шаг под блокировкой чтения source: в WAL основная
+    база при этом принимает записи, а копирование по частям начиналось
+    бы заново после каждой из них. Читатели target до конца своей
+    транзакции видят старый снимок.
+    """
+    source_connection = sqlite3.connect(source)
+    target_connection = sqlite3.connect(target)
+    try:
+        source_connection.backup(target_connection, pages=-1)
+    finally:
+        target_connection.close()
+        source_connection.close()
@@ -0,0 +1,42 @@
+# core/session_backends/__init__.py
+"""Хранилища сессий с ленивой записью.
+
+cached_db — сессия в общем кеше, база — запасная копия; изменения
+только «кешевых» ключей (SESSION_CACHE_ONLY_KEYS) в базу не пишутся.
+signed_cookies — сессия целиком в подписанной cookie, без хранилища.
+
+В обоих срок сессии продлевается не на каждом запросе, а не чаще
+раза в SESSION_REFRESH_INTERVAL: активный пользователь получает
+запись раз в интервал, сессия живёт не меньше
+SESSION_COOKIE_AGE - SESSION_REFRESH_INTERVAL после последнего визита.
+"""
+import time
+
+from django.conf import settings
+
+SESSION_REFRESH_INTERVAL = 60 * 60 * 24
+REFRESHED_KEY = '_refreshed'
+
+
+def get_refresh_interval():
+    return getattr(
+        settings, 'SESSION_REFRESH_INTERVAL', SESSION_REFRESH_INTERVAL
+    )
+
+
+class CoarseRefreshMixin:
+    """Помечает сессию изменённой, когда пора продлить её срок."""
+
+    def load(self):
+        data = super().load()
+        now = int(time.time())
+        if data and now - data.get(REFRESHED_KEY, 0) >= get_refresh_interval():
+            data[REFRESHED_KEY] = now
+            self.modified = True
+        return data
+
+    def save(self, must_create=False):
+        session = self._get_session(no_load=must_create)
+        if session and REFRESHED_KEY not in session:
+            session[REFRESHED_KEY] = int(time.time())
+        super().save(must_create)
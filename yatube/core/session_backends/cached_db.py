@@ -0,0 +1,47 @@
+# core/session_backends/cached_db.py
+from django.conf import settings
+from django.contrib.sessions.backends.cached_db import (
+    SessionStore as CachedDBStore
+)
+
+from . import CoarseRefreshMixin
+
+SESSION_CACHE_ONLY_KEYS = ()
+
+
+def get_cache_only_keys():
+    return set(getattr(
+        settings, 'SESSION_CACHE_ONLY_KEYS', SESSION_CACHE_ONLY_KEYS
+    ))
+
+
+class LazyCachedDBStore(CachedDBStore):
+    """cached_db, который не пишет в базу, если её копия не изменилась."""
+
+    _stored = None
+
+    def _dump_persistent(self, data):
+        cache_only = get_cache_only_keys()
+        return self.serializer().dumps({
+            key: data[key] for key in sorted(data) if key not in cache_only
+        })
+
+    def load(self):
+        data = super().load()
+        self._stored = self._dump_persistent(data) if data else None
+        return data
+
+    def save(self, must_create=False):
+        data = self._get_session(no_load=must_create)
+        dump = self._dump_persistent(data)
+        if (not must_create and self._session_key is not None
+                and dump == self._stored):
+            # Изменились только ключи из SESSION_CACHE_ONLY_KEYS.
+            self._cache.set(self.cache_key, data, self.get_expiry_age())
+            return
+        super().save(must_create)
+        self._stored = dump
+
+
+class SessionStore(CoarseRefreshMixin, LazyCachedDBStore):
+    pass
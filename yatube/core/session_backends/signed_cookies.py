@@ -0,0 +1,10 @@
+# core/session_backends/signed_cookies.py
+from django.contrib.sessions.backends.signed_cookies import (
+    SessionStore as SignedCookieStore
+)
+
+from . import CoarseRefreshMixin
+
+
+class SessionStore(CoarseRefreshMixin, SignedCookieStore):
+    pass
@@ -0,0 +1,123 @@
+# core/static.py
+"""Статика с хешами в именах и заранее сжатыми копиями.
+
+collectstatic через CompressedManifestStaticFilesStorage кладёт в
+STATIC_ROOT файлы вида bootstrap.min.3f2a….css и рядом .gz (и .br,
+если установлен brotli). {% static %} подставляет хешированные имена
+из манифеста, а без манифеста (collectstatic не запускали) — исходные.
+serve() выбирает сжатую копию по Accept-Encoding; файлы с хешем
+в имени кешируются на год с immutable.
+"""
+import gzip
+import mimetypes
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+from django.http import Http404
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from .compression import accepted_values, brotli
+from .media import file_response, find_file, make_etag, set_cache_control
+
+STATIC_MAX_AGE = 60 * 60
+COMPRESSIBLE_EXTENSIONS = (
+    '.css', '.js', '.map', '.svg', '.ico', '.json', '.txt', '.xml', '.html',
+)
+# Файлы меньше этого размера сжатие почти не уменьшает.
+COMPRESS_MIN_SIZE = 256
+# name.0123456789ab.ext — имя, которое даёт ManifestStaticFilesStorage.
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}(?:\.\w+)?$')
+
+
+def _compress_gzip(data):
+    # mtime=0: одинаковый вход даёт одинаковый архив при каждой сборке.
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def _compress_brotli(data):
+    return brotli.compress(data, quality=11)
+
+
+def get_encodings():
+    """(кодировка, расширение, функция сжатия) в порядке предпочтения."""
+    encodings = [('gzip', '.gz', _compress_gzip)]
+    if brotli is not None:
+        encodings.insert(0, ('br', '.br', _compress_brotli))
+    return encodings
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Манифест с хешами плюс .gz/.br рядом с каждым текстовым файлом."""
+
+    manifest_strict = False
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # Файла нет в STATIC_ROOT — ссылаемся на исходное имя.
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        names = set(paths) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if name.endswith(COMPRESSIBLE_EXTENSIONS) and self.exists(name):
+                self.compress(name)
+
+    def compress(self, name):
+        with self.open(name) as source:
+            data = source.read()
+        if len(data) < COMPRESS_MIN_SIZE:
+            return
+        for _, extension, compress in get_encodings():
+            compressed = compress(data)
+            if len(compressed) >= len(data):
+                continue
+            target = name + extension
+            if self.exists(target):
+                self.delete(target)
+            self._save(target, ContentFile(compressed))
+
+
+def serve(request, path):
+    full_path, stat = find_file(settings.STATIC_ROOT, path)
+    content_type, _ = mimetypes.guess_type(full_path)
+    encoding = None
+    if path.endswith(COMPRESSIBLE_EXTENSIONS):
+        accepted = accepted_values(
+            request.META.get('HTTP_ACCEPT_ENCODING', '')
+        )
+        for coding, extension, _ in get_encodings():
+            if coding not in accepted and '*' not in accepted:
+                continue
+            try:
+                full_path, stat = find_file(
+                    settings.STATIC_ROOT, path + extension
+                )
+            except Http404:
+                continue
+            encoding = coding
+            break
+    # У сжатой копии свой размер, а значит и свой ETag.
+    etag = make_etag(stat)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(stat.st_mtime)
+    )
+    if response is None:
+        response = file_response(
+            request, full_path, stat, etag, content_type, encoding
+        )
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    patch_vary_headers(response, ('Accept-Encoding',))
+    set_cache_control(
+        response, HASHED_NAME.search(path) is not None,
+        getattr(settings, 'STATIC_MAX_AGE', STATIC_MAX_AGE)
+    )
+    return response
@@ -0,0 +1,122 @@
+# core/storage.py
+"""Хранилище файлов с именами по хешу содержимого.
+
+Файл posts/photo.jpg ложится в posts/ab/cd/abcd…ef.jpg, где имя —
+SHA-256 содержимого, а два уровня каталогов из его начала держат
+в каждом каталоге не больше нескольких тысяч файлов. Повторная
+загрузка того же содержимого не пишет файл ещё раз, а увеличивает
+счётчик ссылок в StoredFile; delete() уменьшает его и удаляет файл
+вместе с последней ссылкой.
+"""
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+from .models import StoredFile
+
+CHUNK_SIZE = 64 * 1024
+# umask процесса: os.umask() умеет его только заменить, поэтому
+# читаем один раз при импорте и сразу возвращаем.
+UMASK = os.umask(0)
+os.umask(UMASK)
+HASHED_NAME = re.compile(
+    r'^(?:.*/)?(?P<a>[0-9a-f]{2})/(?P<b>[0-9a-f]{2})/'
+    r'(?P=a)(?P=b)[0-9a-f]{60}(?:\.\w+)?$'
+)
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks(CHUNK_SIZE):
+        digest.update(chunk)
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    return digest.hexdigest()
+
+
+def is_hashed_name(name):
+    return HASHED_NAME.match(name) is not None
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage с дедупликацией и шардированием по хешу."""
+
+    def hashed_name(self, name, content):
+        directory, filename = posixpath.split(name.replace('\\', '/'))
+        extension = os.path.splitext(filename)[1].lower()
+        digest = content_hash(content)
+        return posixpath.join(
+            directory, digest[:2], digest[2:4], digest + extension
+        )
+
+    def get_available_name(self, name, max_length=None):
+        # Имя определяется содержимым в _save, совпадение имён —
+        # это совпадение содержимого, а не конфликт.
+        return name
+
+    def _save(self, name, content):
+        name = self.hashed_name(name, content)
+        full_path = self.path(name)
+        if not os.path.exists(full_path):
+            directory = os.path.dirname(full_path)
+            os.makedirs(directory, exist_ok=True)
+            # Пишем во временный файл рядом и ставим на место ссылкой:
+            # параллельная загрузка того же файла не увидит полупустой.
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.part')
+            try:
+                with os.fdopen(fd, 'wb') as tmp:
+                    for chunk in content.chunks(CHUNK_SIZE):
+                        tmp.write(chunk)
+                # mkstemp создаёт файл с правами 0600; обычная загрузка
+                # FileSystemStorage получает 0666 за вычетом umask.
+                mode = self.file_permissions_mode
+                if mode is None:
+                    mode = 0o666 & ~UMASK
+                os.chmod(tmp_path, mode)
+                try:
+                    os.link(tmp_path, full_path)
+                except FileExistsError:
+                    pass
+            finally:
+                os.remove(tmp_path)
+        self._add_ref(name)
+        return name
+
+    def _add_ref(self, name):
+        if StoredFile.objects.filter(name=name).update(refs=F('refs') + 1):
+            return
+        try:
+            with transaction.atomic():
+                StoredFile.objects.create(name=name, refs=1)
+        except IntegrityError:
+            StoredFile.objects.filter(name=name).update(refs=F('refs') + 1)
+
+    def refs(self, name):
+        return StoredFile.objects.filter(name=name).values_list(
+            'refs', flat=True
+        ).first() or 0
+
+    def delete(self, name):
+        """Снимает одну ссылку; файл удаляется вместе с последней."""
+        with transaction.atomic():
+            stored = StoredFile.objects.select_for_update().filter(
+                name=name
+            ).first()
+            if stored is not None and stored.refs > 1:
+                StoredFile.objects.filter(name=name).update(
+                    refs=F('refs') - 1
+                )
+                return
+            if stored is not None:
+                stored.delete()
+            super().delete(name)
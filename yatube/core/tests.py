@@ -1,4 +1,50 @@
-from django.test import Client, TestCase
+import gzip
+import json
+import os
+import sqlite3
+import threading
+import time
+from io import StringIO
+from unittest import mock
+import shutil
+import tempfile
+
+import brotli
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.contrib.sessions.backends.db import SessionStore
+from django.db import OperationalError, connection, router, transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.template import Context, Template
+from django.test import (
+    Client, RequestFactory, SimpleTestCase, TestCase, override_settings
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.encoding import escape_uri_path
+
+from posts.models import AuthorStats, Post, Thumbnail
+
+from . import metrics, profiling
+from .cache import Entry, SQLiteCache, get_or_compute
+from .compression import accepted_values
+from .db import retry_on_locked
+from .routers import (
+    STICKY_SESSION_KEY, read_from_replica, refresh_replica, stick_to_primary
+)
+from .media import parse_range
+from .middleware import (
+    QUERY_INSPECTOR_DEFAULTS, CompressionMiddleware, QueryBudgetExceeded,
+    QueryInspectorMiddleware, budgeted_count, get_inspector_config
+)
+from .queries import QueryCollector, sql_shape
+from .session_backends import REFRESHED_KEY, cached_db, signed_cookies
+from .storage import UMASK, ContentAddressedStorage, is_hashed_name
+
+User = get_user_model()
 
 
 class ViewTestClass(TestCase):
@@ -9,3 +55,833 @@ class ViewTestClass(TestCase):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, 404)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class QueryInspectorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.users = [
+            User.objects.create_user(username=f'inspected{number}')
+            for number in range(5)
+        ]
+
+    def test_repeated_queries_are_grouped(self):
+        """Одинаковые по форме запросы собираются вместе с местом вызова."""
+        with QueryCollector() as collector:
+            for user in self.users:
+                Post.objects.filter(author=user).count()
+        [(shape, count, locations)] = collector.repeated(3)
+        self.assertEqual(count, len(self.users))
+        self.assertIn('"posts_post"."author_id" = ?', shape)
+        [location] = locations
+        self.assertIn('core/tests.py', location)
+
+    def test_budgets_enforced_in_tests(self):
+        """В тестах лимиты лент включены и роняют запрос."""
+        config = get_inspector_config()
+        self.assertTrue(config['ENABLED'])
+        self.assertTrue(config['RAISE'])
+        self.assertFalse(config['LOG_REPEATS'])
+        self.assertIn('posts:index', config['BUDGETS'])
+
+    def test_thumbnail_queries_outside_budget(self):
+        """Разовое создание миниатюр и точки сохранения не в лимите."""
+        with QueryCollector() as collector:
+            with transaction.atomic():
+                Thumbnail.objects.count()
+            Post.objects.count()
+        self.assertEqual(budgeted_count(collector, ('posts_thumbnail',)), 1)
+
+    def test_in_lists_share_shape(self):
+        """Списки IN разной длины дают одну форму запроса."""
+        self.assertEqual(
+            sql_shape('SELECT 1 WHERE id IN (%s, %s)'),
+            sql_shape('SELECT 2 WHERE id IN (%s, %s, %s)'),
+        )
+
+    @override_settings(QUERY_INSPECTOR={
+        'ENABLED': True, 'BUDGETS': {'posts:index': 1}, 'RAISE': True,
+    })
+    def test_budget_exceeded(self):
+        """Превышение лимита запросов роняет запрос в тестах."""
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get(reverse('posts:index'))
+
+    @override_settings(QUERY_INSPECTOR={'ENABLED': True})
+    def test_template_location_logged(self):
+        """В лог попадает строка шаблона, из которой пришли повторы."""
+        author = self.users[0]
+        posts = [Post(text=str(number), author=author) for number in range(4)]
+        Post.objects.bulk_create(posts)
+        template = Template(
+            '{% for post in posts %}{{ post.author.username }}{% endfor %}'
+        )
+        template.origin.template_name = 'inline.html'
+        with self.assertLogs('core.queries', 'WARNING') as logs:
+            with QueryCollector() as collector:
+                template.render(Context({'posts': Post.objects.all()}))
+            QueryInspectorMiddleware(None).report(
+                {**QUERY_INSPECTOR_DEFAULTS, 'ENABLED': True},
+                'inline', collector
+            )
+        self.assertIn('inline.html:1', logs.output[0])
+
+
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        self.location = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, self.location, ignore_errors=True)
+        self.storage = ContentAddressedStorage(location=self.location)
+
+    def test_names_are_sharded_content_hashes(self):
+        name = self.storage.save('posts/Photo.JPG', ContentFile(b'cat'))
+        self.assertTrue(is_hashed_name(name))
+        self.assertTrue(name.startswith('posts/'))
+        self.assertTrue(name.endswith('.jpg'))
+        digest = name.rsplit('/', 1)[1]
+        self.assertEqual(name.split('/')[1:3], [digest[:2], digest[2:4]])
+
+    def test_identical_uploads_share_one_file(self):
+        """Повторная загрузка того же содержимого не пишет копию."""
+        first = self.storage.save('posts/a.jpg', ContentFile(b'same'))
+        second = self.storage.save('posts/b.jpg', ContentFile(b'same'))
+        other = self.storage.save('posts/c.jpg', ContentFile(b'other'))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertEqual(self.storage.refs(first), 2)
+
+    def test_delete_drops_file_with_last_reference(self):
+        name = self.storage.save('posts/a.jpg', ContentFile(b'same'))
+        self.storage.save('posts/b.jpg', ContentFile(b'same'))
+        self.storage.delete(name)
+        self.assertTrue(self.storage.exists(name))
+        self.storage.delete(name)
+        self.assertFalse(self.storage.exists(name))
+        self.assertEqual(self.storage.refs(name), 0)
+
+    def test_files_get_upload_permissions(self):
+        """Файлы читаются не только владельцем, как при обычной загрузке."""
+        name = self.storage.save('posts/a.jpg', ContentFile(b'mode'))
+        mode = os.stat(self.storage.path(name)).st_mode & 0o777
+        self.assertEqual(mode, 0o666 & ~UMASK)
+        storage = ContentAddressedStorage(
+            location=self.location, file_permissions_mode=0o640
+        )
+        name = storage.save('posts/b.jpg', ContentFile(b'explicit'))
+        self.assertEqual(os.stat(storage.path(name)).st_mode & 0o777, 0o640)
+
+
+class MediaServeTests(TestCase):
+    HASHED = 'posts/ab/cd/abcd' + '0' * 60 + '.jpg'
+
+    def setUp(self):
+        self.client = Client()
+        self.root = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        for name in ('posts/plain.txt', self.HASHED):
+            path = os.path.join(self.root, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file:
+                file.write(b'0123456789')
+
+    def get(self, name, **headers):
+        return self.client.get(settings.MEDIA_URL + name, **headers)
+
+    def test_full_response(self):
+        response = self.get('posts/plain.txt')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=3600')
+
+    def test_range(self):
+        response = self.get('posts/plain.txt', HTTP_RANGE='bytes=2-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(b''.join(response.streaming_content), b'2345')
+        response = self.get('posts/plain.txt', HTTP_RANGE='bytes=-3')
+        self.assertEqual(b''.join(response.streaming_content), b'789')
+
+    def test_unsatisfiable_range(self):
+        response = self.get('posts/plain.txt', HTTP_RANGE='bytes=20-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+        self.assertIsNone(parse_range('bytes=0-1,4-5', 10))
+
+    def test_stale_if_range_returns_whole_file(self):
+        response = self.get(
+            'posts/plain.txt', HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE='"old"'
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_not_modified(self):
+        etag = self.get('posts/plain.txt')['ETag']
+        response = self.get('posts/plain.txt', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_content_addressed_names_are_immutable(self):
+        response = self.get(self.HASHED)
+        self.assertEqual(
+            response['Cache-Control'], 'public, max-age=31536000, immutable'
+        )
+
+    @override_settings(MEDIA_SERVE_MODE='x-accel')
+    def test_x_accel_redirect(self):
+        response = self.get('posts/plain.txt')
+        self.assertEqual(
+            response['X-Accel-Redirect'], '/protected-media/posts/plain.txt'
+        )
+        self.assertEqual(response.content, b'')
+
+    def test_offload_headers_quote_non_ascii_names(self):
+        name = 'posts/котик 1.txt'
+        with open(os.path.join(self.root, name), 'wb') as file:
+            file.write(b'cat')
+        quoted = 'posts/%D0%BA%D0%BE%D1%82%D0%B8%D0%BA%201.txt'
+        with override_settings(MEDIA_SERVE_MODE='x-accel'):
+            response = self.get(escape_uri_path(name))
+        self.assertEqual(
+            response['X-Accel-Redirect'], '/protected-media/' + quoted
+        )
+        with override_settings(MEDIA_SERVE_MODE='x-sendfile'):
+            response = self.get(escape_uri_path(name))
+        self.assertEqual(
+            response['X-Sendfile'],
+            escape_uri_path(self.root) + '/' + quoted
+        )
+
+    def test_missing_and_outside_files(self):
+        self.assertEqual(self.get('posts/none.txt').status_code, 404)
+        self.assertEqual(self.get('posts/').status_code, 404)
+        self.assertEqual(self.get('../settings.py').status_code, 404)
+
+
+class StaticServeTests(TestCase):
+    CSS = b'body { margin: 0; }\n' * 100
+
+    def setUp(self):
+        self.client = Client()
+        source = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.root = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        for directory in (source, self.root):
+            self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        os.makedirs(os.path.join(source, 'css'))
+        with open(os.path.join(source, 'css', 'site.css'), 'wb') as file:
+            file.write(self.CSS)
+        settings_override = override_settings(
+            STATICFILES_DIRS=(source,), STATIC_ROOT=self.root
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def static_url(self):
+        return Template(
+            "{% load static %}{% static 'css/site.css' %}"
+        ).render(Context())
+
+    def test_plain_names_without_manifest(self):
+        self.assertEqual(self.static_url(), '/static/css/site.css')
+
+    def test_collectstatic_writes_hashed_and_compressed_files(self):
+        call_command('collectstatic', interactive=False, verbosity=0)
+        url = self.static_url()
+        self.assertRegex(url, r'^/static/css/site\.[0-9a-f]{12}\.css$')
+        name = url[len(settings.STATIC_URL):]
+        with open(os.path.join(self.root, name + '.gz'), 'rb') as file:
+            self.assertEqual(gzip.decompress(file.read()), self.CSS)
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, br;q=0')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertIn('immutable', response['Cache-Control'])
+        body = b''.join(response.streaming_content)
+        self.assertEqual(gzip.decompress(body), self.CSS)
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='identity')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(b''.join(response.streaming_content), self.CSS)
+        response = self.client.get('/static/css/site.css')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=3600')
+
+        with open(os.path.join(self.root, name + '.br'), 'rb') as file:
+            self.assertEqual(brotli.decompress(file.read()), self.CSS)
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        body = b''.join(response.streaming_content)
+        self.assertEqual(brotli.decompress(body), self.CSS)
+
+    def test_accepted_values(self):
+        self.assertEqual(
+            accepted_values('gzip;q=0.5, BR, deflate;q=0'), {'gzip', 'br'}
+        )
+        self.assertEqual(
+            accepted_values('image/webp;v=1;q=0, image/avif;q=x, */*;Q=0.8'),
+            {'*/*'}
+        )
+
+
+class CompressionMiddlewareTests(TestCase):
+    BODY = b'<p>post</p>' * 500
+
+    def process(self, response, accept='gzip'):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_gzip_page(self):
+        response = self.process(HttpResponse(self.BODY), 'gzip, br;q=0')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(gzip.decompress(response.content), self.BODY)
+
+    def test_brotli_page(self):
+        response = self.process(HttpResponse(self.BODY), 'gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.content), self.BODY)
+
+    def test_identity_when_not_accepted(self):
+        response = self.process(HttpResponse(self.BODY), 'identity')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.content, self.BODY)
+
+    def test_streaming_is_compressed_per_chunk(self):
+        chunks = iter([self.BODY, self.BODY])
+        response = self.process(StreamingHttpResponse(chunks))
+        parts = list(response.streaming_content)
+        self.assertGreater(len(parts), 2)
+        # Первая часть сжата и сброшена до чтения второго куска.
+        self.assertEqual(gzip.decompress(b''.join(parts)), self.BODY * 2)
+
+    def test_brotli_stream_is_compressed_per_chunk(self):
+        chunks = iter([self.BODY, self.BODY])
+        response = self.process(StreamingHttpResponse(chunks), 'br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        parts = list(response.streaming_content)
+        self.assertGreater(len(parts), 2)
+        self.assertEqual(brotli.decompress(b''.join(parts)), self.BODY * 2)
+
+    def test_compressed_types_are_skipped(self):
+        response = self.process(
+            HttpResponse(self.BODY, content_type='image/jpeg')
+        )
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_benchmark_command(self):
+        Post.objects.create(
+            text='Замер', author=User.objects.create_user(username='bench')
+        )
+        # Команда заполняет кеш страниц, другим тестам он не нужен.
+        self.addCleanup(cache.clear)
+        out = StringIO()
+        call_command('benchmark_compression', repeat=1, stdout=out)
+        self.assertIn('index', out.getvalue())
+        self.assertIn('post_detail', out.getvalue())
+        self.assertIn('gzip', out.getvalue())
+
+
+class SQLiteProfileTests(TestCase):
+    def test_pragmas_applied_to_connection(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA temp_store')
+            self.assertEqual(cursor.fetchone()[0], 2)
+            cursor.execute('PRAGMA cache_size')
+            self.assertEqual(cursor.fetchone()[0], -64 * 1024)
+
+    def test_load_test_command(self):
+        out = StringIO()
+        call_command(
+            'sqlite_load_test', readers=1, writers=1, duration=0.2,
+            posts=20, stdout=out
+        )
+        self.assertIn('default', out.getvalue())
+        self.assertIn('profile', out.getvalue())
+
+
+# TestCase держит тест в транзакции, а в ней повторов не бывает.
+class RetryOnLockedTests(SimpleTestCase):
+    @mock.patch('core.db.time.sleep')
+    def test_locked_view_is_retried(self, sleep):
+        calls = []
+
+        @retry_on_locked(retries=3)
+        def view(request):
+            calls.append(1)
+            if len(calls) < 3:
+                raise OperationalError('database is locked')
+            return HttpResponse('ok')
+
+        response = view(RequestFactory().post('/'))
+        self.assertEqual(response.content, b'ok')
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(sleep.call_count, 2)
+
+    @mock.patch('core.db.time.sleep')
+    def test_other_errors_are_not_retried(self, sleep):
+        @retry_on_locked
+        def view(request):
+            raise OperationalError('no such table: posts_post')
+
+        with self.assertRaises(OperationalError):
+            view(RequestFactory().post('/'))
+        sleep.assert_not_called()
+
+    @mock.patch('core.db.time.sleep')
+    def test_not_retried_inside_transaction(self, sleep):
+        @retry_on_locked
+        def view(request):
+            raise OperationalError('database is locked')
+
+        with self.assertRaises(OperationalError), mock.patch.object(
+                connection, 'in_atomic_block', True):
+            view(RequestFactory().post('/'))
+        sleep.assert_not_called()
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRouterTests(TestCase):
+    def request(self):
+        request = RequestFactory().get('/')
+        request.session = SessionStore()
+        return request
+
+    @staticmethod
+    @read_from_replica
+    def read_view(request):
+        return router.db_for_read(Post)
+
+    @staticmethod
+    @stick_to_primary
+    def write_view(request):
+        return router.db_for_write(Post)
+
+    @staticmethod
+    @stick_to_primary
+    def read_only_view(request):
+        return router.db_for_read(Post)
+
+    def test_feed_reads_go_to_replica(self):
+        request = self.request()
+        self.assertEqual(self.read_view(request), 'replica')
+        self.assertEqual(router.db_for_read(Post), 'default')
+        self.assertEqual(router.db_for_write(Post), 'default')
+
+    def test_session_sticks_to_primary_after_write(self):
+        request = self.request()
+        self.read_only_view(request)
+        self.assertEqual(self.read_view(request), 'replica')
+        self.write_view(request)
+        self.assertEqual(self.read_view(request), 'default')
+        request.session[STICKY_SESSION_KEY] = time.time() - 1
+        self.assertEqual(self.read_view(request), 'replica')
+
+    def test_comment_pins_session(self):
+        author = User.objects.create_user(username='writer')
+        post = Post.objects.create(text='Пост', author=author)
+        self.client.force_login(author)
+        self.client.post(
+            reverse('posts:add_comment', args=[post.pk]), {'text': 'Мой'}
+        )
+        self.assertGreater(
+            self.client.session[STICKY_SESSION_KEY], time.time()
+        )
+
+    def test_refresh_replica_copies_database(self):
+        directory = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        source = os.path.join(directory, 'primary.sqlite3')
+        target = os.path.join(directory, 'replica.sqlite3')
+        with sqlite3.connect(source) as primary:
+            primary.execute('CREATE TABLE post (text TEXT)')
+            primary.execute("INSERT INTO post VALUES ('первый')")
+        refresh_replica(source, target)
+        with sqlite3.connect(source) as primary:
+            primary.execute("INSERT INTO post VALUES ('второй')")
+        replica = sqlite3.connect(target)
+        self.addCleanup(replica.close)
+        self.assertEqual(
+            replica.execute('SELECT count(*) FROM post').fetchone()[0], 1
+        )
+        refresh_replica(source, target)
+        self.assertEqual(
+            replica.execute('SELECT count(*) FROM post').fetchone()[0], 2
+        )
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class LaggingReplicaTests(TestCase):
+    databases = {'default', 'replica'}
+
+    def test_recount_ignores_lagging_replica(self):
+        """Пересчёт счётчиков при чтении с реплики идёт по основной базе."""
+        author = User.objects.create_user(username='alice')
+        # Реплика обновлена до появления постов и строки счётчиков.
+        User.objects.using('replica').create(
+            pk=author.pk, username='alice', password=author.password
+        )
+        for number in range(3):
+            Post.objects.create(text=str(number), author=author)
+        AuthorStats.objects.filter(user=author).delete()
+        response = self.client.get(
+            reverse('posts:profile', args=['alice'])
+        )
+        self.assertEqual(response.status_code, 200)
+        # Чтение только считает и строку не заводит.
+        self.assertFalse(AuthorStats.objects.filter(user=author).exists())
+        create_post = read_from_replica(
+            lambda request: Post.objects.create(text='3', author=author)
+        )
+        create_post(RequestFactory().get('/'))
+        self.assertEqual(
+            AuthorStats.objects.get(user=author).posts_count, 4
+        )
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.cache = SQLiteCache(
+            os.path.join(directory, 'cache.sqlite3'),
+            {'OPTIONS': {'MAX_ENTRIES': 50}}
+        )
+
+    def test_basic_operations(self):
+        self.cache.set('post', {'text': 'Пост'})
+        self.assertEqual(self.cache.get('post'), {'text': 'Пост'})
+        self.assertFalse(self.cache.add('post', 'другой'))
+        self.assertTrue(self.cache.add('counter', 1))
+        self.assertEqual(self.cache.incr('counter', 2), 3)
+        self.assertEqual(
+            self.cache.get_many(['post', 'counter', 'none']),
+            {'post': {'text': 'Пост'}, 'counter': 3}
+        )
+        self.cache.delete_many(['post', 'counter'])
+        self.assertIsNone(self.cache.get('post'))
+        with self.assertRaises(ValueError):
+            self.cache.incr('counter')
+
+    def test_expired_entries(self):
+        self.cache.set('old', 1, timeout=-1)
+        self.assertFalse(self.cache.has_key('old'))
+        self.assertTrue(self.cache.add('old', 2))
+        self.assertEqual(self.cache.get('old'), 2)
+
+    def test_cull_keeps_entries_without_timeout(self):
+        self.cache.set('generation', 1, None)
+        for number in range(200):
+            self.cache.set(f'fragment{number}', number)
+        connection = self.cache._connection()
+        self.cache._cull(connection)
+        self.assertEqual(self.cache.get('generation'), 1)
+        self.assertLessEqual(
+            connection.execute('SELECT count(*) FROM cache').fetchone()[0], 50
+        )
+
+
+class GetOrComputeTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_single_flight(self):
+        """Одновременные промахи пересчитывает один поток."""
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.1)
+            return 'лента'
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(
+                get_or_compute('feed', compute, 60)
+            ))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['лента'] * 8)
+
+    @override_settings(CACHE_SINGLE_FLIGHT=False)
+    def test_without_single_flight_every_miss_computes(self):
+        calls = []
+        barrier = threading.Barrier(4)
+
+        def compute():
+            calls.append(1)
+            barrier.wait(timeout=5)
+            return 'лента'
+
+        threads = [
+            threading.Thread(target=get_or_compute, args=('feed', compute, 60))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 4)
+
+    def test_early_recompute_near_expiry(self):
+        """Дорогое значение пересчитывается до истечения срока."""
+        cache.set('feed', Entry('старое', 10, time.time() + 1), 60)
+        with mock.patch('core.cache.random.random', return_value=0.5):
+            self.assertEqual(get_or_compute('feed', lambda: 'новое', 60),
+                             'новое')
+        cache.set('feed', Entry('старое', 0.01, time.time() + 30), 60)
+        with mock.patch('core.cache.random.random', return_value=0.5):
+            self.assertEqual(get_or_compute('feed', lambda: 'новое', 60),
+                             'старое')
+
+    def test_stale_value_served_while_locked(self):
+        cache.set('feed', Entry('старое', 10, time.time() + 1), 60)
+        cache.add('feed:lock', 1, 10)
+        self.assertEqual(get_or_compute('feed', lambda: 'новое', 60),
+                         'старое')
+
+    def test_not_cacheable_result(self):
+        get_or_compute('feed', lambda: 404, 60, cacheable=lambda v: v == 200)
+        self.assertIsNone(cache.get('feed'))
+
+    def test_not_cacheable_result_reaches_waiters(self):
+        """Ожидающие получают некешируемый результат, а не считают сами."""
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.1)
+            return 404
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(get_or_compute(
+                'feed', compute, 60, cacheable=lambda v: v == 200
+            )))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [404] * 8)
+        self.assertIsNone(cache.get('feed'))
+
+    def test_expired_lock_of_another_worker_is_kept(self):
+        """Долгий пересчёт не снимает блокировку, взятую после него."""
+        def compute():
+            # Блокировка истекла, и её взял другой воркер.
+            cache.set('feed:lock', 'other', 10)
+            return 'лента'
+
+        get_or_compute('feed', compute, 60)
+        self.assertEqual(cache.get('feed:lock'), 'other')
+
+
+@override_settings(SESSION_CACHE_ONLY_KEYS=[STICKY_SESSION_KEY])
+class SessionBackendTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.session = cached_db.SessionStore()
+        self.session['_auth_user_id'] = '1'
+        self.session.save(must_create=True)
+        self.key = self.session.session_key
+
+    def session_writes(self, session):
+        with CaptureQueriesContext(connection) as queries:
+            session.save()
+        return [query for query in queries.captured_queries
+                if 'django_session' in query['sql']]
+
+    def test_cache_only_change_skips_database(self):
+        session = cached_db.SessionStore(self.key)
+        session[STICKY_SESSION_KEY] = 123
+        self.assertEqual(self.session_writes(session), [])
+        self.assertEqual(
+            cached_db.SessionStore(self.key)[STICKY_SESSION_KEY], 123
+        )
+
+    def test_persistent_change_written(self):
+        session = cached_db.SessionStore(self.key)
+        session['_auth_user_id'] = '2'
+        self.assertTrue(self.session_writes(session))
+        cache.clear()
+        self.assertEqual(
+            cached_db.SessionStore(self.key)['_auth_user_id'], '2'
+        )
+
+    def test_expiry_refreshed_once_per_interval(self):
+        session = cached_db.SessionStore(self.key)
+        session.load()
+        self.assertFalse(session.modified)
+        stale = cached_db.SessionStore(self.key)
+        stale[REFRESHED_KEY] = int(time.time()) - 60 * 60 * 25
+        stale.save()
+        session = cached_db.SessionStore(self.key)
+        session.load()
+        self.assertTrue(session.modified)
+        self.assertTrue(self.session_writes(session))
+        self.assertGreater(
+            cached_db.SessionStore(self.key)[REFRESHED_KEY],
+            int(time.time()) - 60
+        )
+
+    def test_signed_cookie_refresh(self):
+        session = signed_cookies.SessionStore()
+        session['_auth_user_id'] = '1'
+        session[REFRESHED_KEY] = 0
+        session.save()
+        reloaded = signed_cookies.SessionStore(session.session_key)
+        reloaded.load()
+        self.assertTrue(reloaded.modified)
+        reloaded.save()
+        self.assertGreater(
+            signed_cookies.SessionStore(reloaded.session_key)[REFRESHED_KEY],
+            0
+        )
+
+    def test_load_test_command(self):
+        out = StringIO()
+        call_command('session_load_test', users=2, requests=20, stdout=out)
+        self.assertIn('cached_db', out.getvalue())
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        metrics.registry._reset()
+        self.addCleanup(metrics.registry._reset)
+        self.addCleanup(cache.clear)
+
+    def test_view_metrics_exposed(self):
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        text = response.content.decode()
+        self.assertIn(
+            'yatube_http_responses_total{view="posts:index",status="200"} 1',
+            text
+        )
+        self.assertIn(
+            'yatube_http_request_duration_seconds_bucket'
+            '{view="posts:index",le="+Inf"} 1', text
+        )
+        for name in ('yatube_db_queries', 'yatube_template_render_seconds',
+                     'yatube_http_response_bytes'):
+            self.assertIn(f'{name}_count{{view="posts:index"}} 1', text)
+        self.assertIn('# TYPE yatube_db_queries histogram', text)
+
+    def test_template_and_query_time_recorded(self):
+        self.client.get(reverse('posts:index'))
+        _, histograms = metrics.collect()
+        labels = (('view', 'posts:index'),)
+        self.assertGreater(
+            histograms[('yatube_template_render_seconds', labels)][1], 0
+        )
+        self.assertGreater(histograms[('yatube_db_queries', labels)][1], 0)
+
+    def test_only_allowed_ips(self):
+        response = self.client.get(
+            reverse('metrics'), REMOTE_ADDR='10.0.0.1'
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_spool_aggregates_workers(self):
+        spool = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, spool)
+        labels = (('view', 'posts:index'),)
+        metrics.registry.observe('yatube_db_queries', labels, 2)
+        metrics.registry.inc('yatube_http_responses_total', labels)
+        other = {
+            'counters': [
+                ['yatube_http_responses_total', [['view', 'posts:index']], 4]
+            ],
+            'histograms': [[
+                'yatube_db_queries', [['view', 'posts:index']],
+                [0] * (len(metrics.QUERIES) + 1), 0.0
+            ]],
+        }
+        other['histograms'][0][2][-1] = 3
+        other['histograms'][0][3] = 300.0
+        with open(os.path.join(spool, '1-other.json'), 'w') as file:
+            json.dump(other, file)
+        with override_settings(METRICS_SPOOL_DIR=spool):
+            counters, histograms = metrics.collect()
+            text = metrics.render()
+        self.assertEqual(
+            counters[('yatube_http_responses_total', labels)], 5
+        )
+        counts, total = histograms[('yatube_db_queries', labels)]
+        self.assertEqual(sum(counts), 4)
+        self.assertEqual(total, 302.0)
+        self.assertIn('yatube_db_queries_bucket{view="posts:index",le="3.0"}'
+                      ' 1', text)
+        self.assertEqual(len(os.listdir(spool)), 2)
+
+    def test_label_escaping(self):
+        metrics.registry.inc(
+            'yatube_http_responses_total', (('view', 'a"b\\c'),)
+        )
+        self.assertIn('{view="a\\"b\\\\c"} 1', metrics.render())
+
+
+class ProfilerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.config = {
+            'ENABLED': True, 'SAMPLE_RATE': 0.0, 'DIR': self.directory,
+        }
+
+    def test_signed_header_profiles_request(self):
+        with override_settings(PROFILER=self.config):
+            self.client.get(reverse('posts:index'), HTTP_X_PROFILE='fake')
+            self.assertEqual(os.listdir(self.directory), [])
+            self.client.get(
+                reverse('posts:index'), HTTP_X_PROFILE=profiling.make_token()
+            )
+        [name] = os.listdir(self.directory)
+        self.assertRegex(name, r'-posts\.index-\d+ms-\d+\.prof$')
+
+    def test_disabled_by_default(self):
+        config = {**settings.PROFILER, 'DIR': self.directory}
+        with override_settings(PROFILER=config):
+            self.client.get(
+                reverse('posts:index'), HTTP_X_PROFILE=profiling.make_token()
+            )
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_expired_token_ignored(self):
+        token = profiling.make_token()
+        with override_settings(PROFILER={**self.config, 'TOKEN_MAX_AGE': -1}):
+            self.client.get(reverse('posts:index'), HTTP_X_PROFILE=token)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_sampling_and_rotation(self):
+        config = {**self.config, 'SAMPLE_RATE': 1.0, 'MAX_FILES': 2}
+        with override_settings(PROFILER=config):
+            for _ in range(3):
+                self.client.get(reverse('posts:index'))
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+
+    def test_summary_command(self):
+        config = {**self.config, 'SAMPLE_RATE': 1.0}
+        out = StringIO()
+        with override_settings(PROFILER=config):
+            self.client.get(reverse('posts:index'))
+            self.client.get(reverse('about:author'))
+            call_command(
+                'profile_summary', view='posts:index', limit=5, stdout=out
+            )
+        self.assertIn('Профилей: 1 (posts.index)', out.getvalue())
+        self.assertIn('function calls', out.getvalue())
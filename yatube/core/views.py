@@ -1,5 +1,9 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
 
+from . import metrics as metrics_registry
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
@@ -7,3 +11,13 @@ def page_not_found(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+def metrics(request):
+    """Метрики всех воркеров для Prometheus; только с METRICS_ALLOWED_IPS."""
+    allowed = getattr(settings, 'METRICS_ALLOWED_IPS', settings.INTERNAL_IPS)
+    if request.META.get('REMOTE_ADDR') not in allowed:
+        raise Http404
+    return HttpResponse(
+        metrics_registry.render(), content_type=metrics_registry.CONTENT_TYPE
+    )
@@ -1,6 +1,7 @@
 from django.contrib import admin
 
-from .models import Post, Group, Comment, Follow
+from . import search
+from .models import AuthorStats, Post, Group, Comment, Follow
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -10,6 +11,10 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск по полнотекстовому индексу вместо LIKE по всей таблице.
+        return search.filter_queryset(queryset, search_term), False
+
 
 class GroupAdmin(admin.ModelAdmin):
     list_display = ('pk', 'title', 'slug', 'description')
@@ -27,7 +32,15 @@ class FollowAdmin(admin.ModelAdmin):
     search_fields = ('user', 'author',)
 
 
+class AuthorStatsAdmin(admin.ModelAdmin):
+    list_display = (
+        'user', 'posts_count', 'followers_count', 'following_count',
+    )
+    search_fields = ('user__username',)
+
+
 admin.site.register(Group, GroupAdmin)
 admin.site.register(Post, PostAdmin)
 admin.site.register(Comment, CommentAdmin)
 admin.site.register(Follow, FollowAdmin)
+admin.site.register(AuthorStats, AuthorStatsAdmin)
@@ -0,0 +1,145 @@
+# posts/counters.py
+"""Денормализованные счётчики постов, комментариев и подписок.
+
+Сдвигаются сигналами сохранения и удаления (posts.signals) в той же
+транзакции, что и сама запись. Строка AuthorStats заводится при первой
+записи: её счётчики считаются по основной базе, дальше только сдвигаются
+через F(). Чтение без строки считает по базе и ничего не пишет.
+"""
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from . import instances
+from .models import AuthorStats, Comment, Follow, Post
+
+User = get_user_model()
+
+
+def _count(queryset, field):
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')})
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total')
+    ), 0)
+
+
+def count_user(user_id, using=None):
+    """Счётчики пользователя по базе, без сохранения."""
+    return AuthorStats(
+        user_id=user_id,
+        posts_count=Post.objects.using(using)
+        .filter(author_id=user_id).count(),
+        followers_count=Follow.objects.using(using)
+        .filter(author_id=user_id).count(),
+        following_count=Follow.objects.using(using)
+        .filter(user_id=user_id).count(),
+    )
+
+
+def recount_user(user_id):
+    """Считает счётчики пользователя по базе и сохраняет их.
+
+    Считает по основной базе даже во вьюхах с read_from_replica:
+    счёт с отстающей реплики затёр бы верные значения.
+    """
+    stats = count_user(user_id, DEFAULT_DB_ALIAS)
+    stats.save(using=DEFAULT_DB_ALIAS)
+    return stats
+
+
+def get_stats(user_id):
+    stats = AuthorStats.objects.filter(user_id=user_id).first()
+    if stats is None:
+        stats = count_user(user_id)
+    return stats
+
+
+def stats_for(user):
+    """Счётчики пользователя, подгруженного с select_related('stats')."""
+    try:
+        return user.stats
+    except AuthorStats.DoesNotExist:
+        return count_user(user.pk)
+
+
+def _bump(user_id, **deltas):
+    # Greatest: записи в обход сигналов могли сбить счётчик, уходить
+    # в минус из-за этого нельзя.
+    return AuthorStats.objects.filter(user_id=user_id).update(**{
+        field: Greatest(F(field) + delta, 0)
+        for field, delta in deltas.items()
+    })
+
+
+def _increment(user_id, **deltas):
+    if not _bump(user_id, **deltas):
+        # Строки ещё нет: текущая запись уже в базе и попадёт в пересчёт.
+        recount_user(user_id)
+
+
+def _decrement(user_id, **deltas):
+    # Без строки счётчики и так считаются по базе. Заводить её здесь
+    # нельзя: удаление пользователя каскадом удаляет и его строку.
+    _bump(user_id, **{field: -delta for field, delta in deltas.items()})
+
+
+def post_created(post):
+    _increment(post.author_id, posts_count=1)
+
+
+def post_deleted(post):
+    _decrement(post.author_id, posts_count=1)
+
+
+def _shift_comments(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comments_count=Greatest(F('comments_count') + delta, 0)
+    )
+    instances.posts.forget(pk=post_id)
+
+
+def comment_added(comment):
+    _shift_comments(comment.post_id, 1)
+
+
+def comment_removed(comment):
+    _shift_comments(comment.post_id, -1)
+
+
+def follow_added(follow):
+    _increment(follow.user_id, following_count=1)
+    _increment(follow.author_id, followers_count=1)
+
+
+def follow_removed(follow):
+    _decrement(follow.user_id, following_count=1)
+    _decrement(follow.author_id, followers_count=1)
+
+
+@transaction.atomic
+def recount_all():
+    """Чинит расхождения: пересчитывает все счётчики по базе."""
+    Post.objects.update(comments_count=_count(Comment.objects, 'post'))
+    users = User.objects.annotate(
+        posts_total=_count(Post.objects, 'author'),
+        followers_total=_count(Follow.objects, 'author'),
+        following_total=_count(Follow.objects, 'user'),
+    ).values_list(
+        'pk', 'posts_total', 'followers_total', 'following_total'
+    )
+    AuthorStats.objects.all().delete()
+    AuthorStats.objects.bulk_create(
+        (
+            AuthorStats(
+                user_id=user_id,
+                posts_count=posts,
+                followers_count=followers,
+                following_count=following,
+            )
+            for user_id, posts, followers, following in users.iterator()
+        ),
+        batch_size=500
+    )
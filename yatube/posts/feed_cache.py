@@ -0,0 +1,166 @@
+# posts/feed_cache.py
+"""Кеш фрагментов лент с ключами по поколениям.
+
+У каждой ленты есть область (scope): 'global', 'group:<id>',
+'author:<id>', 'post:<id>', 'timeline:<user_id>'. Номер поколения
+области лежит в кеше и сдвигается сигналами при записи постов,
+комментариев и подписок. Поколения входят в ключ фрагмента, поэтому
+фрагменты можно хранить долго: после записи ключ просто меняется,
+а старые записи вытесняются по таймауту.
+
+Поколение — число микросекунд на момент последнего сдвига, так что
+оно же служит временем последнего изменения области.
+
+Во вьюхах с чтением с реплики фрагмент может отрисоваться по данным,
+которые реплика ещё не получила, хотя поколение уже сдвинуто. Поэтому,
+пока изменение моложе допустимого отставания реплик, такой фрагмент
+хранится только до конца этого окна.
+
+Счётчики попаданий и промахов пишутся в кеш при каждой отрисовке
+фрагмента, поэтому включаются отдельно настройкой FEED_CACHE_STATS.
+"""
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core.cache import get_or_compute
+from core.routers import get_replica_lag, reading_from_replica
+
+FEED_CACHE_TIMEOUT = 60 * 60 * 24
+FEED_CACHE_STATS = False
+GENERATION_KEY = 'feed:generation:{}'
+FRAGMENT_KEY = 'feed:fragment:{}:{}'
+STATS_KEY = 'feed:stats:{}'
+
+GLOBAL_SCOPE = 'global'
+
+
+def group_scope(group_id):
+    return f'group:{group_id}'
+
+
+def author_scope(author_id):
+    return f'author:{author_id}'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def timeline_scope(user_id):
+    return f'timeline:{user_id}'
+
+
+def post_scopes(post, extra_group_ids=()):
+    """Все области, в которых виден пост."""
+    scopes = {
+        GLOBAL_SCOPE, author_scope(post.author_id), post_scope(post.pk),
+    }
+    for group_id in (post.group_id, *extra_group_ids):
+        if group_id is not None:
+            scopes.add(group_scope(group_id))
+    return scopes
+
+
+def get_timeout(generations=()):
+    """Срок фрагмента для областей с поколениями generations."""
+    timeout = getattr(settings, 'FEED_CACHE_TIMEOUT', FEED_CACHE_TIMEOUT)
+    if not generations or not reading_from_replica():
+        return timeout
+    age = (_now() - max(generations)) / 1000000
+    lag = get_replica_lag()
+    if age >= lag:
+        return timeout
+    return min(timeout, math.ceil(lag - age))
+
+
+def stats_enabled():
+    return getattr(settings, 'FEED_CACHE_STATS', FEED_CACHE_STATS)
+
+
+def _now():
+    return int(time.time() * 1000000)
+
+
+def get_generations(scopes):
+    """Поколения областей; отсутствующие заводятся текущим временем."""
+    keys = {scope: GENERATION_KEY.format(scope) for scope in scopes}
+    found = cache.get_many(keys.values())
+    generations = {}
+    for scope, key in keys.items():
+        if key not in found:
+            cache.add(key, _now(), None)
+            found[key] = cache.get(key)
+        generations[scope] = found[key]
+    return generations
+
+
+def bump(scopes):
+    """Сдвигает поколения областей, инвалидируя их фрагменты."""
+    keys = [GENERATION_KEY.format(scope) for scope in scopes]
+    current = cache.get_many(keys)
+    now = _now()
+    cache.set_many(
+        {key: max(now, current.get(key, 0) + 1) for key in keys}, None
+    )
+
+
+def fragment_key(name, scopes, vary_on=(), generations=None):
+    if generations is None:
+        generations = get_generations(sorted(scopes))
+    raw = ':'.join(
+        [f'{scope}={generations[scope]}' for scope in sorted(scopes)]
+        + [str(value) for value in vary_on]
+    )
+    return FRAGMENT_KEY.format(name, hashlib.md5(raw.encode()).hexdigest())
+
+
+def _count(event):
+    key = STATS_KEY.format(event)
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Счётчик успели вытеснить между add и incr.
+        cache.set(key, 1, None)
+
+
+def get_or_render(key, render, timeout=None):
+    """Фрагмент из кеша или отрисованный заново render().
+
+    Одновременные промахи по одному ключу отрисовывает один процесс.
+    timeout=None — обычный срок FEED_CACHE_TIMEOUT.
+    """
+    rendered = []
+
+    def compute():
+        rendered.append(True)
+        return render()
+
+    if timeout is None:
+        timeout = get_timeout()
+    content = get_or_compute(key, compute, timeout)
+    if stats_enabled():
+        _count('misses' if rendered else 'hits')
+    return content
+
+
+def get_stats():
+    """Число попаданий и промахов кеша фрагментов."""
+    stats = cache.get_many([STATS_KEY.format('hits'),
+                            STATS_KEY.format('misses')])
+    hits = stats.get(STATS_KEY.format('hits'), 0)
+    misses = stats.get(STATS_KEY.format('misses'), 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / total if total else 0.0,
+    }
+
+
+def reset_stats():
+    cache.delete_many([STATS_KEY.format('hits'), STATS_KEY.format('misses')])
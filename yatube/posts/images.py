@@ -0,0 +1,130 @@
+# posts/images.py
+"""Приём картинок постов: проверка размеров, уменьшение, очистка.
+
+Загрузка читается кусками во временный файл на диске, Pillow открывает
+его лениво — до декодирования известны только размеры из заголовка.
+По ним отсекаются «бомбы» с огромным числом пикселей, а большие JPEG
+декодируются сразу в уменьшенном виде (draft-режим: масштаб 1/2–1/8
+применяется ещё в декодере), поэтому память процесса не растёт
+пропорционально размеру снимка. Картинка сохраняется заново без
+EXIF и прочих метаданных; ориентация из EXIF применяется заранее.
+JPEG, PNG и WebP остаются в своём формате, остальные (GIF, TIFF, BMP,
+ICO…) приводятся к PNG, а без прозрачности в полноцвете — к JPEG;
+от анимации остаётся первый кадр.
+"""
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from PIL import Image, ImageOps
+
+IMAGE_MAX_PIXELS = 50 * 1000 * 1000
+IMAGE_MAX_SIDE = 2560
+JPEG_QUALITY = 90
+EXIF_ORIENTATION = 0x0112
+CHUNK_SIZE = 64 * 1024
+# Форматы, которые пересохраняются как есть.
+REENCODED_FORMATS = ('JPEG', 'PNG', 'WEBP')
+EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png', 'WEBP': '.webp'}
+PNG_MODES = ('1', 'L', 'LA', 'I', 'P', 'RGB', 'RGBA')
+
+
+def get_max_pixels():
+    return getattr(settings, 'POSTS_IMAGE_MAX_PIXELS', IMAGE_MAX_PIXELS)
+
+
+def get_max_side():
+    return getattr(settings, 'POSTS_IMAGE_MAX_SIDE', IMAGE_MAX_SIDE)
+
+
+def spool(upload):
+    """Временный файл на диске с содержимым загрузки, записанный кусками."""
+    spooled = tempfile.TemporaryFile()
+    upload.seek(0)
+    for chunk in upload.chunks(CHUNK_SIZE):
+        spooled.write(chunk)
+    spooled.seek(0)
+    return spooled
+
+
+def _open(source):
+    try:
+        return Image.open(source)
+    except Image.DecompressionBombError:
+        raise ValidationError(
+            'Слишком большое изображение.', code='too_many_pixels'
+        )
+    except (OSError, SyntaxError):
+        raise ValidationError(
+            'Загрузите правильное изображение.', code='invalid_image'
+        )
+
+
+def target_format(image):
+    if image.format in REENCODED_FORMATS:
+        return image.format
+    if image.mode in ('RGB', 'CMYK', 'YCbCr') and (
+            'transparency' not in image.info):
+        return 'JPEG'
+    return 'PNG'
+
+
+def _reencode(image, max_side):
+    image_format = target_format(image)
+    mode = image.mode
+    width, height = image.size
+    if image_format == 'JPEG' and max(width, height) > max_side:
+        scale = max_side / max(width, height)
+        image.draft('RGB', (int(width * scale), int(height * scale)))
+    if image.getexif().get(EXIF_ORIENTATION, 1) != 1:
+        # exif_transpose копирует картинку, поэтому только при повороте.
+        image = ImageOps.exif_transpose(image)
+    if max(image.size) > max_side:
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+    options = {}
+    transparency = image.info.get('transparency')
+    if image_format == 'JPEG':
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        options.update(quality=JPEG_QUALITY, optimize=True)
+    elif image_format == 'PNG' and image.mode not in PNG_MODES:
+        image = image.convert('RGBA')
+    elif transparency is not None:
+        # Прозрачный цвет палитры или RGB хранится в info, а не в пикселях.
+        options['transparency'] = transparency
+    icc_profile = image.info.get('icc_profile')
+    if icc_profile and image.mode == mode:
+        # После convert() профиль CMYK к пикселям RGB уже не подходит.
+        options['icc_profile'] = icc_profile
+    output = tempfile.TemporaryFile()
+    image.save(output, image_format, **options)
+    output.seek(0)
+    return output, image_format
+
+
+def ingest(upload):
+    """Проверяет и готовит загруженную картинку к сохранению.
+
+    Возвращает File для поля модели или бросает ValidationError,
+    если пикселей больше POSTS_IMAGE_MAX_PIXELS.
+    """
+    spooled = spool(upload)
+    try:
+        image = _open(spooled)
+        width, height = image.size
+        if width * height > get_max_pixels():
+            raise ValidationError(
+                'Слишком большое изображение: %(pixels)s пикселей.',
+                code='too_many_pixels',
+                params={'pixels': width * height},
+            )
+        source_format = image.format
+        output, image_format = _reencode(image, get_max_side())
+    finally:
+        spooled.close()
+    name = os.path.basename(upload.name)
+    if image_format != source_format:
+        name = os.path.splitext(name)[0] + EXTENSIONS[image_format]
+    return File(output, name=name)
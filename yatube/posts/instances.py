@@ -0,0 +1,13 @@
+# posts/instances.py
+"""Кеши экземпляров для горячих выборок вьюх (см. core.instance_cache)."""
+from django.contrib.auth import get_user_model
+
+from core.instance_cache import register
+
+from .models import Group, Post
+
+User = get_user_model()
+
+groups = register(Group, ('pk', 'slug'))
+users = register(User, ('pk', 'username'))
+posts = register(Post, ('pk',))
@@ -0,0 +1,92 @@
+import multiprocessing
+import statistics
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.urls import reverse
+
+from posts import feed_cache
+from posts.models import Post
+
+
+def _hit_index(barrier, results):
+    """Процесс-воркер: ждёт остальных и запрашивает главную."""
+    client = Client()
+    url = reverse('posts:index')
+    barrier.wait()
+    started = time.perf_counter()
+    response = client.get(url)
+    results.put((response.status_code, time.perf_counter() - started))
+
+
+class Command(BaseCommand):
+    help = (
+        'Много процессов одновременно открывают главную сразу после '
+        'сброса её кеша: сколько раз лента отрисована и сколько ждали '
+        'запросы, без защиты от лавины и с ней.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=16)
+        parser.add_argument(
+            '--rounds', type=int, default=5,
+            help='Сколько раз сбрасывать кеш в каждом режиме.'
+        )
+
+    def run_round(self, context, workers):
+        # Поколение сдвигается так же, как при новом посте.
+        feed_cache.bump([feed_cache.GLOBAL_SCOPE])
+        feed_cache.reset_stats()
+        connections.close_all()
+        barrier = context.Barrier(workers)
+        results = context.Queue()
+        processes = [
+            context.Process(target=_hit_index, args=(barrier, results))
+            for _ in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        timings = []
+        for _ in processes:
+            status, elapsed = results.get()
+            if status != 200:
+                raise CommandError(f'Главная ответила {status}')
+            timings.append(elapsed)
+        for process in processes:
+            process.join()
+        return feed_cache.get_stats()['misses'], timings
+
+    def handle(self, *args, **options):
+        if 'locmem' in settings.CACHES['default']['BACKEND'].lower():
+            raise CommandError(
+                'Нужен общий для процессов кеш, а не LocMemCache.'
+            )
+        if not Post.objects.exists():
+            raise CommandError('Нет постов для главной страницы.')
+        context = multiprocessing.get_context('fork')
+        protection = settings.CACHE_SINGLE_FLIGHT
+        try:
+            for title, enabled in (('без защиты', False), ('с защитой', True)):
+                settings.CACHE_SINGLE_FLIGHT = enabled
+                renders, timings = 0, []
+                for _ in range(options['rounds']):
+                    misses, elapsed = self.run_round(
+                        context, options['workers']
+                    )
+                    renders += misses
+                    timings.extend(elapsed)
+                timings.sort()
+                self.stdout.write(
+                    f'{title}: отрисовок ленты на сброс '
+                    f'{renders / options["rounds"]:.1f}, '
+                    f'ответ p50={statistics.median(timings) * 1000:.1f} мс '
+                    f'p95={timings[int(len(timings) * 0.95) - 1] * 1000:.1f} '
+                    f'мс max={timings[-1] * 1000:.1f} мс'
+                )
+        finally:
+            settings.CACHE_SINGLE_FLIGHT = protection
+            cache.close()
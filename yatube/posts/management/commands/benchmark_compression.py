@@ -0,0 +1,79 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+
+from core import compression
+from posts.models import Post
+
+STREAM_CHUNK_SIZE = 8 * 1024
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает размер и время CPU на сжатие gzip и brotli '
+        'для главной страницы и страницы поста.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat', type=int, default=50,
+            help='Сколько раз сжимать каждую страницу.'
+        )
+        parser.add_argument(
+            '--post-id', type=int,
+            help='Пост для post_detail; по умолчанию последний.'
+        )
+
+    def pages(self, post_id):
+        if post_id is None:
+            post_id = (
+                Post.objects.order_by('-pk')
+                .values_list('pk', flat=True).first()
+            )
+        if post_id is None:
+            raise CommandError('Нет постов для post_detail.')
+        client = Client()
+        for name, url in (
+            ('index', reverse('posts:index')),
+            ('post_detail', reverse('posts:post_detail', args=[post_id])),
+        ):
+            response = client.get(url)
+            if response.status_code != 200:
+                raise CommandError(f'{url}: код {response.status_code}')
+            yield name, response.content
+
+    def measure(self, encoding, content, repeat):
+        started = time.process_time()
+        for _ in range(repeat):
+            compressed = compression.compress(encoding, content)
+        elapsed = (time.process_time() - started) / repeat
+        chunks = [
+            content[start:start + STREAM_CHUNK_SIZE]
+            for start in range(0, len(content), STREAM_CHUNK_SIZE)
+        ]
+        streamed = sum(
+            len(part)
+            for part in compression.compress_stream(encoding, chunks)
+        )
+        return len(compressed), streamed, elapsed
+
+    def handle(self, *args, **options):
+        repeat = max(options['repeat'], 1)
+        self.stdout.write(
+            'страница      кодировка  байт     поток    доля    CPU, мс'
+        )
+        for name, content in self.pages(options['post_id']):
+            self.stdout.write(
+                f'{name:<13} {"identity":<10} {len(content):<8} '
+                f'{len(content):<8} {1:<7.1%} {0:.3f}'
+            )
+            for encoding in compression.available_encodings():
+                size, streamed, elapsed = self.measure(
+                    encoding, content, repeat
+                )
+                self.stdout.write(
+                    f'{name:<13} {encoding:<10} {size:<8} {streamed:<8} '
+                    f'{size / len(content):<7.1%} {elapsed * 1000:.3f}'
+                )
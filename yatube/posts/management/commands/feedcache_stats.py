@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from posts import feed_cache
+
+
+class Command(BaseCommand):
+    help = 'Показывает попадания и промахи кеша фрагментов лент.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset', action='store_true',
+            help='Обнулить счётчики после вывода.'
+        )
+
+    def handle(self, *args, **options):
+        if not feed_cache.stats_enabled():
+            self.stderr.write(
+                'Счётчики не ведутся: включите FEED_CACHE_STATS.'
+            )
+        stats = feed_cache.get_stats()
+        self.stdout.write(
+            f"hits={stats['hits']} misses={stats['misses']} "
+            f"hit_ratio={stats['hit_ratio']:.2%}"
+        )
+        if options['reset']:
+            feed_cache.reset_stats()
@@ -0,0 +1,152 @@
+import json
+import logging
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts import thumbnails
+from posts.models import Post
+
+# Вне MEDIA_ROOT: оттуда файлы раздаются всем.
+STATE_FILE = os.path.join(settings.BASE_DIR, '.thumbnails_backfill.json')
+
+logger = logging.getLogger(__name__)
+
+
+def _generate(name):
+    """Задача процесса пула: None или текст ошибки с трассировкой.
+
+    Исключение из дочернего процесса может не пережить pickle, поэтому
+    в родителя уходит строка.
+    """
+    try:
+        thumbnails.generate(name)
+    except Exception:
+        return traceback.format_exc()
+    return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт миниатюры для всех картинок постов в пуле процессов. '
+        'Прогресс сохраняется, прерванный запуск продолжается с места '
+        'остановки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Число процессов; 0 — без пула, в текущем процессе.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=200,
+            help='Сколько постов обрабатывать между сохранениями прогресса.'
+        )
+        parser.add_argument(
+            '--state-file',
+            default=STATE_FILE,
+            help='Файл с id последнего обработанного поста '
+                 'и постов, на которых были ошибки.'
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Начать заново, не глядя на сохранённый прогресс.'
+        )
+
+    def load_state(self, path):
+        """id последнего обработанного поста и id постов с ошибками."""
+        try:
+            with open(path) as state:
+                state = json.load(state)
+            return state.get('last_id', 0), set(state.get('failed', []))
+        except (OSError, ValueError, AttributeError):
+            return 0, set()
+
+    def save_state(self, path, last_id, failed):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as state:
+            json.dump({'last_id': last_id, 'failed': sorted(failed)}, state)
+        os.replace(tmp_path, path)
+
+    def batches(self, last_id, size):
+        posts = Post.objects.exclude(image='').order_by('pk')
+        while True:
+            batch = list(
+                posts.filter(pk__gt=last_id).values_list('pk', 'image')[:size]
+            )
+            if not batch:
+                return
+            yield batch
+            last_id = batch[-1][0]
+
+    def retries(self, failed, size):
+        """Посты с ошибками прошлых запусков, у которых ещё есть картинка."""
+        posts = list(
+            Post.objects.filter(pk__in=failed).exclude(image='')
+            .order_by('pk').values_list('pk', 'image')
+        )
+        failed.intersection_update(pk for pk, _ in posts)
+        for start in range(0, len(posts), size):
+            yield posts[start:start + size]
+
+    def process(self, run, batch, failed):
+        """Создаёт миниатюры пачки; возвращает число ошибок."""
+        errors = 0
+        names = [name for _, name in batch]
+        for (pk, name), error in zip(batch, run(_generate, names)):
+            if error is None:
+                failed.discard(pk)
+                continue
+            errors += 1
+            failed.add(pk)
+            logger.error('Миниатюры для %s не созданы:\n%s', name, error)
+        return errors
+
+    def handle(self, *args, **options):
+        state_file = options['state_file']
+        last_id, failed = (
+            (0, set()) if options['restart'] else self.load_state(state_file)
+        )
+        images = Post.objects.exclude(image='')
+        total = images.count()
+        done = images.filter(pk__lte=last_id).count()
+        if done:
+            self.stdout.write(f'Продолжаем после поста {last_id}')
+        errors = 0
+        workers = options['workers']
+        pool = None
+        if workers > 0:
+            # Дочерние процессы не должны делить открытые соединения.
+            connections.close_all()
+            pool = ProcessPoolExecutor(max_workers=workers)
+            run = pool.map
+        else:
+            run = map
+        try:
+            # Сначала посты, на которых прошлые запуски споткнулись:
+            # курсор last_id уже ушёл дальше них.
+            for batch in self.retries(failed, options['batch_size']):
+                errors += self.process(run, batch, failed)
+                self.save_state(state_file, last_id, failed)
+                self.stdout.write(
+                    f'Повторно: {len(batch)} постов, ошибок: {errors}'
+                )
+            for batch in self.batches(last_id, options['batch_size']):
+                errors += self.process(run, batch, failed)
+                last_id = batch[-1][0]
+                done += len(batch)
+                self.save_state(state_file, last_id, failed)
+                self.stdout.write(
+                    f'{done}/{total} постов, ошибок: {errors}'
+                )
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {done} постов, ошибок: {errors}'
+        ))
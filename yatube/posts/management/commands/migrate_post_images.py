@@ -0,0 +1,63 @@
+from django.core.files.storage import FileSystemStorage
+from django.core.management.base import BaseCommand
+
+from core.storage import is_hashed_name
+from posts import feed_cache, instances, thumbnail_cache
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит картинки постов из плоского каталога в хранилище '
+        'по хешу содержимого. Повторный запуск продолжает перенос.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только посчитать, сколько картинок нужно перенести.'
+        )
+
+    def handle(self, *args, **options):
+        storage = Post._meta.get_field('image').storage
+        legacy = FileSystemStorage(
+            location=storage.location, base_url=storage.base_url
+        )
+        posts = Post.objects.exclude(image='').only(
+            'pk', 'image', 'author_id', 'group_id'
+        ).order_by('pk')
+        last_id = moved = missing = 0
+        while True:
+            batch = list(posts.filter(pk__gt=last_id)[:options['batch_size']])
+            if not batch:
+                break
+            last_id = batch[-1].pk
+            for post in batch:
+                name = post.image.name
+                if is_hashed_name(name):
+                    continue
+                if not legacy.exists(name):
+                    missing += 1
+                    self.stderr.write(f'Нет файла {name} (пост {post.pk})')
+                    continue
+                moved += 1
+                if options['dry_run']:
+                    continue
+                with legacy.open(name) as content:
+                    new_name = storage.save(name, content)
+                Post.objects.filter(pk=post.pk).update(image=new_name)
+                instances.posts.forget(pk=post.pk)
+                thumbnail_cache.forget_source(name)
+                feed_cache.bump(feed_cache.post_scopes(post))
+                # Старый файл мог достаться нескольким постам: удаляем,
+                # когда перенесён последний из них.
+                if not Post.objects.filter(image=name).exists():
+                    legacy.delete(name)
+            self.stdout.write(
+                f'До поста {last_id}: перенесено {moved}, нет файла {missing}'
+            )
+        verb = 'Нужно перенести' if options['dry_run'] else 'Перенесено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} картинок: {moved}, без файла: {missing}'
+        ))
@@ -0,0 +1,53 @@
+import pstats
+import statistics
+from io import StringIO
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import profiling
+
+SORT_KEYS = ('cumulative', 'tottime', 'ncalls')
+
+
+class Command(BaseCommand):
+    help = (
+        'Складывает профили из PROFILER["DIR"] и печатает самые '
+        'дорогие функции по всем запросам.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--view', help='Только эта вьюха, например posts:profile.'
+        )
+        parser.add_argument(
+            '--min-ms', type=int, default=0,
+            help='Только запросы не быстрее стольких миллисекунд.'
+        )
+        parser.add_argument('--sort', choices=SORT_KEYS, default='tottime')
+        parser.add_argument('--limit', type=int, default=25)
+
+    def handle(self, *args, **options):
+        directory = profiling.get_profiler_config()['DIR']
+        if not directory:
+            raise CommandError('PROFILER["DIR"] не задан.')
+        profiles = profiling.list_profiles(
+            directory, options['view'], options['min_ms']
+        )
+        if not profiles:
+            raise CommandError(f'Нет подходящих профилей в {directory}')
+        latencies = sorted(ms for _, _, ms in profiles)
+        views = sorted({view for _, view, _ in profiles})
+        self.stdout.write(
+            f'Профилей: {len(profiles)} ({", ".join(views)}), '
+            f'p50={statistics.median(latencies):.0f} мс '
+            f'max={latencies[-1]} мс'
+        )
+        # pstats печатает по кускам, а OutputWrapper добавил бы переводы
+        # строк к каждому.
+        report = StringIO()
+        stats = pstats.Stats(*(path for path, _, _ in profiles),
+                             stream=report)
+        stats.strip_dirs().sort_stats(options['sort']).print_stats(
+            options['limit']
+        )
+        self.stdout.write(report.getvalue())
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from core import profiling
+
+
+class Command(BaseCommand):
+    help = (
+        'Печатает значение заголовка X-Profile, по которому запрос '
+        'будет профилирован; действует PROFILER["TOKEN_MAX_AGE"] секунд.'
+    )
+
+    def handle(self, *args, **options):
+        if not profiling.get_profiler_config()['ENABLED']:
+            self.stderr.write(
+                'Профилирование выключено: включите PROFILER["ENABLED"].'
+            )
+        self.stdout.write(profiling.make_token())
@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import thumbnail_cache
+
+
+class Command(BaseCommand):
+    help = (
+        'Вытесняет давно не читанные миниатюры сверх предела размера '
+        'и удаляет миниатюры удалённых картинок. Для запуска по cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-size', type=int, default=None,
+            help='Предел размера кеша в байтах; '
+                 'по умолчанию THUMBNAIL_CACHE_MAX_SIZE.'
+        )
+        parser.add_argument(
+            '--time-limit', type=float, default=60,
+            help='Сколько секунд может работать команда.'
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--scan', action='store_true',
+            help='Сначала завести учёт миниатюр из KV-хранилища sorl '
+                 'и удалить файлы, о которых sorl не знает.'
+        )
+
+    def handle(self, *args, **options):
+        time_limit = options['time_limit']
+        if options['scan']:
+            started = time.monotonic()
+            imported = thumbnail_cache.import_kvstore(
+                started + time_limit, options['batch_size']
+            )
+            removed = thumbnail_cache.remove_untracked(
+                started + time_limit, options['batch_size']
+            )
+            self.stdout.write(
+                f'Взято на учёт: {imported}, удалено лишних файлов: {removed}'
+            )
+            time_limit = max(time_limit - (time.monotonic() - started), 0)
+        stats = thumbnail_cache.prune(
+            max_size=options['max_size'],
+            time_limit=time_limit,
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(
+            'Вытеснено: {evicted}, сирот: {orphans}, освобождено байт: '
+            '{freed}, размер кеша: {total}'.format(**stats)
+        )
+        if not stats['complete']:
+            self.stdout.write(self.style.WARNING(
+                'Не уложились во время, следующий запуск продолжит'
+            ))
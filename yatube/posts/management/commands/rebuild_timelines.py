@@ -0,0 +1,39 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает ленты подписок (TimelineEntry) пользователей.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'usernames', nargs='*',
+            help='Имена пользователей; без них пересобираются все ленты.'
+        )
+        parser.add_argument(
+            '--trim', action='store_true',
+            help='Не пересобирать, а только обрезать ленты длиннее '
+                 'TIMELINE_MAX_SIZE. Для запуска по cron.'
+        )
+
+    def handle(self, *args, **options):
+        if options['trim']:
+            trimmed = timeline.trim_all()
+            self.stdout.write(
+                self.style.SUCCESS(f'Обрезано лент: {trimmed}')
+            )
+            return
+        users = User.objects.order_by('pk')
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+        rebuilt = 0
+        for user_id in users.values_list('pk', flat=True).iterator():
+            timeline.rebuild(user_id)
+            rebuilt += 1
+        self.stdout.write(
+            self.style.SUCCESS(f'Пересобрано лент: {rebuilt}')
+        )
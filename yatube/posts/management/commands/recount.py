@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счётчики постов, комментариев и подписок '
+        'и исправляет накопившиеся расхождения.'
+    )
+
+    def handle(self, *args, **options):
+        counters.recount_all()
+        self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны'))
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core import routers
+
+
+class Command(BaseCommand):
+    help = (
+        'Обновляет реплики SQLite из DATABASE_REPLICAS копией основной '
+        'базы через online backup API.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'aliases', nargs='*',
+            help='Какие реплики обновить; по умолчанию все.'
+        )
+
+    def handle(self, *args, **options):
+        replicas = routers.get_replicas()
+        aliases = options['aliases'] or replicas
+        unknown = set(aliases) - set(replicas)
+        if unknown:
+            raise CommandError(
+                f'Не реплики: {", ".join(sorted(unknown))}'
+            )
+        source = connections[DEFAULT_DB_ALIAS].settings_dict
+        for alias in aliases:
+            target = connections[alias].settings_dict
+            if 'sqlite3' not in target['ENGINE']:
+                raise CommandError(f'{alias}: реплика не SQLite')
+            # Своё соединение с репликой закрываем, чтобы не держать снимок.
+            connections[alias].close()
+            started = time.monotonic()
+            routers.refresh_replica(source['NAME'], target['NAME'])
+            self.stdout.write(
+                f'{alias}: обновлена за '
+                f'{time.monotonic() - started:.2f} с'
+            )
@@ -0,0 +1,101 @@
+import random
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+
+from core import routers
+
+User = get_user_model()
+
+# Продление срока на каждом запросе — то, что заменяет грубое продление.
+VARIANTS = (
+    ('db, SESSION_SAVE_EVERY_REQUEST', {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+        'SESSION_SAVE_EVERY_REQUEST': True,
+    }),
+    ('db', {'SESSION_ENGINE': 'django.contrib.sessions.backends.db'}),
+    ('cached_db', {'SESSION_ENGINE': 'core.session_backends.cached_db'}),
+    ('signed_cookies', {
+        'SESSION_ENGINE': 'core.session_backends.signed_cookies',
+    }),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогоняет запросы авторизованных пользователей через '
+        'SessionMiddleware и считает записи в django_session для '
+        'стандартного хранилища сессий и ленивых из core.session_backends.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument(
+            '--write-ratio', type=float, default=0.1,
+            help='Доля запросов, которые что-то пишут и закрепляют сессию '
+                 'за основной базой.'
+        )
+
+    def view(self, write_ratio):
+        def view(request):
+            request.session.get('_auth_user_id')
+            if random.random() < write_ratio:
+                routers.pin(request)
+            return HttpResponse()
+        return view
+
+    def run_engine(self, engine, user_ids, options):
+        writes = 0
+
+        def count_writes(execute, sql, params, many, context):
+            nonlocal writes
+            if 'django_session' in sql and not sql.startswith('SELECT'):
+                writes += 1
+            return execute(sql, params, many, context)
+
+        store_class = import_module(engine).SessionStore
+        cookies = []
+        for user_id in user_ids:
+            store = store_class()
+            store['_auth_user_id'] = str(user_id)
+            store.save(must_create=True)
+            cookies.append(store.session_key)
+        factory = RequestFactory()
+        middleware = SessionMiddleware(self.view(options['write_ratio']))
+        cookie_name = settings.SESSION_COOKIE_NAME
+        started = time.perf_counter()
+        with connection.execute_wrapper(count_writes):
+            for number in range(options['requests']):
+                index = number % len(cookies)
+                request = factory.get('/')
+                request.COOKIES[cookie_name] = cookies[index]
+                response = middleware(request)
+                if cookie_name in response.cookies:
+                    cookies[index] = response.cookies[cookie_name].value
+        elapsed = time.perf_counter() - started
+        for key in cookies:
+            store_class(key).delete()
+        return writes, elapsed
+
+    def handle(self, *args, **options):
+        user_ids = list(
+            User.objects.values_list('pk', flat=True)[:options['users']]
+        ) or [0]
+        for title, overrides in VARIANTS:
+            with override_settings(**overrides):
+                writes, elapsed = self.run_engine(
+                    overrides['SESSION_ENGINE'], user_ids, options
+                )
+            self.stdout.write(
+                f'{title}: записей в django_session {writes} на '
+                f'{options["requests"]} запросов, '
+                f'{options["requests"] / elapsed:.0f} запросов/с'
+            )
@@ -0,0 +1,125 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import db
+
+SCHEMA = (
+    'CREATE TABLE post (id INTEGER PRIMARY KEY, text TEXT, '
+    'comment_count INTEGER NOT NULL DEFAULT 0)',
+    'CREATE TABLE comment (id INTEGER PRIMARY KEY, post_id INTEGER, '
+    'text TEXT)',
+    'CREATE INDEX comment_post ON comment (post_id)',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест SQLite: одновременные чтения ленты и запись '
+        'комментариев на стандартных настройках и с профилем core.db.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument(
+            '--duration', type=float, default=5.0,
+            help='Секунд на каждый профиль.'
+        )
+        parser.add_argument('--posts', type=int, default=1000)
+
+    def prepare(self, path, pragmas, posts):
+        connection = sqlite3.connect(path)
+        db.apply_pragmas(connection, pragmas)
+        for statement in SCHEMA:
+            connection.execute(statement)
+        connection.executemany(
+            'INSERT INTO post (text) VALUES (?)',
+            ((f'Пост {number} ' * 20,) for number in range(posts))
+        )
+        connection.commit()
+        connection.close()
+
+    def read(self, connection, number):
+        rows = connection.execute(
+            'SELECT id, text, comment_count FROM post '
+            'ORDER BY id DESC LIMIT 10'
+        ).fetchall()
+        connection.execute(
+            'SELECT count(*) FROM comment WHERE post_id = ?', (rows[0][0],)
+        ).fetchone()
+
+    def write(self, connection, number):
+        post_id = number % 10 + 1
+        with connection:
+            connection.execute(
+                'INSERT INTO comment (post_id, text) VALUES (?, ?)',
+                (post_id, f'Комментарий {number}')
+            )
+            connection.execute(
+                'UPDATE post SET comment_count = comment_count + 1 '
+                'WHERE id = ?', (post_id,)
+            )
+
+    def run_profile(self, pragmas, options):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'load.sqlite3')
+        self.prepare(path, pragmas, options['posts'])
+        counts = {'read': 0, 'write': 0, 'locked': 0}
+        lock = threading.Lock()
+        deadline = time.monotonic() + options['duration']
+
+        def worker(operation, kind):
+            connection = sqlite3.connect(path)
+            db.apply_pragmas(connection, pragmas)
+            done = locked = 0
+            while time.monotonic() < deadline:
+                try:
+                    operation(connection, done)
+                    done += 1
+                except sqlite3.OperationalError as error:
+                    if not db.is_locked_error(error):
+                        raise
+                    locked += 1
+            connection.close()
+            with lock:
+                counts[kind] += done
+                counts['locked'] += locked
+
+        threads = [
+            threading.Thread(target=worker, args=(self.read, 'read'))
+            for _ in range(options['readers'])
+        ] + [
+            threading.Thread(target=worker, args=(self.write, 'write'))
+            for _ in range(options['writers'])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+        return {
+            kind: counts[kind] / options['duration']
+            for kind in ('read', 'write')
+        }, counts['locked']
+
+    def handle(self, *args, **options):
+        results = {}
+        for name, pragmas in (('default', {}), ('profile', db.get_pragmas())):
+            rates, locked = self.run_profile(pragmas, options)
+            results[name] = rates
+            self.stdout.write(
+                f"{name:<8} чтений/с={rates['read']:.0f} "
+                f"записей/с={rates['write']:.0f} блокировок={locked}"
+            )
+        for kind, title in (('read', 'чтения'), ('write', 'записи')):
+            before = results['default'][kind]
+            after = results['profile'][kind]
+            if before:
+                self.stdout.write(f'{title}: x{after / before:.2f}')
@@ -0,0 +1,24 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:05
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    from posts.search import create_index
+    create_index(schema_editor)
+
+
+def drop_search_index(apps, schema_editor):
+    from posts.search import drop_index
+    drop_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
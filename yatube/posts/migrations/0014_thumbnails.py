@@ -0,0 +1,32 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_post_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Thumbnail',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Файл')),
+                ('key', models.CharField(max_length=255, verbose_name='Ключ sorl')),
+                ('source', models.CharField(db_index=True, max_length=255, verbose_name='Исходник')),
+                ('size', models.PositiveIntegerField(default=0, verbose_name='Размер')),
+                ('accessed', models.DateTimeField(db_index=True, verbose_name='Последнее обращение')),
+            ],
+            options={
+                'verbose_name': 'Миниатюра',
+                'verbose_name_plural': 'Миниатюры',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['image'], name='post_image_idx'),
+        ),
+    ]
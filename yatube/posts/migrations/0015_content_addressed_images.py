@@ -0,0 +1,24 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:04
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('posts', '0014_thumbnails'),
+    ]
+
+    operations = [
+        # Хранилище не меняет схему; без SeparateDatabaseAndState
+        # SQLite пересоздал бы всю таблицу постов.
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.AlterField(
+                model_name='post',
+                name='image',
+                field=models.ImageField(blank=True, storage=core.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Картинка'),
+            ),
+        ]),
+    ]
@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.db import migrations
+
+BATCH_SIZE = 500
+
+
+def backfill_timelines(apps, schema_editor):
+    """Собирает ленты подписок, существовавших до TimelineEntry."""
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    max_size = getattr(settings, 'TIMELINE_MAX_SIZE', 1000)
+    user_ids = (
+        Follow.objects.order_by('user_id')
+        .values_list('user_id', flat=True).distinct()
+    )
+    for user_id in user_ids.iterator():
+        if TimelineEntry.objects.filter(user_id=user_id).exists():
+            # Уже собрана rebuild_timelines или подпиской.
+            continue
+        authors = Follow.objects.filter(user_id=user_id).values('author_id')
+        posts = (
+            Post.objects.filter(author_id__in=authors)
+            .order_by('-pub_date', '-id')
+            .values_list('id', 'pub_date')[:max_size]
+        )
+        TimelineEntry.objects.bulk_create(
+            [
+                TimelineEntry(user_id=user_id, post_id=post_id,
+                              pub_date=pub_date)
+                for post_id, pub_date in posts
+            ],
+            batch_size=BATCH_SIZE
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_content_addressed_images'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_timelines, migrations.RunPython.noop),
+    ]
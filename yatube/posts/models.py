@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from core.storage import ContentAddressedStorage
+
 
 User = get_user_model()
 
@@ -42,13 +44,34 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True
     )
+    comments_count = models.PositiveIntegerField(
+        'Комментариев',
+        default=0,
+        editable=False
+    )
 
     class Meta:
-        ordering = ['-pub_date']
+        ordering = ['-pub_date', '-id']
         verbose_name_plural = 'Посты'
         verbose_name = 'Пост'
+        indexes = [
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx'
+            ),
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_pub_date_id_idx'
+            ),
+            models.Index(fields=['image'], name='post_image_idx'),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -68,6 +91,14 @@ class Comment(models.Model):
     text = models.TextField()
     created = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['post', 'created'],
+                name='comment_post_created_idx'
+            ),
+        ]
+
     def __str__(self):
         return str(self.text)
 
@@ -81,3 +112,90 @@ class Follow(models.Model):
         User, on_delete=models.CASCADE,
         related_name='following'
     )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'],
+                name='unique_follow'
+            ),
+        ]
+
+
+class AuthorStats(models.Model):
+    """Счётчики пользователя, которые обновляются вместе с записью.
+
+    Заменяют COUNT(*) по постам и подпискам на страницах профиля
+    и поста; расхождения чинит команда recount.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+
+    class Meta:
+        verbose_name_plural = 'Счётчики авторов'
+        verbose_name = 'Счётчики автора'
+
+    def __str__(self):
+        return str(self.user)
+
+
+class TimelineEntry(models.Model):
+    """Запись ленты подписок, разложенная заранее (fan-out on write).
+
+    pub_date копируется из поста, чтобы лента пользователя читалась
+    одним диапазоном по индексу (user, -pub_date, -post).
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-pub_date', '-post_id']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entry'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_pub_date_idx'
+            ),
+        ]
+
+
+class Thumbnail(models.Model):
+    """Миниатюра sorl на диске: учёт размера и последнего обращения.
+
+    Строки заводит и обновляет KV-хранилище posts.thumbnail_cache,
+    по ним команда prune_thumbnails вытесняет давно не читанные
+    миниатюры и миниатюры удалённых картинок.
+    """
+    name = models.CharField('Файл', max_length=255, unique=True)
+    key = models.CharField('Ключ sorl', max_length=255)
+    source = models.CharField('Исходник', max_length=255, db_index=True)
+    size = models.PositiveIntegerField('Размер', default=0)
+    accessed = models.DateTimeField('Последнее обращение', db_index=True)
+
+    class Meta:
+        verbose_name_plural = 'Миниатюры'
+        verbose_name = 'Миниатюра'
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,93 @@
+# posts/page_cache.py
+"""Кеш целых страниц лент для анонимных читателей.
+
+ETag и Last-Modified считаются из поколений областей ленты
+(см. feed_cache) и самой свежей даты публикации в ней, поэтому
+условный запрос получает 304 без ORM-выборки постов и без шаблонов.
+Запись поста сдвигает поколение, а с ним и ETag, и ключ кеша.
+Формат миниатюр, выбранный по Accept, тоже входит в ETag и ключ.
+Страницу для кеша вьюха собирает по основной базе, а не по реплике.
+"""
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from core.cache import get_or_compute
+from core.routers import read_from_primary
+
+from . import feed_cache, thumbnails
+
+PAGE_KEY = 'feed:page:{}'
+
+
+def _last_modified(generations, posts):
+    """Время последнего изменения ленты в секундах."""
+    newest = posts.order_by('-pub_date').values_list(
+        'pub_date', flat=True
+    ).first()
+    timestamps = [generation / 1000000 for generation in generations]
+    if newest is not None:
+        timestamps.append(newest.timestamp())
+    if not timestamps:
+        return int(datetime.now(timezone.utc).timestamp())
+    return int(max(timestamps))
+
+
+def _is_cacheable(response):
+    return response.status_code == 200 and not (
+        response.streaming or response.cookies
+    )
+
+
+def _render_from_primary(view, request, args, kwargs):
+    # Поколение уже сдвинуто, а реплика могла ещё не получить запись:
+    # страница, собранная с неё, хранилась бы под новым ключом весь срок.
+    with read_from_primary():
+        return view(request, *args, **kwargs)
+
+
+def cache_anonymous_feed(feed):
+    """Декоратор вьюхи ленты.
+
+    feed(**kwargs) возвращает пару (области, queryset постов ленты)
+    или None, если ленты нет — тогда вьюха отвечает сама (404).
+    Авторизованные пользователи и не-GET запросы идут мимо кеша.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (request.method not in ('GET', 'HEAD')
+                    or request.user.is_authenticated):
+                return view(request, *args, **kwargs)
+            found = feed(**kwargs)
+            if found is None:
+                return view(request, *args, **kwargs)
+            scopes, posts = found
+            generations = feed_cache.get_generations(sorted(scopes))
+            last_modified = _last_modified(generations.values(), posts)
+            raw = ':'.join(
+                [request.get_full_path(), str(last_modified),
+                 thumbnails.negotiate_format(request)]
+                + [f'{scope}={generations[scope]}' for scope in sorted(scopes)]
+            )
+            digest = hashlib.md5(raw.encode()).hexdigest()
+            etag = f'"{digest}"'
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified
+            )
+            if response is None:
+                response = get_or_compute(
+                    PAGE_KEY.format(digest),
+                    lambda: _render_from_primary(view, request, args, kwargs),
+                    feed_cache.get_timeout(),
+                    cacheable=_is_cacheable,
+                )
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+            patch_vary_headers(response, ('Accept', 'Cookie'))
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,236 @@
+# posts/paginators.py
+import base64
+import json
+from datetime import datetime
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+
+CURSOR_ORDERING = ('-pub_date', '-id')
+
+ELLIPSIS = '…'
+PAGES_ON_EACH_SIDE = 3
+PAGES_ON_ENDS = 2
+# Предел 64-битного INTEGER: большее число база не примет как параметр.
+MAX_INTEGER = 2 ** 63 - 1
+
+
+def encode_values(values):
+    """Курсор из списка значений ключа: base64 от JSON без паддинга."""
+    raw = json.dumps(values)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_values(cursor):
+    """Список значений из курсора или None, если курсор испорчен."""
+    if not cursor:
+        return None
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(cursor + padding))
+    except ValueError:
+        return None
+    return values if isinstance(values, list) else None
+
+
+class ElidedPage(Page):
+    """Страница с сокращённым списком номеров для шаблона."""
+
+    @property
+    def elided_page_range(self):
+        return self.paginator.get_elided_page_range(self.number)
+
+
+class ElidedPaginator(Paginator):
+    """Paginator, который отдаёт окно номеров вокруг текущей страницы.
+
+    Вместо всего page_range шаблон получает первые и последние
+    on_ends страниц и on_each_side страниц по бокам от текущей,
+    пропуски заменены на ELLIPSIS. Длина списка не зависит от
+    числа страниц.
+    """
+    ELLIPSIS = ELLIPSIS
+
+    def _get_page(self, *args, **kwargs):
+        return ElidedPage(*args, **kwargs)
+
+    def get_elided_page_range(self, number=1, on_each_side=PAGES_ON_EACH_SIDE,
+                              on_ends=PAGES_ON_ENDS):
+        number = self.validate_number(number)
+        num_pages = self.num_pages
+        if num_pages <= (on_each_side + on_ends) * 2:
+            yield from self.page_range
+            return
+        if number > 1 + on_each_side + on_ends + 1:
+            yield from range(1, on_ends + 1)
+            yield ELLIPSIS
+            yield from range(number - on_each_side, number + 1)
+        else:
+            yield from range(1, number + 1)
+        if number < num_pages - on_each_side - on_ends - 1:
+            yield from range(number + 1, number + on_each_side + 1)
+            yield ELLIPSIS
+            yield from range(num_pages - on_ends + 1, num_pages + 1)
+        else:
+            yield from range(number + 1, num_pages + 1)
+
+
+class CursorPage:
+    """Страница курсорного паджинатора.
+
+    Повторяет ту часть интерфейса Page, которой пользуются шаблоны,
+    но вместо номеров страниц отдаёт курсоры соседних страниц.
+    """
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, has_previous, has_next):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_previous = has_previous
+        self._has_next = has_next
+        # Крайние записи запоминаются сразу: вьюха может подменить
+        # object_list (лента подписок отдаёт посты вместо записей ленты).
+        self._first = object_list[0] if object_list else None
+        self._last = object_list[-1] if object_list else None
+
+    def __repr__(self):
+        return f'<Cursor page of {len(self.object_list)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_next(self):
+        return self._has_next
+
+    def has_other_pages(self):
+        return self._has_previous or self._has_next
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous or self._first is None:
+            return None
+        return self.paginator.encode_cursor(self._first)
+
+    @property
+    def next_cursor(self):
+        if not self._has_next or self._last is None:
+            return None
+        return self.paginator.encode_cursor(self._last)
+
+
+class CursorPaginator:
+    """Паджинатор по ключу (keyset) без COUNT(*) и OFFSET.
+
+    Записи упорядочены по полям ordering (по умолчанию -pub_date, -id),
+    курсор хранит значения этих полей у крайней записи страницы.
+    Соседняя страница выбирается условием по индексу, поэтому время
+    ответа не зависит от глубины листания.
+    """
+
+    def __init__(self, object_list, per_page, ordering=CURSOR_ORDERING):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.fields = tuple(name.lstrip('-') for name in self.ordering)
+
+    def encode_cursor(self, obj):
+        # isoformat() вместо DjangoJSONEncoder: тот обрезает микросекунды,
+        # и посты с близким pub_date выпадали бы из ленты.
+        return encode_values([
+            value.isoformat() if isinstance(value, datetime) else value
+            for value in (getattr(obj, name) for name in self.fields)
+        ])
+
+    def decode_cursor(self, cursor):
+        """Значения ключа из курсора или None, если курсор испорчен."""
+        values = decode_values(cursor)
+        if values is None or len(values) != len(self.fields):
+            return None
+        try:
+            opts = self.object_list.model._meta
+            values = [
+                opts.get_field(name).to_python(value)
+                for name, value in zip(self.fields, values)
+            ]
+        except (ValidationError, ValueError, TypeError, AttributeError,
+                OverflowError):
+            return None
+        # С NULL условие __lt/__gt не строится; '' тоже даёт None.
+        if any(value is None for value in values):
+            return None
+        if any(isinstance(value, int) and abs(value) > MAX_INTEGER
+               for value in values):
+            return None
+        return values
+
+    def _seek(self, values, forward):
+        """Условие «строго после курсора» в заданном направлении."""
+        condition = Q()
+        equal = {}
+        for name, value in zip(self.ordering, values):
+            field = name.lstrip('-')
+            descending = name.startswith('-')
+            lookup = 'lt' if descending == forward else 'gt'
+            condition |= Q(**equal, **{f'{field}__{lookup}': value})
+            equal[field] = value
+        return condition
+
+    def _reversed_ordering(self):
+        return tuple(
+            name[1:] if name.startswith('-') else f'-{name}'
+            for name in self.ordering
+        )
+
+    def get_page(self, after=None, before=None):
+        """Страница после курсора after (старше) или до before (новее).
+
+        Без курсоров возвращается первая страница. Запрашивается
+        per_page + 1 записей: лишняя говорит о наличии следующей страницы.
+        """
+        after_values = self.decode_cursor(after)
+        before_values = self.decode_cursor(before)
+        queryset = self.object_list
+        if before_values is not None:
+            queryset = queryset.filter(
+                self._seek(before_values, forward=False)
+            ).order_by(*self._reversed_ordering())
+            rows = list(queryset[:self.per_page + 1])
+            has_previous = len(rows) > self.per_page
+            object_list = rows[:self.per_page][::-1]
+            return CursorPage(object_list, self, has_previous, True)
+        queryset = queryset.order_by(*self.ordering)
+        if after_values is not None:
+            queryset = queryset.filter(self._seek(after_values, forward=True))
+        rows = list(queryset[:self.per_page + 1])
+        has_next = len(rows) > self.per_page
+        return CursorPage(
+            rows[:self.per_page], self, after_values is not None, has_next
+        )
+
+
+def paginate(request, queryset, per_page, ordering=CURSOR_ORDERING):
+    """Страница ленты для шаблона.
+
+    Курсорный режим включается настройкой POSTS_CURSOR_PAGINATION
+    или курсором в запросе (?after=... / ?before=...), иначе работает
+    ElidedPaginator с окном номеров страниц.
+    """
+    after = request.GET.get('after')
+    before = request.GET.get('before')
+    cursor_mode = getattr(settings, 'POSTS_CURSOR_PAGINATION', False)
+    if cursor_mode or after or before:
+        paginator = CursorPaginator(queryset, per_page, ordering)
+        return paginator.get_page(after=after, before=before)
+    paginator = ElidedPaginator(queryset, per_page)
+    return paginator.get_page(request.GET.get('page'))
@@ -0,0 +1,193 @@
+# posts/search.py
+"""Полнотекстовый поиск по постам на SQLite FTS5.
+
+Индекс posts_post_fts хранит текст поста под rowid = Post.id и
+обновляется сигналами сохранения и удаления постов. Выдача отсортирована
+по bm25 и листается курсором по (rank, rowid), без OFFSET.
+На других СУБД поиск откатывается к LIKE по тексту.
+"""
+import math
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connections, router
+from django.db.models.expressions import RawSQL
+
+from .models import Post
+from .paginators import (
+    CursorPage, CursorPaginator, decode_values, encode_values
+)
+
+FTS_TABLE = 'posts_post_fts'
+TOKEN = re.compile(r'\w+', re.UNICODE)
+# Больше SQLite INTEGER не вмещает: такой rowid не привязать к запросу.
+MAX_ROWID = 2 ** 63 - 1
+
+
+def is_available(using=DEFAULT_DB_ALIAS):
+    return connections[using].vendor == 'sqlite'
+
+
+def create_index(schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5('
+        "text, tokenize='unicode61 remove_diacritics 2')"
+    )
+    schema_editor.execute(
+        f'INSERT INTO {FTS_TABLE} (rowid, text) '
+        'SELECT id, text FROM posts_post'
+    )
+
+
+def drop_index(schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def build_query(text):
+    """Запрос FTS5 из пользовательского текста.
+
+    Каждое слово берётся в кавычки, чтобы операторы FTS5 из ввода
+    не исполнялись; последнее слово ищется и как префикс.
+    """
+    tokens = TOKEN.findall(text)
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def index_post(post, using=DEFAULT_DB_ALIAS):
+    if not is_available(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post.pk])
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)',
+            [post.pk, post.text]
+        )
+
+
+def remove_post(post_id, using=DEFAULT_DB_ALIAS):
+    if not is_available(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id])
+
+
+def rebuild():
+    """Перестраивает индекс по таблице постов; возвращает число постов."""
+    with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, text) '
+            'SELECT id, text FROM posts_post'
+        )
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) "
+                       "VALUES ('optimize')")
+        cursor.execute(f'SELECT count(*) FROM {FTS_TABLE}')
+        return cursor.fetchone()[0]
+
+
+def filter_queryset(queryset, text):
+    """Посты queryset, подходящие под поисковый текст (для админки)."""
+    query = build_query(text)
+    if query is None:
+        return queryset
+    if not is_available():
+        return queryset.filter(text__icontains=text)
+    return queryset.filter(pk__in=RawSQL(
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [query]
+    ))
+
+
+class SearchPaginator:
+    """Курсорная выдача поиска по (rank, rowid).
+
+    Страница — это одна выборка LIMIT из индекса и одна выборка постов
+    по первичному ключу. Интерфейс страниц совпадает с CursorPage.
+    Обе идут в одну базу: индекс основной базы и отстающая реплика
+    дали бы посты, которых на реплике ещё нет, и короткие страницы.
+    """
+
+    def __init__(self, text, per_page):
+        self.text = text
+        self.query = build_query(text)
+        self.per_page = int(per_page)
+        self.using = router.db_for_read(Post)
+
+    def encode_cursor(self, post):
+        return encode_values([post.search_rank, post.pk])
+
+    def decode_cursor(self, cursor):
+        values = decode_values(cursor)
+        if values is None or len(values) != 2:
+            return None
+        try:
+            rank, post_id = float(values[0]), int(values[1])
+        except (TypeError, ValueError, OverflowError):
+            return None
+        if not math.isfinite(rank) or abs(post_id) > MAX_ROWID:
+            return None
+        return rank, post_id
+
+    def _match(self, cursor, forward):
+        sql = (
+            f'SELECT rowid, rank FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s'
+        )
+        params = [self.query]
+        if cursor is not None:
+            rank, post_id = cursor
+            op = '>' if forward else '<'
+            sql += f' AND (rank {op} %s OR (rank = %s AND rowid {op} %s))'
+            params += [rank, rank, post_id]
+        direction = 'ASC' if forward else 'DESC'
+        sql += f' ORDER BY rank {direction}, rowid {direction} LIMIT %s'
+        params.append(self.per_page + 1)
+        with connections[self.using].cursor() as db_cursor:
+            db_cursor.execute(sql, params)
+            return db_cursor.fetchall()
+
+    def _posts(self, rows):
+        posts = Post.objects.using(self.using).select_related(
+            'author', 'group'
+        ).in_bulk(
+            [post_id for post_id, _ in rows]
+        )
+        result = []
+        for post_id, rank in rows:
+            post = posts.get(post_id)
+            if post is not None:
+                post.search_rank = rank
+                result.append(post)
+        return result
+
+    def get_page(self, after=None, before=None):
+        if self.query is None:
+            return CursorPage([], self, False, False)
+        if not is_available(self.using):
+            return self._fallback_page(after, before)
+        before_cursor = self.decode_cursor(before)
+        if before_cursor is not None:
+            rows = self._match(before_cursor, forward=False)
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            return CursorPage(self._posts(rows), self, has_previous, True)
+        after_cursor = self.decode_cursor(after)
+        rows = self._match(after_cursor, forward=True)
+        has_next = len(rows) > self.per_page
+        return CursorPage(
+            self._posts(rows[:self.per_page]), self,
+            after_cursor is not None, has_next
+        )
+
+    def _fallback_page(self, after, before):
+        paginator = CursorPaginator(
+            Post.objects.using(self.using).select_related('author', 'group')
+            .filter(text__icontains=self.text),
+            self.per_page
+        )
+        return paginator.get_page(after=after, before=before)
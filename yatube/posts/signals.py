@@ -0,0 +1,233 @@
+# posts/signals.py
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+
+from core.media import media_served
+
+from . import counters, feed_cache, search, thumbnail_cache, timeline
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+def bump_feeds(scopes):
+    """Сдвигает поколения сейчас и ещё раз после коммита.
+
+    Без второго сдвига чтение между сигналом и коммитом могло бы
+    закешировать старые данные под уже новым поколением.
+    """
+    feed_cache.bump(scopes)
+    transaction.on_commit(lambda: feed_cache.bump(scopes))
+
+
+@receiver(post_save, sender=Post)
+def fan_out_new_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, using, **kwargs):
+    search.index_post(instance, using)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, using, **kwargs):
+    search.remove_post(instance.pk, using)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    timeline.prune(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+def count_new_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.post_created(instance)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.post_deleted(instance)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.comment_added(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.comment_removed(instance)
+
+
+@receiver(post_save, sender=Follow)
+def count_new_follow(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.follow_added(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    counters.follow_removed(instance)
+
+
+@receiver(pre_save, sender=Post)
+def remember_old_values(sender, instance, raw=False, **kwargs):
+    """Старые группа и картинка поста до сохранения.
+
+    При смене группы пост должен пропасть и из старой ленты группы,
+    при смене картинки — миниатюры старой картинки.
+    """
+    instance._old_group_id = instance._old_image = None
+    if instance.pk and not raw:
+        old = Post.objects.filter(pk=instance.pk).values_list(
+            'group_id', 'image'
+        ).first()
+        if old is not None:
+            instance._old_group_id, instance._old_image = old
+
+
+def release_image(storage, name):
+    """Снимает ссылку на файл картинки и убирает его миниатюры.
+
+    Всё делается после коммита: при откате пост снова сошлётся на файл.
+    Одинаковые картинки разных постов — один файл со счётчиком ссылок;
+    он и миниатюры к нему удаляются только вместе с последней ссылкой.
+    """
+    def release():
+        storage.delete(name)
+        if not storage.exists(name):
+            thumbnail_cache.forget_source(name)
+
+    transaction.on_commit(release)
+
+
+@receiver(post_save, sender=Post)
+def release_replaced_image(sender, instance, **kwargs):
+    old_image = getattr(instance, '_old_image', None)
+    if old_image and old_image != instance.image.name:
+        release_image(instance.image.storage, old_image)
+
+
+@receiver(post_delete, sender=Post)
+def release_deleted_image(sender, instance, **kwargs):
+    if instance.image:
+        release_image(instance.image.storage, instance.image.name)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_feeds(sender, instance, **kwargs):
+    old_group_id = getattr(instance, '_old_group_id', None)
+    bump_feeds(feed_cache.post_scopes(instance, [old_group_id]))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_feeds(sender, instance, **kwargs):
+    # В лентах показывается число комментариев поста.
+    post = Post.objects.filter(pk=instance.post_id).only(
+        'author_id', 'group_id'
+    ).first()
+    if post is not None:
+        bump_feeds(feed_cache.post_scopes(post))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_timeline_feed(sender, instance, **kwargs):
+    bump_feeds([feed_cache.timeline_scope(instance.user_id)])
+
+
+def _remember_names(sender, instance, fields, raw, update_fields):
+    # Вход пользователя сохраняет только last_login: лишний запрос ни к чему.
+    instance._old_names = None
+    if raw or not instance.pk:
+        return
+    if update_fields is not None and not set(fields) & set(update_fields):
+        return
+    instance._old_names = sender._default_manager.filter(
+        pk=instance.pk
+    ).values_list(*fields).first()
+
+
+def invalidate_post_cards(posts, scopes):
+    """Сдвигает области scopes и все ленты с карточками постов posts.
+
+    В карточке есть имя автора и ссылка на группу, поэтому при их
+    переименовании устаревают ленты каждого поста, а не одна область.
+    """
+    posts = list(posts.values_list('pk', 'author_id', 'group_id'))
+    scopes = {feed_cache.GLOBAL_SCOPE, *scopes}
+    for pk, author_id, group_id in posts:
+        scopes.add(feed_cache.post_scope(pk))
+        scopes.add(feed_cache.author_scope(author_id))
+        if group_id is not None:
+            scopes.add(feed_cache.group_scope(group_id))
+    followers = Follow.objects.filter(
+        author_id__in={author_id for _, author_id, _ in posts}
+    ).values_list('user_id', flat=True)
+    scopes.update(feed_cache.timeline_scope(pk) for pk in followers)
+    bump_feeds(scopes)
+
+
+@receiver(pre_save, sender=Group)
+def remember_group_names(sender, instance, raw=False, update_fields=None,
+                         **kwargs):
+    _remember_names(sender, instance, ('slug', 'title'), raw, update_fields)
+
+
+@receiver(post_save, sender=Group)
+def invalidate_renamed_group(sender, instance, created, **kwargs):
+    old = getattr(instance, '_old_names', None)
+    if old is not None and old != (instance.slug, instance.title):
+        invalidate_post_cards(
+            Post.objects.filter(group_id=instance.pk),
+            [feed_cache.group_scope(instance.pk)]
+        )
+
+
+@receiver(pre_delete, sender=Group)
+def invalidate_deleted_group(sender, instance, **kwargs):
+    # Посты остаются без группы через SET_NULL, а это UPDATE без сигналов.
+    invalidate_post_cards(
+        Post.objects.filter(group_id=instance.pk),
+        [feed_cache.group_scope(instance.pk)]
+    )
+
+
+@receiver(pre_save, sender=User)
+def remember_username(sender, instance, raw=False, update_fields=None,
+                      **kwargs):
+    _remember_names(sender, instance, ('username',), raw, update_fields)
+
+
+@receiver(post_save, sender=User)
+def invalidate_renamed_author(sender, instance, created, **kwargs):
+    old = getattr(instance, '_old_names', None)
+    if old is not None and old != (instance.username,):
+        invalidate_post_cards(
+            Post.objects.filter(author_id=instance.pk),
+            [feed_cache.author_scope(instance.pk)]
+        )
+
+
+@receiver(media_served)
+def touch_served_thumbnail(sender, path, **kwargs):
+    # Закешированные страницы не читают KV-хранилище sorl: обращение
+    # к миниатюре видно только по её отдаче.
+    if thumbnail_cache.is_thumbnail(path):
+        thumbnail_cache.touch(path)
@@ -0,0 +1,57 @@
+# posts/templatetags/feed_cache_tags.py
+from django import template
+
+from posts import feed_cache, thumbnails
+
+register = template.Library()
+
+
+class FeedCacheNode(template.Node):
+    def __init__(self, nodelist, name, scopes, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.scopes = scopes
+        self.vary_on = vary_on
+
+    def render(self, context):
+        vary_on = [value.resolve(context) for value in self.vary_on]
+        request = context.get('request')
+        if request is not None:
+            # Во фрагментах миниатюры в формате, выбранном по Accept.
+            vary_on.append(thumbnails.negotiate_format(request))
+        scopes = self.scopes.resolve(context)
+        generations = feed_cache.get_generations(sorted(scopes))
+        key = feed_cache.fragment_key(
+            self.name.resolve(context), scopes, vary_on, generations
+        )
+        return feed_cache.get_or_render(
+            key, lambda: self.nodelist.render(context),
+            feed_cache.get_timeout(generations.values())
+        )
+
+
+@register.tag('feedcache')
+def do_feedcache(parser, token):
+    """Кеширует фрагмент ленты до смены поколения её областей.
+
+    {% feedcache "index" feed_scopes request.GET.urlencode %}
+        ...
+    {% endfeedcache %}
+
+    Первый аргумент — имя фрагмента, второй — список областей
+    (см. posts.feed_cache), остальные добавляются к ключу как есть.
+    Формат миниатюр для текущего запроса входит в ключ всегда.
+    """
+    nodelist = parser.parse(('endfeedcache',))
+    parser.delete_first_token()
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(
+            f"'{bits[0]}' принимает имя фрагмента и список областей."
+        )
+    return FeedCacheNode(
+        nodelist,
+        parser.compile_filter(bits[1]),
+        parser.compile_filter(bits[2]),
+        [parser.compile_filter(bit) for bit in bits[3:]],
+    )
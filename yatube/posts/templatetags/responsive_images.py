@@ -0,0 +1,39 @@
+# posts/templatetags/responsive_images.py
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def responsive_thumbnail(context, image, geometry, css_class='', alt='',
+                         **options):
+    """<img> с srcset из нескольких ширин и ленивой загрузкой.
+
+    {% responsive_thumbnail post.image "960x339" crop="center" %}
+
+    Формат (AVIF, WebP или JPEG) выбирается по заголовку Accept,
+    поэтому ответы со страницами должны варьироваться по Accept.
+    """
+    if not image:
+        return ''
+    request = context.get('request')
+    image_format = (
+        thumbnails.negotiate_format(request) if request is not None
+        else thumbnails.DEFAULT_FORMAT
+    )
+    base, variants = thumbnails.responsive_set(
+        image, geometry, image_format, **options
+    )
+    srcset = format_html_join(
+        ', ', '{} {}w', ((im.url, width) for width, im in variants)
+    )
+    return format_html(
+        '<img class="{}" src="{}" srcset="{}" '
+        'sizes="(max-width: {}px) 100vw, {}px" width="{}" height="{}" '
+        'alt="{}" loading="lazy" decoding="async">',
+        css_class, base.url, srcset, base.width, base.width,
+        base.width, base.height, alt
+    )
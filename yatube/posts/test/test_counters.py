@@ -0,0 +1,96 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import AuthorStats, Comment, Post
+
+User = get_user_model()
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='counted')
+        cls.reader = User.objects.create_user(username='counter')
+        cls.post = Post.objects.create(text='Пост', author=cls.author)
+
+    def setUp(self):
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def stats(self, user):
+        return AuthorStats.objects.get(user=user)
+
+    def test_post_and_comment_counters(self):
+        """Пост и комментарий через вьюхи сдвигают счётчики."""
+        self.author_client.post(reverse('posts:create'), {'text': 'Ещё'})
+        self.assertEqual(self.stats(self.author).posts_count, 2)
+        self.reader_client.post(
+            reverse('posts:add_comment', args=[self.post.id]),
+            {'text': 'Комментарий'}
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+
+    def test_delete_decrements_counters(self):
+        """Удаление поста и комментария сдвигает счётчики назад."""
+        post = Post.objects.create(text='Удаляемый', author=self.author)
+        comment = Comment.objects.create(
+            post=self.post, author=self.reader, text='!'
+        )
+        self.assertEqual(self.stats(self.author).posts_count, 2)
+        comment.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 0)
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+
+    def test_reads_do_not_write(self):
+        """Без строки счётчиков страницы считают по базе и не пишут."""
+        AuthorStats.objects.filter(user=self.author).delete()
+        response = self.reader_client.get(
+            reverse('posts:profile', args=['counted'])
+        )
+        self.assertEqual(response.context['author_stats'].posts_count, 1)
+        response = self.reader_client.get(
+            reverse('posts:post_detail', args=[self.post.id])
+        )
+        self.assertEqual(response.context['posts_count'], 1)
+        self.assertFalse(AuthorStats.objects.filter(user=self.author).exists())
+
+    def test_follow_counters(self):
+        """Подписка и отписка меняют счётчики обеих сторон."""
+        follow_url = reverse('posts:profile_follow', args=['counted'])
+        self.reader_client.get(follow_url)
+        self.reader_client.get(follow_url)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        self.reader_client.get(
+            reverse('posts:profile_unfollow', args=['counted'])
+        )
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+
+    def test_post_detail_reads_counter(self):
+        """post_detail показывает счётчик, а не считает посты."""
+        AuthorStats.objects.filter(user=self.author).update(posts_count=7)
+        response = self.reader_client.get(
+            reverse('posts:post_detail', args=[self.post.id])
+        )
+        self.assertEqual(response.context['posts_count'], 7)
+
+    def test_recount_repairs_drift(self):
+        """Команда recount исправляет сбитые счётчики."""
+        AuthorStats.objects.filter(user=self.author).update(posts_count=42)
+        Comment.objects.create(post=self.post, author=self.reader, text='!')
+        call_command('recount', stdout=StringIO())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.reader).posts_count, 0)
@@ -0,0 +1,187 @@
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.routers import get_replica_lag
+from posts import feed_cache
+from posts.models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class FeedCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='cached')
+        cls.old_group = Group.objects.create(
+            title='Старая', slug='old', description='-'
+        )
+        cls.new_group = Group.objects.create(
+            title='Новая', slug='new', description='-'
+        )
+        cls.post = Post.objects.create(
+            text='Кешируемый пост', author=cls.author, group=cls.old_group
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    @override_settings(FEED_CACHE_STATS=True)
+    def test_hits_and_misses(self):
+        """Повторный запрос ленты берёт фрагмент из кеша."""
+        # Анонимам отдаётся кеш целой страницы, фрагменты — для своих.
+        self.client.force_login(self.author)
+        url = reverse('posts:group_list', args=['old'])
+        self.client.get(url)
+        self.client.get(url)
+        stats = feed_cache.get_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    def test_stats_off_by_default(self):
+        """Без FEED_CACHE_STATS отрисовка не пишет счётчики в кеш."""
+        self.client.force_login(self.author)
+        self.client.get(reverse('posts:group_list', args=['old']))
+        stats = feed_cache.get_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (0, 0))
+
+    def test_group_rename_invalidates_post_cards(self):
+        """Ссылка на группу с новым slug сразу видна в лентах."""
+        self.client.force_login(self.author)
+        urls = (reverse('posts:index'),
+                reverse('posts:profile', args=['cached']))
+        for url in urls:
+            self.client.get(url)
+        self.old_group.slug = 'renamed'
+        self.old_group.save()
+        self.addCleanup(setattr, self.old_group, 'slug', 'old')
+        for url in urls:
+            self.assertContains(
+                self.client.get(url),
+                reverse('posts:group_list', args=['renamed'])
+            )
+
+    def test_username_change_invalidates_post_cards(self):
+        """Новое имя автора сразу видно в карточках его постов."""
+        self.client.force_login(self.author)
+        self.client.get(reverse('posts:index'))
+        self.author.username = 'renamed'
+        self.author.save()
+        self.addCleanup(setattr, self.author, 'username', 'cached')
+        self.assertContains(
+            self.client.get(reverse('posts:index')),
+            reverse('posts:profile', args=['renamed'])
+        )
+
+    def test_login_does_not_bump_feeds(self):
+        """Сохранение last_login не сдвигает поколения лент."""
+        scope = feed_cache.author_scope(self.author.pk)
+        before = feed_cache.get_generations([scope])[scope]
+        self.author.save(update_fields=['last_login'])
+        self.assertEqual(feed_cache.get_generations([scope])[scope], before)
+
+    def test_group_change_invalidates_both_groups(self):
+        """Перенос поста в другую группу обновляет обе ленты групп."""
+        old_url = reverse('posts:group_list', args=['old'])
+        new_url = reverse('posts:group_list', args=['new'])
+        self.client.get(old_url)
+        self.client.get(new_url)
+        self.post.group = self.new_group
+        self.post.save()
+        self.assertNotContains(self.client.get(old_url), 'Кешируемый пост')
+        self.assertContains(self.client.get(new_url), 'Кешируемый пост')
+
+    def test_comment_invalidates_profile(self):
+        """Комментарий сдвигает поколение ленты автора."""
+        scope = feed_cache.author_scope(self.author.pk)
+        before = feed_cache.get_generations([scope])[scope]
+        Comment.objects.create(post=self.post, author=self.author, text='+')
+        after = feed_cache.get_generations([scope])[scope]
+        self.assertGreater(after, before)
+
+
+class AnonymousPageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='etag')
+        Post.objects.create(text='Первый пост', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_conditional_requests(self):
+        """Повторный запрос с ETag или датой получает 304."""
+        url = reverse('posts:profile', args=['etag'])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Cookie', response['Vary'])
+        # Автор берётся из кеша экземпляров: остаётся дата свежего поста.
+        with self.assertNumQueries(1):
+            not_modified = self.client.get(
+                url, HTTP_IF_NONE_MATCH=response['ETag']
+            )
+        self.assertEqual(not_modified.status_code, 304)
+        not_modified = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_new_post_changes_etag(self):
+        """Новый пост меняет ETag и содержимое закешированной страницы."""
+        url = reverse('posts:index')
+        etag = self.client.get(url)['ETag']
+        Post.objects.create(text='Второй пост', author=self.author)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertContains(response, 'Второй пост')
+
+    def test_authenticated_bypass(self):
+        """Авторизованным страница не кешируется целиком."""
+        self.client.force_login(self.author)
+        response = self.client.get(reverse('posts:index'))
+        self.assertFalse(response.has_header('ETag'))
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class LaggingReplicaFeedTests(TestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.author = User.objects.create_user(username='lagging')
+        # Реплика знает автора, но ещё не получила его новый пост.
+        User.objects.using('replica').create(
+            pk=self.author.pk, username='lagging'
+        )
+        self.post = Post.objects.create(text='Свежий пост', author=self.author)
+
+    def catch_up(self):
+        Post.objects.using('replica').bulk_create([Post(
+            pk=self.post.pk, text=self.post.text, author_id=self.author.pk,
+            pub_date=self.post.pub_date
+        )])
+
+    def test_anonymous_page_filled_from_primary(self):
+        """Кеш страницы не запоминает ленту отстающей реплики."""
+        response = Client().get(reverse('posts:index'))
+        self.assertContains(response, 'Свежий пост')
+
+    def test_fragment_outlives_lag_only_when_fresh(self):
+        """Фрагмент по отстающей реплике живёт только окно отставания."""
+        client = Client()
+        client.force_login(self.author)
+        url = reverse('posts:index')
+        self.assertNotContains(client.get(url), 'Свежий пост')
+        self.catch_up()
+        later = time.time() + get_replica_lag() + 1
+        with mock.patch('time.time', return_value=later):
+            self.assertContains(client.get(url), 'Свежий пост')
@@ -0,0 +1,221 @@
+import os
+import resource
+import shutil
+import tempfile
+import unittest
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.files.storage import FileSystemStorage
+from django.core.management import call_command
+from django.core.files.uploadedfile import (
+    SimpleUploadedFile, TemporaryUploadedFile
+)
+from django.test import SimpleTestCase, TestCase, override_settings
+from PIL import Image
+
+from core.storage import is_hashed_name
+from posts.forms import PostForm
+from posts.images import ingest
+from posts.models import Post
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def upload(image, name='photo.jpg', image_format='JPEG', **options):
+    buffer = BytesIO()
+    image.save(buffer, image_format, **options)
+    return SimpleUploadedFile(name, buffer.getvalue(), 'image/jpeg')
+
+
+class IngestTests(SimpleTestCase):
+    @override_settings(POSTS_IMAGE_MAX_PIXELS=100)
+    def test_rejects_too_many_pixels(self):
+        """Картинку больше предела по пикселям форма не принимает."""
+        form = PostForm(
+            {'text': 'Бомба'},
+            {'image': upload(Image.new('RGB', (20, 20)))}
+        )
+        self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
+
+    @override_settings(POSTS_IMAGE_MAX_SIDE=500)
+    def test_downscales_and_strips_metadata(self):
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera maker'
+        result = ingest(upload(
+            Image.new('RGB', (3000, 1000), 'red'), exif=exif.tobytes()
+        ))
+        image = Image.open(result)
+        self.assertEqual(image.format, 'JPEG')
+        self.assertEqual(max(image.size), 500)
+        self.assertEqual(image.size[0], 500)
+        self.assertNotIn('exif', image.info)
+        self.assertEqual(result.name, 'photo.jpg')
+
+    def test_applies_exif_orientation(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        result = ingest(upload(
+            Image.new('RGB', (300, 100)), exif=exif.tobytes()
+        ))
+        self.assertEqual(Image.open(result).size, (100, 300))
+
+    def test_palette_gif_becomes_png_with_transparency(self):
+        result = ingest(upload(
+            Image.new('P', (10, 10)), 'small.gif', 'GIF', transparency=0
+        ))
+        image = Image.open(result)
+        self.assertEqual(image.format, 'PNG')
+        self.assertEqual(image.info.get('transparency'), 0)
+        self.assertEqual(result.name, 'small.png')
+
+    def test_palette_png_keeps_transparency(self):
+        icon = Image.new('P', (10, 10), 3)
+        icon.putpalette([0, 0, 0, 255, 0, 0, 0, 255, 0, 0, 0, 255])
+        icon.putpixel((0, 0), 1)
+        image = Image.open(ingest(upload(
+            icon, 'icon.png', 'PNG', transparency=3
+        ))).convert('RGBA')
+        self.assertEqual(image.getpixel((5, 5))[3], 0)
+        self.assertEqual(image.getpixel((0, 0))[3], 255)
+
+    @override_settings(POSTS_IMAGE_MAX_SIDE=100)
+    def test_other_formats_downscaled_to_jpeg(self):
+        """TIFF в CMYK приводится к JPEG без чужого профиля ICC."""
+        result = ingest(upload(
+            Image.new('CMYK', (400, 200)), 'scan.tiff', 'TIFF',
+            icc_profile=b'cmyk profile'
+        ))
+        image = Image.open(result)
+        self.assertEqual(image.format, 'JPEG')
+        self.assertEqual(image.size, (100, 50))
+        self.assertNotIn('icc_profile', image.info)
+        self.assertEqual(result.name, 'scan.jpg')
+
+    def test_rejects_garbage(self):
+        with self.assertRaises(ValidationError):
+            ingest(SimpleUploadedFile('bad.jpg', b'not an image'))
+
+
+def _in_child(function):
+    """Выполняет function в дочернем процессе и возвращает её результат."""
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_end)
+        status = 1
+        try:
+            os.write(write_end, str(function()).encode())
+            status = 0
+        finally:
+            os._exit(status)
+    os.close(write_end)
+    with os.fdopen(read_end) as pipe:
+        result = pipe.read()
+    _, status = os.waitpid(pid, 0)
+    if status != 0:
+        raise AssertionError('Дочерний процесс завершился с ошибкой')
+    return result
+
+
+@unittest.skipUnless(hasattr(os, 'fork'), 'нужен os.fork')
+class IngestMemoryTests(SimpleTestCase):
+    SIZE = (6000, 4000)
+
+    @override_settings(POSTS_IMAGE_MAX_SIDE=1000)
+    def test_peak_rss_stays_below_full_decode(self):
+        """Приём большого JPEG не декодирует его в полном размере."""
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as source:
+            _in_child(lambda: Image.new('RGB', self.SIZE, 'navy').save(
+                source.name, 'JPEG'
+            ))
+
+            def ingest_large():
+                upload = TemporaryUploadedFile(
+                    'large.jpg', 'image/jpeg', 0, None
+                )
+                with open(source.name, 'rb') as file:
+                    upload.write(file.read())
+                before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                result = ingest(upload)
+                after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                assert max(Image.open(result).size) == 1000
+                return after - before
+
+            growth_kb = int(_in_child(ingest_large))
+        # Pillow хранит RGB по 4 байта на пиксель.
+        full_decode_kb = self.SIZE[0] * self.SIZE[1] * 4 // 1024
+        self.assertLess(growth_kb, full_decode_kb // 4)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class MigratePostImagesTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_moves_legacy_files_into_hashed_storage(self):
+        author = User.objects.create_user(username='legacy')
+        legacy = FileSystemStorage()
+        names = [
+            legacy.save(f'posts/{name}.jpg', upload(
+                Image.new('RGB', (10, 10), 'red')
+            ))
+            for name in ('first', 'second')
+        ]
+        posts = [
+            Post.objects.create(text='Старый', author=author, image=name)
+            for name in names
+        ]
+        out = StringIO()
+        call_command('migrate_post_images', stdout=out)
+        self.assertIn('Перенесено картинок: 2', out.getvalue())
+        for post in posts:
+            post.refresh_from_db()
+            self.assertTrue(is_hashed_name(post.image.name))
+            self.assertTrue(post.image.storage.exists(post.image.name))
+        self.assertEqual(posts[0].image.name, posts[1].image.name)
+        self.assertEqual(posts[0].image.storage.refs(posts[0].image.name), 2)
+        for name in names:
+            self.assertFalse(legacy.exists(name))
+        call_command('migrate_post_images', stdout=out)
+        self.assertIn('Перенесено картинок: 0', out.getvalue())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ReleaseImageTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='shared')
+        storage = Post._meta.get_field('image').storage
+        self.posts = [
+            Post.objects.create(
+                text='Общая картинка', author=self.author,
+                image=storage.save('posts/same.jpg', upload(
+                    Image.new('RGB', (10, 10), 'green')
+                ))
+            )
+            for _ in range(2)
+        ]
+        self.name = self.posts[0].image.name
+
+    @mock.patch('posts.thumbnail_cache.forget_source')
+    def test_thumbnails_kept_until_last_reference(self, forget_source):
+        """Миниатюры общей картинки живут, пока на неё ссылается пост."""
+        with mock.patch('posts.signals.transaction.on_commit') as on_commit:
+            self.posts[0].delete()
+        # До коммита ничего не трогаем: транзакцию могут откатить.
+        forget_source.assert_not_called()
+        for call in on_commit.call_args_list:
+            call[0][0]()
+        forget_source.assert_not_called()
+        self.assertTrue(self.posts[1].image.storage.exists(self.name))
+        with mock.patch(
+                'posts.signals.transaction.on_commit', lambda f: f()):
+            self.posts[1].delete()
+        forget_source.assert_called_once_with(self.name)
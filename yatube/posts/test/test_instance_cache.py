@@ -0,0 +1,113 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.instance_cache import clear_local
+from posts import instances
+from posts.models import Group, Post
+from users.backends import CachedModelBackend
+
+User = get_user_model()
+
+
+class InstanceCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='instance')
+        cls.group = Group.objects.create(
+            title='Кеш', slug='cached-group', description='-'
+        )
+        cls.post = Post.objects.create(
+            text='Пост', author=cls.author, group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+        clear_local()
+        self.client = Client()
+
+    def test_repeated_lookup_skips_database(self):
+        instances.groups.get(slug='cached-group')
+        with self.assertNumQueries(0):
+            group = instances.groups.get(slug='cached-group')
+        self.assertEqual(group, self.group)
+        # Локальный уровень отвечает и без общего кеша.
+        cache.clear()
+        with self.assertNumQueries(0):
+            instances.groups.get(slug='cached-group')
+
+    def test_copies_are_independent(self):
+        group = instances.groups.get(slug='cached-group')
+        group.title = 'Правка во вьюхе'
+        self.assertEqual(
+            instances.groups.get(slug='cached-group').title, 'Кеш'
+        )
+
+    def test_save_invalidates_old_and_new_values(self):
+        group = Group.objects.create(title='Было', slug='before')
+        instances.groups.get(slug='before')
+        instances.groups.get(pk=group.pk)
+        group.slug = 'after'
+        group.save()
+        with self.assertRaises(Group.DoesNotExist):
+            instances.groups.get(slug='before')
+        self.assertEqual(instances.groups.get(pk=group.pk).slug, 'after')
+        group.delete()
+        with self.assertRaises(Group.DoesNotExist):
+            instances.groups.get(slug='after')
+
+    def test_group_page_uses_cache(self):
+        url = reverse('posts:group_list', args=['cached-group'])
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            instances.groups.get_or_404(slug='cached-group')
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(
+            self.client.get(
+                reverse('posts:group_list', args=['missing'])
+            ).status_code, 404
+        )
+
+    def test_comment_refreshes_cached_post(self):
+        instances.posts.get(pk=self.post.pk)
+        self.client.force_login(self.author)
+        self.client.post(
+            reverse('posts:add_comment', args=[self.post.pk]),
+            {'text': 'Комментарий'}
+        )
+        self.assertEqual(
+            instances.posts.get(pk=self.post.pk).comments_count,
+            self.post.comments_count + 1
+        )
+
+    def test_auth_backend_caches_user(self):
+        backend = CachedModelBackend()
+        self.assertEqual(backend.get_user(self.author.pk), self.author)
+        with self.assertNumQueries(0):
+            self.assertEqual(backend.get_user(self.author.pk), self.author)
+        self.assertIsNone(backend.get_user(0))
+        inactive = User.objects.create_user(username='gone', is_active=False)
+        self.assertIsNone(backend.get_user(inactive.pk))
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class InstanceCacheReplicaTests(TestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        clear_local()
+
+    def test_fill_reads_primary(self):
+        """Кеш заполняется из основной базы, а не с отстающей реплики."""
+        author = User.objects.create_user(username='renamed')
+        User.objects.using('replica').create(
+            pk=author.pk, username='before-rename'
+        )
+        response = Client().get(reverse('posts:profile', args=['renamed']))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            instances.users.get(pk=author.pk).username, 'renamed'
+        )
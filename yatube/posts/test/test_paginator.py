@@ -0,0 +1,150 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.template import Context, Template
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Post
+from posts.paginators import (
+    ELLIPSIS, CursorPaginator, ElidedPaginator, encode_values
+)
+
+User = get_user_model()
+
+PER_PAGE = 10
+POSTS_COUNT = 35
+BENCH_REPEATS = 20
+MAX_PAGINATOR_LINKS = 17
+
+
+class CursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='cursor')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {count}', author=cls.user)
+            for count in range(POSTS_COUNT)
+        )
+        # Одинаковое время у части постов: порядок держится на id.
+        Post.objects.filter(id__lte=15).update(pub_date=timezone.now())
+        cls.expected = list(
+            Post.objects.order_by('-pub_date', '-id')
+            .values_list('id', flat=True)
+        )
+
+    def test_walk_forward_and_back(self):
+        """Проход курсорами вперёд и назад отдаёт все посты по порядку."""
+        paginator = CursorPaginator(Post.objects.all(), PER_PAGE)
+        page = paginator.get_page()
+        self.assertFalse(page.has_previous())
+        pages = [page]
+        while page.has_next():
+            page = paginator.get_page(after=page.next_cursor)
+            pages.append(page)
+        seen = [post.id for page in pages for post in page]
+        self.assertEqual(seen, self.expected)
+        self.assertEqual(len(pages), 4)
+        back = [post.id for post in pages[-1]]
+        page = pages[-1]
+        while page.has_previous():
+            page = paginator.get_page(before=page.previous_cursor)
+            back = [post.id for post in page] + back
+        self.assertEqual(back, self.expected)
+
+    def test_deep_page_query_count(self):
+        """Страница по курсору — один запрос без COUNT(*)."""
+        paginator = CursorPaginator(Post.objects.all(), PER_PAGE)
+        last = Post.objects.order_by('pub_date', 'id').first()
+        cursor = paginator.encode_cursor(last)
+        with self.assertNumQueries(1):
+            page = paginator.get_page(after=cursor)
+            self.assertEqual(len(page), 0)
+
+    def test_broken_cursor_gives_first_page(self):
+        """Испорченный курсор не ломает страницу."""
+        paginator = CursorPaginator(Post.objects.all(), PER_PAGE)
+        page = paginator.get_page(after='not-a-cursor')
+        self.assertEqual(page[0].id, self.expected[0])
+
+    @override_settings(POSTS_CURSOR_PAGINATION=True)
+    def test_invalid_cursor_values_give_first_page(self):
+        """Курсор с чужими типами или NULL не роняет ленту и комментарии."""
+        post = Post.objects.get(pk=self.expected[0])
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:post_detail', args=[post.pk]),
+        )
+        date = post.pub_date.isoformat()
+        for values in (['garbage', 1], [None, None], ['', 1],
+                       [date, 1e400], [date, 2 ** 64]):
+            cursor = encode_values(values)
+            self.assertIsNone(
+                CursorPaginator(Post.objects.all(), PER_PAGE)
+                .decode_cursor(cursor)
+            )
+            for url in urls:
+                with self.subTest(values=values, url=url):
+                    response = Client().get(url, {'after': cursor})
+                    self.assertEqual(response.status_code, 200)
+
+    @override_settings(POSTS_CURSOR_PAGINATION=True)
+    def test_feed_views_cursor_mode(self):
+        """Ленты переходят в курсорный режим по настройке."""
+        client = Client()
+        client.force_login(self.user)
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': 'cursor'}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = client.get(url)
+                page_obj = response.context['page_obj']
+                self.assertTrue(page_obj.is_cursor)
+                self.assertContains(response, '?after=')
+                response = client.get(url, {'after': page_obj.next_cursor})
+                self.assertEqual(
+                    response.context['page_obj'][0].id,
+                    self.expected[PER_PAGE]
+                )
+
+
+class ElidedPaginatorTests(TestCase):
+    def test_elided_page_range(self):
+        """Окно номеров: края, соседи текущей страницы и пропуски."""
+        paginator = ElidedPaginator(range(1000), PER_PAGE)
+        self.assertEqual(
+            list(paginator.get_elided_page_range(50)),
+            [1, 2, ELLIPSIS, 47, 48, 49, 50, 51, 52, 53, ELLIPSIS, 99, 100]
+        )
+        self.assertEqual(
+            list(paginator.get_elided_page_range(1)),
+            [1, 2, 3, 4, ELLIPSIS, 99, 100]
+        )
+        small = ElidedPaginator(range(50), PER_PAGE)
+        self.assertEqual(list(small.get_elided_page_range(3)), [1, 2, 3, 4, 5])
+
+    def test_render_time_is_flat(self):
+        """Бенчмарк: размер и время отрисовки не растут с числом страниц."""
+        template = Template(
+            '{% include "posts/includes/paginator.html" %}'
+        )
+        results = {}
+        for num_pages in (10, 10 ** 3, 10 ** 5, 10 ** 7):
+            paginator = ElidedPaginator(range(num_pages * PER_PAGE), PER_PAGE)
+            page_obj = paginator.get_page(num_pages // 2)
+            context = Context({'page_obj': page_obj})
+            timings = []
+            for _ in range(BENCH_REPEATS):
+                start = time.perf_counter()
+                html = template.render(context)
+                timings.append(time.perf_counter() - start)
+            results[num_pages] = (min(timings), html.count('<li'))
+        fastest = min(timing for timing, _ in results.values())
+        for num_pages, (timing, links) in results.items():
+            with self.subTest(num_pages=num_pages):
+                self.assertLessEqual(links, MAX_PAGINATOR_LINKS)
+                self.assertLess(timing, fastest * 5 + 0.005)
@@ -0,0 +1,75 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Post
+from posts.views import COMMENTS_LIMIT
+
+User = get_user_model()
+
+
+class PostDetailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='detailed')
+        cls.post = Post.objects.create(
+            text='Подробный пост', author=cls.author
+        )
+        cls.url = reverse('posts:post_detail', args=[cls.post.id])
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def add_comments(self, count):
+        start = Comment.objects.count()
+        for number in range(start, start + count):
+            commenter = User.objects.create_user(username=f'c{number}')
+            Comment.objects.create(
+                post=self.post, author=commenter, text=f'Комментарий {number}'
+            )
+
+    def count_queries(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(self.url)
+        return len(context)
+
+    def test_query_count_does_not_grow_with_comments(self):
+        """Число запросов не зависит от числа комментариев."""
+        self.add_comments(2)
+        # Первый заход заполняет кеши экземпляров.
+        self.count_queries()
+        few = self.count_queries()
+        self.add_comments(COMMENTS_LIMIT)
+        self.assertEqual(self.count_queries(), few)
+
+    def test_comments_are_paginated(self):
+        """Комментарии листаются курсором по дате."""
+        self.add_comments(COMMENTS_LIMIT + 3)
+        response = self.client.get(self.url)
+        comments = response.context['comments']
+        self.assertEqual(len(comments), COMMENTS_LIMIT)
+        self.assertEqual(comments[0].text, 'Комментарий 0')
+        response = self.client.get(self.url, {'after': comments.next_cursor})
+        self.assertEqual(len(response.context['comments']), 3)
+
+    def test_cached_until_comment_added(self):
+        """Страница кешируется, пока не добавлен комментарий."""
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(self.url)
+        self.assertFalse(any(
+            'posts_comment' in query['sql']
+            for query in context.captured_queries
+        ))
+        self.client.post(
+            reverse('posts:add_comment', args=[self.post.id]),
+            {'text': 'Новый комментарий'}
+        )
+        self.assertContains(self.client.get(self.url), 'Новый комментарий')
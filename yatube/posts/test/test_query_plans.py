@@ -0,0 +1,100 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+POSTS_COUNT = 25
+
+# Таблицы приложения posts; служебные таблицы Django не проверяем.
+POSTS_TABLE = re.compile(r'\bposts_\w+')
+# Полный проход по таблице без индекса или сортировка во временном B-дереве.
+FULL_SCAN = re.compile(r'^SCAN (TABLE )?posts_\w+( AS \w+)?$')
+TEMP_SORT = 'USE TEMP B-TREE'
+
+
+class QueryPlanTests(TestCase):
+    """EXPLAIN QUERY PLAN для запросов вьюх posts.views.
+
+    Тест падает, если какой-то запрос к таблицам posts читает таблицу
+    целиком без индекса или сортирует результат во временном B-дереве.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='planner')
+        cls.author = User.objects.create_user(username='planned')
+        cls.group = Group.objects.create(
+            title='Группа', slug='plans', description='Описание'
+        )
+        Follow.objects.create(user=cls.user, author=cls.author)
+        for count in range(POSTS_COUNT):
+            Post.objects.create(
+                text=f'Пост {count}',
+                author=cls.author if count % 2 else cls.user,
+                group=cls.group if count % 3 else None,
+            )
+        cls.post = Post.objects.filter(author=cls.author).first()
+        Comment.objects.create(post=cls.post, author=cls.user, text='Да')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assert_plans_use_indexes(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        for query in context.captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT') or not POSTS_TABLE.search(sql):
+                continue
+            for step in self.explain(sql):
+                with self.subTest(url=url, sql=sql, step=step):
+                    self.assertIsNone(FULL_SCAN.match(step))
+                    self.assertNotIn(TEMP_SORT, step)
+
+    def test_views_use_indexes(self):
+        """Вьюхи posts не сканируют таблицы и не сортируют во временных."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:index') + '?page=2',
+            reverse('posts:group_list', args=[self.group.slug]),
+            reverse('posts:group_list', args=[self.group.slug]) + '?page=2',
+            reverse('posts:profile', args=[self.author.username]),
+            reverse('posts:profile', args=[self.author.username]) + '?page=2',
+            reverse('posts:post_detail', args=[self.post.id]),
+            reverse('posts:follow_index'),
+        )
+        for url in urls:
+            self.assert_plans_use_indexes(url)
+
+    def test_cursor_pages_use_indexes(self):
+        """Курсорные страницы лент тоже идут по индексам."""
+        for name, args in (
+            ('posts:index', []),
+            ('posts:group_list', [self.group.slug]),
+            ('posts:profile', [self.author.username]),
+            ('posts:follow_index', []),
+        ):
+            url = reverse(name, args=args)
+            # Испорченный курсор включает курсорный режим с первой страницы.
+            page_obj = self.client.get(url + '?after=x').context['page_obj']
+            self.assert_plans_use_indexes(
+                f'{url}?after={page_obj.next_cursor}'
+            )
+            self.assert_plans_use_indexes(
+                f'{url}?before={page_obj.next_cursor}'
+            )
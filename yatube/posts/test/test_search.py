@@ -0,0 +1,149 @@
+import base64
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.routers import read_from_replica
+from posts import search
+from posts.models import Post
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='searcher')
+        cls.cats = Post.objects.create(
+            text='Коты спят весь день', author=cls.author
+        )
+        cls.dogs = Post.objects.create(
+            text='Собаки гуляют, коты смотрят', author=cls.author
+        )
+        cls.other = Post.objects.create(
+            text='Про погоду', author=cls.author
+        )
+
+    def setUp(self):
+        self.client = Client()
+
+    def found(self, text, **kwargs):
+        return list(search.SearchPaginator(text, 10).get_page(**kwargs))
+
+    def test_search_finds_matching_posts(self):
+        """Поиск находит посты по словам и префиксу последнего слова."""
+        self.assertEqual(
+            {post.pk for post in self.found('коты')},
+            {self.cats.pk, self.dogs.pk}
+        )
+        self.assertEqual(
+            [post.pk for post in self.found('пого')], [self.other.pk]
+        )
+        self.assertEqual(self.found('коты гуляют'), [self.dogs])
+
+    def test_index_follows_edits_and_deletes(self):
+        """Правка и удаление поста обновляют индекс."""
+        post = Post.objects.get(pk=self.other.pk)
+        post.text = 'Про котов и погоду'
+        post.save()
+        self.assertIn(post, self.found('котов'))
+        post.delete()
+        self.assertEqual(self.found('котов'), [])
+
+    def test_query_operators_are_escaped(self):
+        """Синтаксис FTS5 во вводе не ломает запрос."""
+        for text in ('"коты', 'коты OR', 'NEAR(коты', '*', 'коты -собаки'):
+            self.found(text)
+        self.assertEqual(self.found('   '), [])
+
+    def test_keyset_pages_cover_all_results(self):
+        """Курсоры проходят всю выдачу без пропусков и повторов."""
+        Post.objects.bulk_create([
+            Post(text=f'Кот номер {number}', author=self.author)
+            for number in range(7)
+        ])
+        search.rebuild()
+        paginator = search.SearchPaginator('номер', 3)
+        page = paginator.get_page()
+        seen = list(page)
+        while page.has_next():
+            page = paginator.get_page(after=page.next_cursor)
+            seen.extend(page)
+        self.assertEqual(len(seen), 7)
+        self.assertEqual(len({post.pk for post in seen}), 7)
+        ranks = [post.search_rank for post in seen]
+        self.assertEqual(ranks, sorted(ranks))
+        back = paginator.get_page(before=page.previous_cursor)
+        self.assertEqual(list(back), seen[-len(page) - 3:-len(page)])
+
+    def test_crafted_cursors_give_first_page(self):
+        """Бесконечный ранг и огромный id в курсоре не роняют выдачу."""
+        paginator = search.SearchPaginator('коты', 10)
+        first = list(paginator.get_page())
+        for raw in ('[1e400, 1]', '[0, 1e400]', '[NaN, 1]', '[0, 1e30]',
+                    '[-Infinity, 1]', f'[0, {2 ** 64}]'):
+            cursor = base64.urlsafe_b64encode(raw.encode()).decode()
+            with self.subTest(raw=raw):
+                self.assertEqual(list(paginator.get_page(after=cursor)),
+                                 first)
+
+    def test_search_view(self):
+        """Страница поиска показывает найденные посты."""
+        response = self.client.get(reverse('posts:search'), {'q': 'собаки'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['page_obj']), [self.dogs])
+        self.assertContains(response, 'гуляют')
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {search.FTS_TABLE}')
+        self.assertEqual(self.found('коты'), [])
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('3', out.getvalue())
+        self.assertEqual(len(self.found('коты')), 2)
+
+    def test_admin_search_uses_index(self):
+        admin = User.objects.create_superuser('boss', 'boss@x.ru', 'pass')
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'собаки'}
+        )
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.dogs]
+        )
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class LaggingReplicaSearchTests(TestCase):
+    databases = {'default', 'replica'}
+
+    def test_index_and_posts_from_one_database(self):
+        """Индекс и посты читаются из одной базы: страницы не короче."""
+        author = User.objects.create_user(username='lagging')
+        User.objects.using('replica').create(pk=author.pk, username='lagging')
+        old = Post.objects.create(text='Коты старые', author=author)
+        Post.objects.create(text='Коты новые', author=author)
+        # Реплика получила только первый пост.
+        Post.objects.using('replica').bulk_create([Post(
+            pk=old.pk, text=old.text, author_id=author.pk,
+            pub_date=old.pub_date
+        )])
+        search.index_post(old, 'replica')
+
+        @read_from_replica
+        def pages(request):
+            paginator = search.SearchPaginator('коты', 1)
+            page = paginator.get_page()
+            result = [list(page)]
+            while page.has_next():
+                page = paginator.get_page(after=page.next_cursor)
+                result.append(list(page))
+            return result
+
+        self.assertEqual(pages(None), [[old]])
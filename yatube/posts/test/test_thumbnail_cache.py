@@ -0,0 +1,150 @@
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.images import ImageFile
+
+from posts import thumbnail_cache
+from posts.models import Post, Thumbnail
+from posts.thumbnails import source_file
+from posts.test.test_thumbnails import make_image
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='pruner')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        shutil.rmtree(os.path.join(TEMP_MEDIA_ROOT, 'cache'),
+                      ignore_errors=True)
+        self.old_post = Post.objects.create(
+            text='Старое', author=self.author, image=make_image('old.jpg')
+        )
+        self.new_post = Post.objects.create(
+            text='Новое', author=self.author, image=make_image('new.jpg')
+        )
+        self.old = get_thumbnail(self.old_post.image, '100x100')
+        self.new = get_thumbnail(self.new_post.image, '100x100')
+        Thumbnail.objects.filter(name=self.old.name).update(
+            accessed=timezone.now() - timedelta(days=1)
+        )
+
+    def assertGone(self, thumbnail):
+        name = thumbnail.name
+        self.assertFalse(Thumbnail.objects.filter(name=name).exists())
+        self.assertFalse(os.path.exists(thumbnail.storage.path(name)))
+        self.assertIsNone(default.kvstore.get(ImageFile(name)))
+
+    def test_thumbnails_are_tracked(self):
+        """Созданная миниатюра заводит строку учёта с размером файла."""
+        row = Thumbnail.objects.get(name=self.new.name)
+        self.assertEqual(row.source, self.new_post.image.name)
+        self.assertEqual(row.size, os.path.getsize(self.new.storage.path(
+            self.new.name
+        )))
+
+    def test_access_updates_timestamp(self):
+        cache.clear()
+        get_thumbnail(self.old_post.image, '100x100')
+        row = Thumbnail.objects.get(name=self.old.name)
+        self.assertGreater(row.accessed, timezone.now() - timedelta(hours=1))
+
+    def test_serving_file_updates_timestamp(self):
+        """Отдача миниатюры из закешированной страницы — тоже обращение."""
+        cache.clear()
+        response = self.client.get(settings.MEDIA_URL + self.old.name)
+        self.assertEqual(response.status_code, 200)
+        row = Thumbnail.objects.get(name=self.old.name)
+        self.assertGreater(row.accessed, timezone.now() - timedelta(hours=1))
+
+    def test_prune_evicts_least_recently_used(self):
+        """Сверх предела вытесняется миниатюра, которую читали давно."""
+        size = Thumbnail.objects.get(name=self.new.name).size
+        stats = thumbnail_cache.prune(max_size=size)
+        self.assertEqual(stats['evicted'], 1)
+        self.assertTrue(stats['complete'])
+        self.assertGone(self.old)
+        self.assertTrue(Thumbnail.objects.filter(name=self.new.name).exists())
+        source_key = source_file(self.old_post.image.name).key
+        self.assertIsNone(
+            default.kvstore._get(source_key, identity='thumbnails')
+        )
+        again = get_thumbnail(self.old_post.image, '100x100')
+        self.assertTrue(os.path.exists(again.storage.path(again.name)))
+
+    def test_prune_removes_orphans(self):
+        """Миниатюры картинки, которой нет у постов, удаляются."""
+        Post.objects.filter(pk=self.old_post.pk).update(image='')
+        stats = thumbnail_cache.prune()
+        self.assertEqual(stats['orphans'], 1)
+        self.assertGone(self.old)
+
+    # Миниатюры удаляются после коммита, которого в TestCase нет.
+    @mock.patch('posts.signals.transaction.on_commit', lambda f: f())
+    def test_deleting_post_forgets_thumbnails(self):
+        self.old_post.delete()
+        self.assertGone(self.old)
+
+    @mock.patch('posts.signals.transaction.on_commit', lambda f: f())
+    def test_replacing_image_forgets_thumbnails(self):
+        self.old_post.image = make_image('other.jpg')
+        self.old_post.save()
+        self.assertGone(self.old)
+
+    def test_scan_removes_untracked_files(self):
+        stray = os.path.join(TEMP_MEDIA_ROOT, 'cache', 'ab', 'stray.jpg')
+        os.makedirs(os.path.dirname(stray), exist_ok=True)
+        fresh = os.path.join(TEMP_MEDIA_ROOT, 'cache', 'ab', 'fresh.jpg')
+        for path in (stray, fresh):
+            with open(path, 'wb') as file:
+                file.write(b'x')
+        two_hours_ago = time.time() - 2 * 60 * 60
+        os.utime(stray, (two_hours_ago, two_hours_ago))
+        Thumbnail.objects.filter(name=self.new.name).delete()
+        out = StringIO()
+        call_command('prune_thumbnails', scan=True, stdout=out)
+        self.assertIn('Взято на учёт: 1, удалено лишних файлов: 1',
+                      out.getvalue())
+        self.assertFalse(os.path.exists(stray))
+        # Свежий файл без учёта может быть миниатюрой в работе.
+        self.assertTrue(os.path.exists(fresh))
+        self.assertTrue(Thumbnail.objects.filter(name=self.new.name).exists())
+
+    def test_import_resumes_after_deadline(self):
+        """Импорт ключей sorl идёт пачками и продолжается с курсора."""
+        Thumbnail.objects.all().delete()
+        ticks = iter([0, 10])
+        with mock.patch('posts.thumbnail_cache.time.monotonic',
+                        lambda: next(ticks)):
+            self.assertEqual(
+                thumbnail_cache.import_kvstore(deadline=5, batch_size=1), 1
+            )
+        self.assertEqual(Thumbnail.objects.count(), 1)
+        self.assertEqual(
+            thumbnail_cache.import_kvstore(time.monotonic() + 60), 1
+        )
+        self.assertEqual(Thumbnail.objects.count(), 2)
+        self.assertEqual(cache.get(thumbnail_cache.IMPORT_CURSOR_KEY), '')
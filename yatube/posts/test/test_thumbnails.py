@@ -0,0 +1,181 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.template import Context, Template
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from sorl.thumbnail import get_thumbnail
+
+from posts import thumbnails
+from posts.models import Post
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def make_image(name='photo.jpg', size=(1200, 800)):
+    # Цвет зависит от имени: одинаковое содержимое хранилище склеит.
+    color = tuple(hashlib.md5(name.encode()).digest()[:3])
+    buffer = BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(), 'image/jpeg')
+
+
+def run_now(callback):
+    callback()
+
+
+def files_per_image():
+    # У картинки 1200px в srcset две ширины: 480 и 960.
+    return 2 * len(thumbnails.supported_formats())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POSTS_THUMBNAIL_WORKERS=0)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='photographer')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.author)
+        shutil.rmtree(os.path.join(TEMP_MEDIA_ROOT, 'cache'),
+                      ignore_errors=True)
+
+    def cache_files(self):
+        found = []
+        for root, _, files in os.walk(os.path.join(TEMP_MEDIA_ROOT, 'cache')):
+            found.extend(os.path.join(root, name) for name in files)
+        return found
+
+    def test_generated_thumbnail_is_reused_by_template_lookup(self):
+        """Шаблонный тег находит заранее созданные миниатюры."""
+        post = Post.objects.create(
+            text='Фото', author=self.author, image=make_image()
+        )
+        thumbnails.generate(post.image.name)
+        files = self.cache_files()
+        self.assertEqual(len(files), files_per_image())
+        geometry, options = thumbnails.THUMBNAIL_SIZES[0]
+        with mock.patch('sorl.thumbnail.engines.pil_engine.Engine.'
+                        'get_image') as get_image:
+            im = get_thumbnail(post.image, geometry, **options)
+        get_image.assert_not_called()
+        self.assertIn(im.url.rsplit('/', 1)[1],
+                      [os.path.basename(path) for path in files])
+
+    def test_responsive_tag_negotiates_format(self):
+        """Тег отдаёт srcset, lazy-загрузку и WebP тем, кто его принимает."""
+        post = Post.objects.create(
+            text='Фото', author=self.author, image=make_image()
+        )
+        template = Template(
+            '{% load responsive_images %}'
+            '{% responsive_thumbnail post.image "960x339" crop="center" %}'
+        )
+        factory = RequestFactory()
+        html = template.render(Context({
+            'post': post,
+            'request': factory.get('/', HTTP_ACCEPT='image/webp,*/*'),
+        }))
+        self.assertIn('loading="lazy"', html)
+        self.assertIn(' 480w, ', html)
+        self.assertIn(' 960w"', html)
+        self.assertNotIn('1440w', html)
+        if 'WEBP' in thumbnails.supported_formats():
+            self.assertIn('.webp', html)
+        html = template.render(Context({
+            'post': post, 'request': factory.get('/', HTTP_ACCEPT='*/*'),
+        }))
+        self.assertIn('.jpg 960w', html)
+        self.assertNotIn('.webp', html)
+
+    def test_refused_format_is_not_negotiated(self):
+        """Тип с q=0 в Accept клиент не принимает."""
+        factory = RequestFactory()
+        request = factory.get('/', HTTP_ACCEPT='image/webp;q=0,*/*')
+        self.assertEqual(thumbnails.negotiate_format(request), 'JPEG')
+        if 'WEBP' in thumbnails.supported_formats():
+            request = factory.get('/', HTTP_ACCEPT='image/webp;q=0.9,*/*')
+            self.assertEqual(thumbnails.negotiate_format(request), 'WEBP')
+
+    def test_upload_schedules_generation(self):
+        """Новая картинка из формы получает миниатюры после коммита."""
+        with mock.patch('posts.thumbnails.transaction.on_commit', run_now):
+            self.client.post(
+                reverse('posts:create'),
+                {'text': 'С картинкой', 'image': make_image()}
+            )
+        post = Post.objects.get(text='С картинкой')
+        self.assertTrue(post.image)
+        self.assertEqual(len(self.cache_files()), files_per_image())
+
+    def test_backfill_command_resumes(self):
+        """Прерванный запуск продолжается после сохранённого поста."""
+        posts = [
+            Post.objects.create(
+                text=f'Пост {number}', author=self.author,
+                image=make_image(f'photo{number}.jpg')
+            )
+            for number in range(3)
+        ]
+        state_file = os.path.join(TEMP_MEDIA_ROOT, 'backfill.json')
+        with open(state_file, 'w') as state:
+            state.write(f'{{"last_id": {posts[0].pk}}}')
+        out = StringIO()
+        call_command(
+            'generate_thumbnails', workers=0, batch_size=1,
+            state_file=state_file, stdout=out
+        )
+        self.assertIn('Продолжаем', out.getvalue())
+        self.assertIn('3/3', out.getvalue())
+        self.assertEqual(len(self.cache_files()), 2 * files_per_image())
+        call_command(
+            'generate_thumbnails', workers=0, restart=True,
+            state_file=state_file, stdout=StringIO()
+        )
+        self.assertEqual(len(self.cache_files()), 3 * files_per_image())
+
+    def test_backfill_command_logs_and_retries_failures(self):
+        """Ошибки пишутся в лог, а следующий запуск повторяет эти посты."""
+        post = Post.objects.create(
+            text='Битая', author=self.author, image=make_image('broken.jpg')
+        )
+        state_file = os.path.join(TEMP_MEDIA_ROOT, 'state.json')
+        out = StringIO()
+        logger = 'posts.management.commands.generate_thumbnails'
+        with mock.patch('posts.thumbnails.generate',
+                        side_effect=OSError('битый файл')):
+            with self.assertLogs(logger, 'ERROR') as logs:
+                call_command(
+                    'generate_thumbnails', workers=0, restart=True,
+                    state_file=state_file, stdout=out
+                )
+        self.assertIn(post.image.name, logs.output[0])
+        self.assertIn('битый файл', logs.output[0])
+        self.assertIn('ошибок: 1', out.getvalue())
+        out = StringIO()
+        call_command(
+            'generate_thumbnails', workers=0, state_file=state_file,
+            stdout=out
+        )
+        self.assertIn('Повторно: 1 постов, ошибок: 0', out.getvalue())
+        self.assertEqual(len(self.cache_files()), files_per_image())
+        with open(state_file) as state:
+            self.assertEqual(json.load(state)['failed'], [])
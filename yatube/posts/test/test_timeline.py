@@ -0,0 +1,96 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Follow, Post, TimelineEntry
+
+User = get_user_model()
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='writer')
+        cls.old_post = Post.objects.create(
+            text='Пост до подписки', author=cls.author
+        )
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def timeline_ids(self):
+        return list(
+            TimelineEntry.objects.filter(user=self.reader)
+            .values_list('post_id', flat=True)
+        )
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """Подписка добавляет посты автора в ленту, отписка убирает."""
+        self.client.get(
+            reverse('posts:profile_follow', args=[self.author.username])
+        )
+        self.assertEqual(self.timeline_ids(), [self.old_post.id])
+        self.client.get(
+            reverse('posts:profile_unfollow', args=[self.author.username])
+        )
+        self.assertEqual(self.timeline_ids(), [])
+
+    def test_post_create_fans_out(self):
+        """Новый пост попадает в ленты подписчиков и в follow_index."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.author_client.post(
+            reverse('posts:create'), {'text': 'Свежий пост'}
+        )
+        new_post = Post.objects.get(text='Свежий пост')
+        self.assertEqual(
+            self.timeline_ids(), [new_post.id, self.old_post.id]
+        )
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(response.context['page_obj'][0], new_post)
+
+    @override_settings(TIMELINE_MAX_SIZE=3)
+    def test_timeline_is_capped(self):
+        """Лента обрезается до TIMELINE_MAX_SIZE командой по cron."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        posts = [
+            Post.objects.create(text=f'Пост {count}', author=self.author)
+            for count in range(5)
+        ]
+        out = StringIO()
+        call_command('rebuild_timelines', trim=True, stdout=out)
+        self.assertIn('Обрезано лент: 1', out.getvalue())
+        expected = [post.id for post in reversed(posts[-3:])]
+        self.assertEqual(self.timeline_ids(), expected)
+
+    def test_fan_out_queries_do_not_grow_with_followers(self):
+        """Публикация не делает запросов на каждого подписчика."""
+        def fan_out_queries():
+            with CaptureQueriesContext(connection) as queries:
+                Post.objects.create(text='Пост', author=self.author)
+            return len(queries)
+
+        Follow.objects.create(user=self.reader, author=self.author)
+        with_one = fan_out_queries()
+        for number in range(5):
+            Follow.objects.create(
+                user=User.objects.create_user(username=f'fan{number}'),
+                author=self.author
+            )
+        self.assertEqual(fan_out_queries(), with_one)
+
+    def test_rebuild_command(self):
+        """Команда rebuild_timelines восстанавливает ленту."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timelines', 'reader', stdout=StringIO())
+        self.assertEqual(self.timeline_ids(), [self.old_post.id])
@@ -79,6 +79,7 @@ class PostsViewsTests(TestCase):
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
     def setUp(self):
+        cache.clear()
         self.authorized_client = Client()
         self.authorized_client_author = Client()
         self.authorized_client.force_login(self.user)
@@ -177,11 +178,21 @@ class PostsViewsTests(TestCase):
     def test_cache_index(self):
         """Тестируем кеш index.html-9."""
         response_1 = self.authorized_client.get(reverse('posts:index'))
+        # Правка в обход сигналов не видна, пока фрагмент в кеше.
+        Post.objects.filter(pk=self.post.pk).update(text='Правка мимо кеша')
         response_2 = self.authorized_client.get(reverse('posts:index'))
         self.assertEqual(response_1.content, response_2.content)
         cache.clear()
         response_2 = self.authorized_client.get(reverse('posts:index'))
         self.assertNotEqual(response_1.content, response_2.content)
+        self.assertContains(response_2, 'Правка мимо кеша')
+
+    def test_cache_index_invalidated_by_new_post(self):
+        """Новый пост сразу виден: сигнал сдвигает поколение ленты."""
+        self.authorized_client.get(reverse('posts:index'))
+        Post.objects.create(text='Только что написан', author=self.user)
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Только что написан')
 
 
 class PostsPaginatorViewsTests(TestCase):
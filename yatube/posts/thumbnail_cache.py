@@ -0,0 +1,288 @@
+# posts/thumbnail_cache.py
+"""LRU-кеш миниатюр sorl с ограничением размера на диске.
+
+KVStore ведёт учёт миниатюр в модели Thumbnail: при создании
+записывает размер файла, при чтении из шаблона и при отдаче файла
+(core.media) — время обращения (не чаще раза в ACCESS_RESOLUTION
+секунд на файл). prune() вытесняет давно не
+читанные миниатюры, пока кеш не уложится в THUMBNAIL_CACHE_MAX_SIZE,
+и удаляет сироты — миниатюры картинок, которых уже нет у постов.
+Каждое удаление убирает и файл, и ключи sorl, поэтому шаблон
+не получит ссылку на удалённый файл, а просто создаст миниатюру заново.
+"""
+import hashlib
+import os
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+from django.utils import timezone
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.kvstores.base import add_prefix, del_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import (
+    KVStore as CachedDBKVStore
+)
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from .models import Post, Thumbnail
+from .thumbnails import source_file
+
+THUMBNAIL_CACHE_MAX_SIZE = 1024 ** 3
+ACCESS_RESOLUTION = 60 * 60
+# Файл миниатюры пишется раньше строки Thumbnail: свежие файлы без
+# учёта могут быть ещё в работе.
+UNTRACKED_GRACE = 60 * 60
+TOUCH_KEY = 'thumbnail:touched:{}'
+SWEEP_CURSOR_KEY = 'thumbnail:sweep:cursor'
+IMPORT_CURSOR_KEY = 'thumbnail:import:cursor'
+
+
+def get_max_size():
+    return getattr(
+        settings, 'THUMBNAIL_CACHE_MAX_SIZE', THUMBNAIL_CACHE_MAX_SIZE
+    )
+
+
+def is_thumbnail(name):
+    return name.startswith(thumbnail_settings.THUMBNAIL_PREFIX)
+
+
+def register(image_file, source_name, accessed=None):
+    """Заводит или обновляет строку учёта миниатюры."""
+    try:
+        size = image_file.storage.size(image_file.name)
+    except (OSError, NotImplementedError):
+        size = 0
+    Thumbnail.objects.update_or_create(
+        name=image_file.name,
+        defaults={
+            'key': image_file.key,
+            'source': source_name,
+            'size': size,
+            'accessed': accessed or timezone.now(),
+        }
+    )
+
+
+def touch(name):
+    digest = hashlib.md5(name.encode()).hexdigest()
+    if cache.add(TOUCH_KEY.format(digest), 1, ACCESS_RESOLUTION):
+        Thumbnail.objects.filter(name=name).update(accessed=timezone.now())
+
+
+class KVStore(CachedDBKVStore):
+    """KV-хранилище sorl с учётом миниатюр в модели Thumbnail."""
+
+    def get(self, image_file):
+        value = super().get(image_file)
+        if value is not None and is_thumbnail(image_file.name):
+            touch(image_file.name)
+        return value
+
+    def set(self, image_file, source=None):
+        super().set(image_file, source)
+        if source is not None:
+            register(image_file, source.name)
+
+    def delete(self, image_file, delete_thumbnails=True):
+        super().delete(image_file, delete_thumbnails)
+        Thumbnail.objects.filter(name=image_file.name).delete()
+        if delete_thumbnails:
+            Thumbnail.objects.filter(source=image_file.name).delete()
+
+
+def evict(thumbnails):
+    """Удаляет миниатюры: файлы, ключи sorl и строки учёта."""
+    kvstore = default.kvstore
+    keys_by_source = defaultdict(set)
+    for thumbnail in thumbnails:
+        kvstore._delete(thumbnail.key)
+        keys_by_source[thumbnail.source].add(thumbnail.key)
+        default.storage.delete(thumbnail.name)
+    for source, keys in keys_by_source.items():
+        source_key = source_file(source).key
+        listed = kvstore._get(source_key, identity='thumbnails') or []
+        remaining = [key for key in listed if key not in keys]
+        if remaining:
+            kvstore._set(source_key, remaining, identity='thumbnails')
+        else:
+            kvstore._delete(source_key, identity='thumbnails')
+    Thumbnail.objects.filter(
+        pk__in=[thumbnail.pk for thumbnail in thumbnails]
+    ).delete()
+
+
+def forget_source(name):
+    """Убирает все миниатюры картинки, которую удалили или заменили."""
+    evict(list(Thumbnail.objects.filter(source=name)))
+    default.kvstore.delete(source_file(name))
+
+
+def _evict_lru(max_size, deadline, batch_size, stats):
+    total = Thumbnail.objects.aggregate(total=Sum('size'))['total'] or 0
+    while total > max_size and time.monotonic() < deadline:
+        batch = []
+        for thumbnail in Thumbnail.objects.order_by('accessed', 'pk')[
+                :batch_size]:
+            if total <= max_size:
+                break
+            batch.append(thumbnail)
+            total -= thumbnail.size
+        if not batch:
+            break
+        evict(batch)
+        stats['evicted'] += len(batch)
+        stats['freed'] += sum(thumbnail.size for thumbnail in batch)
+    return total
+
+
+def _sweep_orphans(deadline, batch_size, stats):
+    # Проход по всей таблице может не уложиться в один запуск:
+    # курсор сохраняется, следующий запуск продолжит с него.
+    cursor = cache.get(SWEEP_CURSOR_KEY, 0)
+    while time.monotonic() < deadline:
+        batch = list(
+            Thumbnail.objects.filter(pk__gt=cursor).order_by('pk')[
+                :batch_size]
+        )
+        if not batch:
+            cursor = 0
+            break
+        sources = {thumbnail.source for thumbnail in batch}
+        alive = set(
+            Post.objects.filter(image__in=sources)
+            .values_list('image', flat=True)
+        )
+        orphans = [
+            thumbnail for thumbnail in batch if thumbnail.source not in alive
+        ]
+        evict(orphans)
+        stats['orphans'] += len(orphans)
+        stats['freed'] += sum(thumbnail.size for thumbnail in orphans)
+        cursor = batch[-1].pk
+    cache.set(SWEEP_CURSOR_KEY, cursor, None)
+
+
+def prune(max_size=None, time_limit=60, batch_size=500):
+    """Укладывает кеш в max_size байт и удаляет сироты.
+
+    Работает не дольше time_limit секунд; сначала вытесняются самые
+    давно читанные миниатюры, оставшееся время уходит на поиск сирот.
+    """
+    if max_size is None:
+        max_size = get_max_size()
+    deadline = time.monotonic() + time_limit
+    stats = {'evicted': 0, 'orphans': 0, 'freed': 0}
+    _evict_lru(max_size, deadline, batch_size, stats)
+    _sweep_orphans(deadline, batch_size, stats)
+    total = Thumbnail.objects.aggregate(total=Sum('size'))['total'] or 0
+    stats['total'] = total
+    stats['complete'] = total <= max_size and time.monotonic() < deadline
+    return stats
+
+
+def _import_source(kvstore, source_key):
+    source = kvstore._get(source_key)
+    if source is None:
+        return 0
+    thumbnails = [
+        thumbnail for thumbnail in (
+            kvstore._get(key)
+            for key in kvstore._get(source_key, identity='thumbnails') or []
+        )
+        if thumbnail is not None
+    ]
+    tracked = set(
+        Thumbnail.objects.filter(
+            name__in=[thumbnail.name for thumbnail in thumbnails]
+        ).values_list('name', flat=True)
+    )
+    imported = 0
+    for thumbnail in thumbnails:
+        if thumbnail.name in tracked:
+            continue
+        try:
+            accessed = thumbnail.storage.get_modified_time(thumbnail.name)
+        except (OSError, NotImplementedError):
+            accessed = None
+        register(thumbnail, source.name, accessed)
+        imported += 1
+    return imported
+
+
+def import_kvstore(deadline, batch_size=500):
+    """Заводит учёт для миниатюр, созданных до появления Thumbnail.
+
+    Ключи sorl читаются пачками по порядку; не уложившись в deadline,
+    сохраняет курсор, и следующий запуск продолжит с него.
+    """
+    kvstore = default.kvstore
+    prefix = add_prefix('', identity='thumbnails')
+    cursor = cache.get(IMPORT_CURSOR_KEY, '')
+    imported = 0
+    while time.monotonic() < deadline:
+        raw_keys = list(
+            KVStoreModel.objects.filter(
+                key__startswith=prefix, key__gt=cursor
+            ).order_by('key').values_list('key', flat=True)[:batch_size]
+        )
+        if not raw_keys:
+            cursor = ''
+            break
+        for raw_key in raw_keys:
+            imported += _import_source(kvstore, del_prefix(raw_key))
+        cursor = raw_keys[-1]
+    cache.set(IMPORT_CURSOR_KEY, cursor, None)
+    return imported
+
+
+def _remove_older_than(path, cutoff):
+    try:
+        if os.path.getmtime(path) > cutoff:
+            return False
+        os.remove(path)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def remove_untracked(deadline, batch_size=500):
+    """Удаляет файлы каталога миниатюр, о которых sorl не знает.
+
+    Файлы моложе THUMBNAIL_UNTRACKED_GRACE секунд не трогает.
+    """
+    root = default.storage.path(thumbnail_settings.THUMBNAIL_PREFIX)
+    removed = 0
+    grace = getattr(settings, 'THUMBNAIL_UNTRACKED_GRACE', UNTRACKED_GRACE)
+    cutoff = time.time() - grace
+
+    def flush(paths):
+        location = default.storage.location
+        names = {
+            os.path.relpath(path, location).replace(os.sep, '/'): path
+            for path in paths
+        }
+        tracked = set(
+            Thumbnail.objects.filter(name__in=list(names))
+            .values_list('name', flat=True)
+        )
+        return sum(
+            _remove_older_than(path, cutoff)
+            for name, path in names.items() if name not in tracked
+        )
+
+    paths = []
+    for directory, _, files in os.walk(root):
+        for filename in files:
+            paths.append(os.path.join(directory, filename))
+            if len(paths) >= batch_size:
+                removed += flush(paths)
+                paths = []
+                if time.monotonic() >= deadline:
+                    return removed
+    if paths:
+        removed += flush(paths)
+    return removed
@@ -0,0 +1,149 @@
+# posts/thumbnails.py
+"""Генерация миниатюр постов заранее, а не при первом показе.
+
+THUMBNAIL_SIZES повторяет вызовы {% responsive_thumbnail %} в шаблонах:
+ключ sorl строится из имени файла и опций, поэтому миниатюры, сделанные
+здесь, шаблон находит в KV-хранилище и не декодирует исходник сам.
+Для каждого размера создаются все ширины srcset (RESPONSIVE_SCALES)
+во всех форматах, которые может отдать сервер (JPEG, WebP, AVIF).
+После загрузки картинки генерация уходит в пул потоков
+(POSTS_THUMBNAIL_WORKERS, 0 — прямо в запросе); уже существующие
+картинки догоняет команда generate_thumbnails.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from PIL import Image
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import EXTENSIONS
+from sorl.thumbnail.images import ImageFile
+
+from core.compression import accepted_values
+
+from .models import Post
+
+THUMBNAIL_WORKERS = 2
+THUMBNAIL_SIZES = (
+    ('960x339', {'crop': 'center', 'upscale': True}),
+)
+# Ширины srcset относительно ширины из геометрии.
+RESPONSIVE_SCALES = (0.5, 1, 1.5, 2)
+DEFAULT_FORMAT = 'JPEG'
+# Форматы в порядке предпочтения и их MIME-типы для заголовка Accept.
+MODERN_FORMATS = (
+    ('AVIF', 'image/avif'),
+    ('WEBP', 'image/webp'),
+)
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def get_workers():
+    return getattr(settings, 'POSTS_THUMBNAIL_WORKERS', THUMBNAIL_WORKERS)
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=get_workers(), thread_name_prefix='thumbnails'
+        )
+    return _executor
+
+
+def source_file(name):
+    """Картинка поста по имени, в том же хранилище, что и у поля image.
+
+    Ключи sorl зависят от хранилища исходника: миниатюры, созданные
+    по голому имени, шаблон с post.image бы не нашёл.
+    """
+    return ImageFile(name, Post._meta.get_field('image').storage)
+
+
+def supported_formats():
+    """Форматы, которые умеет сохранять установленный Pillow."""
+    Image.init()
+    formats = [DEFAULT_FORMAT]
+    for image_format, _ in MODERN_FORMATS:
+        if image_format in Image.SAVE:
+            # В sorl 12.6 нет расширения для AVIF.
+            EXTENSIONS.setdefault(image_format, image_format.lower())
+            formats.append(image_format)
+    return formats
+
+
+def negotiate_format(request):
+    """Лучший формат миниатюр, который принимает клиент."""
+    if not hasattr(request, '_thumbnail_format'):
+        # Только явно названные типы с q > 0: */* браузеры шлют всегда.
+        accepted = accepted_values(request.META.get('HTTP_ACCEPT', ''))
+        supported = supported_formats()
+        request._thumbnail_format = next(
+            (
+                image_format for image_format, mime in MODERN_FORMATS
+                if mime in accepted and image_format in supported
+            ),
+            DEFAULT_FORMAT
+        )
+    return request._thumbnail_format
+
+
+def responsive_set(image, geometry, image_format=DEFAULT_FORMAT, **options):
+    """Базовая миниатюра и пары (ширина, миниатюра) для srcset.
+
+    Ширины крупнее базовой берутся, только если исходник не уже их:
+    растягивать картинку ради экранов с высокой плотностью незачем.
+    """
+    width, height = (int(value) for value in geometry.split('x'))
+    options = dict(options, format=image_format)
+    base = get_thumbnail(image, geometry, **options)
+    source = default.kvstore.get(ImageFile(image))
+    source_width = source.width if source is not None else 0
+    variants = []
+    for scale in RESPONSIVE_SCALES:
+        scaled_width = round(width * scale)
+        if scale == 1:
+            variants.append((width, base))
+        elif scale < 1 or scaled_width <= source_width:
+            scaled = f'{scaled_width}x{round(height * scale)}'
+            variants.append(
+                (scaled_width, get_thumbnail(image, scaled, **options))
+            )
+    return base, variants
+
+
+def generate(name):
+    """Создаёт все размеры и форматы миниатюр картинки name."""
+    image = source_file(name)
+    for geometry, options in THUMBNAIL_SIZES:
+        for image_format in supported_formats():
+            responsive_set(image, geometry, image_format, **options)
+
+
+def _generate_in_worker(name):
+    # Поток пула живёт дольше запроса: соединение с базой для KV-хранилища
+    # sorl он открывает сам и сам же закрывает.
+    close_old_connections()
+    try:
+        generate(name)
+    except Exception:
+        logger.exception('Не удалось создать миниатюры для %s', name)
+    finally:
+        close_old_connections()
+
+
+def schedule(post):
+    """Ставит генерацию миниатюр поста в очередь после коммита."""
+    if not post.image:
+        return
+    name = post.image.name
+    if get_workers() == 0:
+        transaction.on_commit(lambda: generate(name))
+    else:
+        transaction.on_commit(
+            lambda: get_executor().submit(_generate_in_worker, name)
+        )
@@ -0,0 +1,115 @@
+# posts/timeline.py
+"""Материализованная лента подписок (fan-out on write).
+
+Новый пост сразу раскладывается в ленты подписчиков автора,
+поэтому follow_index читает один диапазон TimelineEntry по индексу
+вместо соединения Post -> Follow. Лента каждого пользователя
+ограничена TIMELINE_MAX_SIZE записями: при подписке сразу, а после
+новых постов — пакетно, командой rebuild_timelines --trim по cron,
+чтобы публикация не удаляла записи у каждого подписчика.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+
+from .models import Follow, Post, TimelineEntry
+
+TIMELINE_MAX_SIZE = 1000
+BULK_BATCH_SIZE = 500
+
+
+def get_max_size():
+    return getattr(settings, 'TIMELINE_MAX_SIZE', TIMELINE_MAX_SIZE)
+
+
+def _entries(user_id, posts):
+    return [
+        TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        for post_id, pub_date in posts
+    ]
+
+
+def trim(user_id):
+    """Удаляет из ленты всё, что старше get_max_size() последних записей."""
+    max_size = get_max_size()
+    cutoff = (
+        TimelineEntry.objects.filter(user_id=user_id)
+        .order_by('-pub_date', '-post_id')
+        .values_list('pub_date', 'post_id')[max_size:max_size + 1]
+    )
+    cutoff = list(cutoff)
+    if not cutoff:
+        return
+    pub_date, post_id = cutoff[0]
+    TimelineEntry.objects.filter(
+        Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, post_id__lte=post_id),
+        user_id=user_id,
+    ).delete()
+
+
+@transaction.atomic
+def fan_out(post):
+    """Раскладывает новый пост в ленты всех подписчиков автора."""
+    followers = list(
+        Follow.objects.filter(author_id=post.author_id)
+        .values_list('user_id', flat=True)
+    )
+    entries = [
+        TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+        for user_id in followers
+    ]
+    TimelineEntry.objects.bulk_create(
+        entries, batch_size=BULK_BATCH_SIZE, ignore_conflicts=True
+    )
+
+
+def trim_all():
+    """Обрезает все ленты длиннее предела; возвращает их число."""
+    over_limit = (
+        TimelineEntry.objects.order_by()
+        .values('user_id')
+        .annotate(total=Count('id'))
+        .filter(total__gt=get_max_size())
+        .values_list('user_id', flat=True)
+    )
+    user_ids = list(over_limit)
+    for user_id in user_ids:
+        trim(user_id)
+    return len(user_ids)
+
+
+@transaction.atomic
+def backfill(user_id, author_id):
+    """Добавляет в ленту последние посты автора после подписки."""
+    posts = (
+        Post.objects.filter(author_id=author_id)
+        .order_by('-pub_date', '-id')
+        .values_list('id', 'pub_date')[:get_max_size()]
+    )
+    TimelineEntry.objects.bulk_create(
+        _entries(user_id, posts),
+        batch_size=BULK_BATCH_SIZE,
+        ignore_conflicts=True
+    )
+    trim(user_id)
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты посты автора после отписки."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+@transaction.atomic
+def rebuild(user_id):
+    """Собирает ленту пользователя заново по его подпискам."""
+    TimelineEntry.objects.filter(user_id=user_id).delete()
+    posts = (
+        Post.objects.filter(author__following__user_id=user_id)
+        .order_by('-pub_date', '-id')
+        .values_list('id', 'pub_date')[:get_max_size()]
+    )
+    TimelineEntry.objects.bulk_create(
+        _entries(user_id, posts), batch_size=BULK_BATCH_SIZE
+    )
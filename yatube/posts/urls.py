@@ -1,7 +1,5 @@
-from django.urls import include, path
+from django.urls import path
 
-from django.conf import settings
-from django.conf.urls.static import static
 
 from . import views
 
@@ -15,6 +13,7 @@ urlpatterns = [
     path('create/', views.post_create, name='create'),
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
     path('', views.index, name='index'),
+    path('search/', views.search, name='search'),
     path('profile/<str:username>/', views.profile, name='profile'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
     path(
@@ -33,10 +32,4 @@ urlpatterns = [
         views.profile_unfollow,
         name='profile_unfollow'
     ),
-    path('__debug__/', include('debug_toolbar.urls')),
 ]
-
-if settings.DEBUG:
-    urlpatterns += static(
-        settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
-    )
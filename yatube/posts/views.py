@@ -1,9 +1,18 @@
-from django.core.paginator import Paginator
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
 from django.shortcuts import render, get_object_or_404, redirect
+from django.utils.functional import SimpleLazyObject
+from django.views.decorators.vary import vary_on_headers
 
-from .models import Follow, Post, Group, User
+from core.db import retry_on_locked
+from core.routers import read_from_replica, stick_to_primary
+
+from .models import Follow, Post, Group, TimelineEntry, User
+from . import counters, feed_cache, instances, thumbnails
+from .search import SearchPaginator
 from .forms import PostForm, CommentForm
+from .page_cache import cache_anonymous_feed
+from .paginators import CursorPaginator, paginate
 
 from django.contrib.auth import get_user_model
 
@@ -12,44 +21,75 @@ User = get_user_model()
 
 
 POST_LIST_LIMIT = 10
+COMMENTS_LIMIT = 20
+
+
+def _index_feed():
+    return [feed_cache.GLOBAL_SCOPE], Post.objects.all()
+
+
+def _group_feed(slug):
+    try:
+        group = instances.groups.get(slug=slug)
+    except Group.DoesNotExist:
+        return None
+    return (
+        [feed_cache.group_scope(group.pk)],
+        Post.objects.filter(group_id=group.pk),
+    )
+
 
+def _profile_feed(username):
+    try:
+        author = instances.users.get(username=username)
+    except User.DoesNotExist:
+        return None
+    return (
+        [feed_cache.author_scope(author.pk)],
+        Post.objects.filter(author_id=author.pk),
+    )
 
+
+@vary_on_headers('Accept')
+@read_from_replica
+@cache_anonymous_feed(_index_feed)
 def index(request):
     title = 'Последние обновления на сайте'
     post_list = Post.objects.select_related('group', 'author')
-    paginator = Paginator(post_list, POST_LIST_LIMIT)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginate(request, post_list, POST_LIST_LIMIT)
     context = {
         'page_obj': page_obj,
         'title': title,
+        'feed_scopes': [feed_cache.GLOBAL_SCOPE],
     }
     return render(request, 'posts/index.html', context)
 
 
+@vary_on_headers('Accept')
+@read_from_replica
+@cache_anonymous_feed(_group_feed)
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
+    group = instances.groups.get_or_404(slug=slug)
     title = 'Записи сообщества'
-    post_list = group.posts.select_related()
-    paginator = Paginator(post_list, POST_LIST_LIMIT)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = group.posts.select_related('author', 'group')
+    page_obj = paginate(request, post_list, POST_LIST_LIMIT)
     context = {
         'group': group,
-        'page_number': page_number,
         'page_obj': page_obj,
         'title': title,
+        'feed_scopes': [feed_cache.group_scope(group.pk)],
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@vary_on_headers('Accept')
+@read_from_replica
+@cache_anonymous_feed(_profile_feed)
 def profile(request, username):
     title = 'Профаил пользователя {username}'
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.select_related('author')
-    paginator = Paginator(post_list, POST_LIST_LIMIT)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    author = instances.users.get_or_404(username=username)
+    post_list = author.posts.select_related('author', 'group')
+    page_obj = paginate(request, post_list, POST_LIST_LIMIT)
     following = False
     if request.user.is_authenticated:
         following = Follow.objects.filter(
@@ -59,37 +99,73 @@ def profile(request, username):
     context = {
         'page_obj': page_obj,
         'author': author,
+        'author_stats': counters.get_stats(author.pk),
+        'feed_scopes': [feed_cache.author_scope(author.pk)],
         'title': title,
         'following': following,
     }
     return render(request, 'posts/profile.html', context)
 
 
+@read_from_replica
+def search(request):
+    query = request.GET.get('q', '').strip()
+    page_obj = SearchPaginator(query, POST_LIST_LIMIT).get_page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+    context = {
+        'title': 'Поиск',
+        'query': query,
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@vary_on_headers('Accept')
+@read_from_replica
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), id=post_id
+    )
     title = f'Пост {post.text}'
-    posts_count = Post.objects.filter(author=post.author).count()
-    comments = post.comments.all()
+    posts_count = counters.stats_for(post.author).posts_count
+    paginator = CursorPaginator(
+        post.comments.select_related('author'),
+        COMMENTS_LIMIT,
+        ordering=('created', 'id')
+    )
+    # Комментарии выбираются, только если фрагмент не нашёлся в кеше.
+    comments = SimpleLazyObject(lambda: paginator.get_page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    ))
     form = CommentForm(request.POST or None)
     context = {
         'post': post,
         'title': title,
         'posts_count': posts_count,
         'comments': comments,
-        'form': form
+        'form': form,
+        'feed_scopes': [feed_cache.post_scope(post.pk)],
     }
     return render(request, 'posts/post_detail.html', context)
 
 
 @login_required
+@stick_to_primary
+@retry_on_locked
 def post_create(request):
     title = 'Добавить запись'
-    form = PostForm(request.POST or None)
+    form = PostForm(request.POST or None, files=request.FILES or None)
     context = {'title': title}
     if form.is_valid():
         create_post = form.save(commit=False)
         create_post.author = request.user
-        create_post.save()
+        # Счётчик автора сдвигает сигнал в той же транзакции.
+        with transaction.atomic():
+            create_post.save()
+        thumbnails.schedule(create_post)
         return redirect('posts:profile', create_post.author)
     template = 'posts/create_post.html'
     context = {'form': form}
@@ -97,6 +173,8 @@ def post_create(request):
 
 
 @login_required
+@stick_to_primary
+@retry_on_locked
 def post_edit(request, post_id):
     title = 'Редактировать запись'
     edit_post = get_object_or_404(Post, id=post_id)
@@ -107,6 +185,8 @@ def post_edit(request, post_id):
                     instance=edit_post)
     if form.is_valid():
         form.save()
+        if 'image' in form.changed_data:
+            thumbnails.schedule(edit_post)
         return redirect('posts:post_detail', post_id)
     template = 'posts/create_post.html'
     context = {
@@ -118,42 +198,56 @@ def post_edit(request, post_id):
 
 
 @login_required
+@stick_to_primary
+@retry_on_locked
 def add_comment(request, post_id):
     form = CommentForm(request.POST or None)
-    post = get_object_or_404(Post, id=post_id)
+    post = instances.posts.get_or_404(pk=post_id)
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        with transaction.atomic():
+            comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
+@vary_on_headers('Accept')
+@read_from_replica
 def follow_index(request):
-    user = request.user
-    posts = Post.objects.filter(author__following__user=user)
-    paginator = Paginator(posts, POST_LIST_LIMIT)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    entries = TimelineEntry.objects.filter(
+        user=request.user
+    ).select_related('post__author', 'post__group')
+    page_obj = paginate(
+        request, entries, POST_LIST_LIMIT, ordering=('-pub_date', '-post_id')
+    )
+    page_obj.object_list = [entry.post for entry in page_obj.object_list]
     context = {
         'title': 'Мои подписки',
         'page_obj': page_obj,
+        'feed_scopes': [
+            feed_cache.GLOBAL_SCOPE,
+            feed_cache.timeline_scope(request.user.pk),
+        ],
     }
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
+@stick_to_primary
+@retry_on_locked
 def profile_follow(request, username):
-    author = get_object_or_404(User, username=username)
+    author = instances.users.get_or_404(username=username)
     if author == request.user:
         return redirect(
             'posts:profile',
             username=username
         )
-    Follow.objects.get_or_create(
-        user=request.user,
-        author=author)
+    with transaction.atomic():
+        Follow.objects.get_or_create(
+            user=request.user,
+            author=author)
     return redirect(
         'posts:profile',
         username=username
@@ -161,7 +255,9 @@ def profile_follow(request, username):
 
 
 @login_required
+@stick_to_primary
+@retry_on_locked
 def profile_unfollow(request, username):
-    author = get_object_or_404(User, username=username)
+    author = instances.users.get_or_404(username=username)
     Follow.objects.filter(user=request.user, author=author).delete()
     return redirect('posts:profile', username=username)
@@ -0,0 +1,22 @@
+# users/backends.py
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+from posts import instances
+
+User = get_user_model()
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend, который берёт request.user из кеша экземпляров.
+
+    Смена пароля сохраняет пользователя, сигнал чистит кеш, и старый
+    хеш сессии перестаёт совпадать так же, как без кеша.
+    """
+
+    def get_user(self, user_id):
+        try:
+            user = instances.users.get(pk=user_id)
+        except User.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
@@ -1,6 +1,7 @@
 # yatube/settings.py
 
 import os
+import sys
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -16,6 +17,9 @@ SECRET_KEY = '2&jq$$a_9@!2#dx9e-bz-gcyrzb%th8*gxhru$f^8%ifqjfx0('
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
+# Запуск под manage.py test или pytest
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.argv[0]
+
 ALLOWED_HOSTS = [
     'localhost',
     '127.0.0.1',
@@ -41,27 +45,107 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'about',
     'sorl.thumbnail',
-    'debug_toolbar',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.ProfilerMiddleware',
+    'core.middleware.QueryInspectorMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
+# Выборочный cProfile запросов (core.profiling): доля случайных
+# запросов и запросы с подписанным заголовком X-Profile
+# (manage.py profile_token); сводка — manage.py profile_summary.
+# Включается на время разбора: токен живёт TOKEN_MAX_AGE секунд
+PROFILER = {
+    'ENABLED': False,
+    'SAMPLE_RATE': 0.0,
+    'DIR': os.path.join(BASE_DIR, 'profiles'),
+    'MAX_FILES': 200,
+    'TOKEN_MAX_AGE': 60 * 10,
+}
+
+# Поиск N+1 и лимиты запросов на вьюху (core.middleware). В тестах
+# превышение лимита роняет запрос, а повторы не пишутся в лог: шумно.
+QUERY_INSPECTOR = {
+    'ENABLED': DEBUG or TESTING,
+    'REPEAT_THRESHOLD': 3,
+    'LOG_REPEATS': not TESTING,
+    'BUDGETS': {
+        'posts:index': 5,
+        'posts:group_list': 5,
+        'posts:follow_index': 5,
+        'posts:profile': 12,
+        'posts:post_detail': 10,
+    },
+    'DEFAULT_BUDGET': None,
+    # Миниатюры sorl создаются один раз при первой отрисовке
+    'UNBUDGETED_TABLES': ('thumbnail_kvstore', 'posts_thumbnail'),
+    'RAISE': TESTING,
+}
+
+# Общий кеш всех воркеров в файле SQLite (core.cache). Тесты работают
+# с LocMemCache: общий файл пережил бы тестовую базу.
+CACHES = {
+    'default': {
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    }
+}
+if TESTING:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+# Кеш экземпляров Group/User/Post (core.instance_cache): срок в общем
+# кеше и в памяти процесса, размер локального LRU
+INSTANCE_CACHE_TIMEOUT = 60 * 15
+INSTANCE_CACHE_LOCAL_TTL = 5
+INSTANCE_CACHE_LOCAL_SIZE = 1024
+# request.user тоже берётся из кеша экземпляров
+AUTHENTICATION_BACKENDS = ['users.backends.CachedModelBackend']
+# Сессии в общем кеше с копией в базе (core.session_backends);
+# без хранилища — 'core.session_backends.signed_cookies'
+SESSION_ENGINE = 'core.session_backends.cached_db'
+# Срок сессии продлевается записью не чаще раза в сутки
+SESSION_REFRESH_INTERVAL = 60 * 60 * 24
+# Ключи, которые живут только в кеше: их смена не пишет в базу
+SESSION_CACHE_ONLY_KEYS = ['_db_primary_until']
+# Ранний пересчёт (XFetch) и блокировка пересчёта горячих ключей
+CACHE_XFETCH_BETA = 1.0
+CACHE_SINGLE_FLIGHT = True
+CACHE_LOCK_TIMEOUT = 10
+
+# Метрики вьюх для Prometheus на /metrics (core.metrics). Воркеры
+# сбрасывают свои счётчики в общий каталог; его очищают при перезапуске.
+METRICS_ENABLED = True
+METRICS_SPOOL_DIR = None if TESTING else os.path.join(BASE_DIR, 'metrics')
+METRICS_FLUSH_INTERVAL = 5
+METRICS_ALLOWED_IPS = INTERNAL_IPS
+
+# Сжатие ответов (core.middleware.CompressionMiddleware)
+COMPRESSION_GZIP_LEVEL = 6
+COMPRESSION_BROTLI_QUALITY = 5
+
 
 ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates с замером отрисовки для метрик (core.metrics)
+        'BACKEND': 'core.metrics.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -86,8 +170,38 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Соединение живёт между запросами, PRAGMA не выполняются заново
+        'CONN_MAX_AGE': 60,
     }
 }
+# Реплики только для чтения лент (core.routers): алиасы из DATABASES.
+# Локально реплика — копия SQLite, её обновляет refresh_replicas:
+# DATABASES['replica'] = {
+#     'ENGINE': 'django.db.backends.sqlite3',
+#     'NAME': os.path.join(BASE_DIR, 'db.replica.sqlite3'),
+#     'TEST': {'MIRROR': 'default'},
+# }
+DATABASE_REPLICAS = []
+if TESTING:
+    # Отдельная тестовая база, которая отстаёт от основной (core.tests)
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db.replica.sqlite3'),
+    }
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+# Сколько секунд после записи сессия читает из основной базы
+DATABASE_REPLICA_STICKY_SECONDS = 15
+# PRAGMA для каждого соединения SQLite (core.db); None отключает пункт
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+# Сколько раз повторять пишущую вьюху при «database is locked»
+SQLITE_LOCKED_RETRIES = 5
 
 
 # Password validation
@@ -129,6 +243,9 @@ USE_TZ = True
 STATIC_URL = '/static/'
 
 STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+# Имена с хешем и сжатые .gz/.br копии при collectstatic
+STATICFILES_STORAGE = 'core.static.CompressedManifestStaticFilesStorage'
 
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
@@ -139,5 +256,26 @@ EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 # указываем директорию, в которую будут складываться файлы писем
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
+# Курсорная (keyset) паджинация лент вместо номеров страниц
+POSTS_CURSOR_PAGINATION = False
+# Срок жизни фрагментов лент; актуальность держат поколения в ключах
+FEED_CACHE_TIMEOUT = 60 * 60 * 24
+# Считать попадания во фрагменты лент (запись в кеш на каждую отрисовку)
+FEED_CACHE_STATS = False
+# Потоки для миниатюр новых картинок; 0 — генерировать прямо в запросе
+POSTS_THUMBNAIL_WORKERS = 2
+# Учёт обращений к миниатюрам и предел их размера для prune_thumbnails
+THUMBNAIL_KVSTORE = 'posts.thumbnail_cache.KVStore'
+THUMBNAIL_CACHE_MAX_SIZE = 1024 ** 3
+# Сколько секунд prune_thumbnails --scan не трогает свежие файлы без учёта
+THUMBNAIL_UNTRACKED_GRACE = 60 * 60
+# Картинки постов: предел пикселей и длинной стороны после приёма
+POSTS_IMAGE_MAX_PIXELS = 50 * 1000 * 1000
+POSTS_IMAGE_MAX_SIDE = 2560
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# 'file' — FileResponse (sendfile через wsgi.file_wrapper),
+# 'x-accel' — X-Accel-Redirect для nginx, 'x-sendfile' — X-Sendfile
+MEDIA_SERVE_MODE = 'file'
+MEDIA_X_ACCEL_PREFIX = '/protected-media/'